@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""Potato Timer benchmark suite
+#
+# Runs every scenario in its own process and measures time per operation,
+# peak memory allocated by Python (tracemalloc) and peak RSS, plus terminal
+# writes and bytes per operation for scenarios drawing on a virtual
+# terminal. Results can be compared against a stored baseline, failing on
+# regressions. Times are compared in multiples of a calibration workload
+# timed alongside each scenario, so a baseline saved on another machine
+# still holds.
+#
+# Usage:
+#   python benchmarks/run.py                     # run and compare
+#   python benchmarks/run.py --save-baseline     # store new baseline
+#   python benchmarks/run.py -k frame            # only matching scenarios
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+REPEATS = 5
+METRICS = ["time_per_op_us", "alloc_peak_kib", "peak_rss_kib",
+           "writes_per_op", "bytes_per_op"]
+CALIBRATION_OPS = 200
+
+
+def load_scenarios():
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, BENCH_DIR)
+    import scenarios
+    return scenarios.SCENARIOS
+
+
+def calibrate():
+    """Time a fixed pure Python workload, the unit of normalised timings
+    #
+    # Dictionary, integer and list operations like the ones the timer is
+    # made of, so machines faster or slower at them scale alike.
+    """
+    started = time.perf_counter()
+    for i in range(CALIBRATION_OPS):
+        table = {}
+        for j in range(200):
+            table[j % 17] = table.get(j % 17, 0) + j
+        sorted(table.values())
+    return (time.perf_counter() - started) / CALIBRATION_OPS
+
+
+def measure(name):
+    """Measure a single scenario in this process
+    #
+    # Each repeat is preceded by a calibration run, so both see the machine
+    # in the same state
+    """
+    setup, ops = load_scenarios()[name]
+    op = setup()
+    op()  # warm up caches and lazy initialization
+
+    timings = []
+    calibrations = []
+    for repeat in range(REPEATS):
+        calibrations.append(calibrate())
+        started = time.perf_counter()
+        for i in range(ops):
+            op()
+        timings.append((time.perf_counter() - started) / ops)
+
+    tracemalloc.start()
+    baseline_memory = tracemalloc.get_traced_memory()[0]
+    for i in range(max(1, ops // 10)):
+        op()
+    alloc_peak = tracemalloc.get_traced_memory()[1] - baseline_memory
+    tracemalloc.stop()
+
+    result = {
+        "ops": ops,
+        "time_per_op_us": min(timings) * 1e6,
+        "calibration_us": min(calibrations) * 1e6,
+        "alloc_peak_kib": alloc_peak / 1024,
+        "peak_rss_kib": peak_rss_kib(),
+    }
+    counters = getattr(op, "counters", None)
+    if counters is not None:
+        before = counters()
+        for i in range(ops):
+            op()
+        after = counters()
+        result["writes_per_op"] = (after["writes"] - before["writes"]) / ops
+        result["bytes_per_op"] = (after["bytes"] - before["bytes"]) / ops
+    return result
+
+
+def peak_rss_kib():
+    """Peak resident set size of this process and its children"""
+    usage = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    if sys.platform == "darwin":
+        return usage / 1024  # bytes on macOS
+    return usage
+
+
+def run_isolated(name):
+    """Measure a scenario in a fresh interpreter"""
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker", name],
+        check=True, stdout=subprocess.PIPE, text=True).stdout
+    return json.loads(output)
+
+
+def compare(results, baseline, threshold):
+    """List regressions beyond threshold (fraction) against baseline
+    #
+    # Times are scaled by how much faster the baseline machine ran the
+    # calibration workload. Metrics that were zero and no longer are count
+    # as regressions too.
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for metric in METRICS:
+            old = baseline[name].get(metric)
+            new = result.get(metric)
+            if old is None or new is None:
+                continue
+            if metric == "time_per_op_us" and "calibration_us" in baseline[name]:
+                new *= baseline[name]["calibration_us"] / result["calibration_us"]
+            if old == 0:
+                if new > 0:
+                    regressions.append(f"{name}: {metric} 0 -> {new:.1f}")
+            elif new > old * (1 + threshold):
+                regressions.append(
+                    f"{name}: {metric} {old:.1f} -> {new:.1f} "
+                    f"(+{(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Potato Timer benchmarks")
+    parser.add_argument("-k", dest="pattern",
+                        help="Run only scenarios whose name contains this")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE,
+                        help="Baseline JSON file to compare against")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Store results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Allowed slowdown as a fraction (default 0.25)")
+    parser.add_argument("--output", help="Write results JSON to this file")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(measure(args.worker)))
+        return
+
+    names = [name for name in load_scenarios()
+             if args.pattern is None or args.pattern in name]
+    results = {}
+    for name in names:
+        results[name] = run_isolated(name)
+        result = results[name]
+        print(f"{name:28} {result['time_per_op_us']:12.2f} us/op "
+              f"{result['alloc_peak_kib']:10.1f} KiB alloc "
+              f"{result['peak_rss_kib']:10.0f} KiB RSS"
+              + (f" {result['writes_per_op']:8.2f} writes"
+                 f" {result['bytes_per_op']:9.1f} bytes"
+                 if "writes_per_op" in result else ""))
+
+    if args.output:
+        with open(args.output, "w") as stream:
+            json.dump(results, stream, indent=2, sort_keys=True)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as stream:
+                baseline = json.load(stream)
+        baseline.update(results)
+        with open(args.baseline, "w") as stream:
+            json.dump(baseline, stream, indent=2, sort_keys=True)
+            stream.write("\n")
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, nothing to compare")
+        return
+    with open(args.baseline) as stream:
+        baseline = json.load(stream)
+    regressions = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
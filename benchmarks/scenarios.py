@@ -0,0 +1,429 @@
+"""Benchmark scenarios
+#
+# Each scenario sets up its state and returns a function running a single
+# operation, which the harness in run.py times and profiles.
+"""
+
+import atexit
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from datetime import date, timedelta
+
+from potatotimer import Config, Daemon, History, RemoteEngine, ScheduleEngine, Screen
+from potatotimer import TimerEngine, UserInterface, VirtualBackend, VirtualClock
+from potatotimer.TimerEngine import NS_PER_SECOND
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = {}
+
+"""Compiled config caches go to a temporary directory, not ~/.cache"""
+CACHE_DIR = tempfile.mkdtemp(prefix="potatotimer-bench-cache-")
+atexit.register(shutil.rmtree, CACHE_DIR, ignore_errors=True)
+os.environ["XDG_CACHE_HOME"] = CACHE_DIR
+
+
+def scenario(name, ops):
+    """Register a scenario running ops operations per measurement"""
+    def register(setup):
+        SCENARIOS[name] = (setup, ops)
+        return setup
+    return register
+
+
+def write_config(timer_count):
+    """Write a config with timer_count timers to a temporary file"""
+    types = ["work", "short break", "work", "long break", "teach"]
+    handle, path = tempfile.mkstemp(suffix=".yml", prefix="potatotimer-bench-")
+    with os.fdopen(handle, "w") as stream:
+        stream.write("use_colors: True\ntimers:\n")
+        for i in range(timer_count):
+            stream.write(f'  - type: "{types[i % len(types)]}"\n')
+            stream.write(f'    duration: {1 + i % 30}\n')
+    return path
+
+
+def write_pattern_config(repeat):
+    """Write a config running 8 timers repeat times over in nested blocks"""
+    handle, path = tempfile.mkstemp(suffix=".yml", prefix="potatotimer-bench-")
+    with os.fdopen(handle, "w") as stream:
+        stream.write(
+            "use_colors: True\n"
+            "timers:\n"
+            f"  - repeat: {repeat}\n"
+            "    timers:\n"
+            "      - repeat: 3\n"
+            "        timers:\n"
+            "          - type: \"work\"\n"
+            "            duration: 25\n"
+            "          - type: \"short break\"\n"
+            "            duration: 5\n"
+            "      - type: \"work\"\n"
+            "        duration: 25\n"
+            "      - type: \"long break\"\n"
+            "        duration: 30\n")
+    return path
+
+
+def load_config(timer_count=None):
+    """Load default config, or a generated one with timer_count timers"""
+    if timer_count is None:
+        return Config(os.path.join(ROOT, "config.yml"))
+    path = write_config(timer_count)
+    try:
+        return Config(path)
+    finally:
+        os.unlink(path)
+
+
+def load_schedule(dated_count):
+    """Load the workday schedule with dated_count 30 minute slots added
+    #
+    # Dated slots start every 45 minutes from SCHEDULE_START on
+    """
+    handle, path = tempfile.mkstemp(suffix=".yml", prefix="potatotimer-bench-")
+    with open(os.path.join(ROOT, "sample-configs",
+                           "finnish-workday-schedule.yml")) as stream:
+        workday = stream.read()
+    with os.fdopen(handle, "w") as stream:
+        stream.write(workday)
+        start = time.mktime(time.strptime(SCHEDULE_START, "%Y-%m-%d %H:%M"))
+        for i in range(dated_count):
+            at = time.strftime("%Y-%m-%d %H:%M", time.localtime(start + i * 2700))
+            stream.write(f'  - type: "teach"\n    duration: 30\n    at: "{at}"\n')
+    try:
+        return Config(path)
+    finally:
+        os.unlink(path)
+
+
+SCHEDULE_START = "2026-01-05 00:00"
+
+
+def write_history(years):
+    """Write a synthetic history to a temporary directory
+    #
+    # Years of work days with 16 rows each, weekends off
+    """
+    path = tempfile.mkdtemp(prefix="potatotimer-bench-history-")
+    atexit.register(shutil.rmtree, path)
+    categories = ["work", "short break", "long break", "teach"]
+    day_plan = [(0, 25, 1), (1, 5, 1)] * 3 + [(0, 25, 1), (2, 30, 1)]
+    day_plan += [(3, 50, 1), (1, 10, 1)] + [(0, 25, 1), (1, 5, 1)] * 2
+    columns = {name: array(typecode) for name, typecode in History.COLUMNS.items()}
+    index = {name: array(typecode) for name, typecode in History.INDEX.items()}
+    today = date.today()
+    for days_ago in range(years * 365, 0, -1):
+        day = today - timedelta(days=days_ago)
+        if day.weekday() >= 5:
+            continue
+        index["days"].append(day.toordinal())
+        index["day_rows"].append(len(columns["start"]))
+        start = int(time.mktime((day.year, day.month, day.day, 9, 0, 0, 0, 0, -1)))
+        start *= NS_PER_SECOND
+        for category, minutes, completed in day_plan:
+            columns["start"].append(start)
+            columns["duration"].append(minutes * 60 * NS_PER_SECOND)
+            columns["category"].append(category)
+            columns["completed"].append(completed)
+            start += minutes * 60 * NS_PER_SECOND
+    for name, values in list(columns.items()) + list(index.items()):
+        with open(os.path.join(path, name), "wb") as stream:
+            values.tofile(stream)
+    with open(os.path.join(path, "categories"), "w") as stream:
+        stream.write("\n".join(categories) + "\n")
+    return path
+
+
+def engine_ticks(config):
+    """Engine update on 200 ms ticks"""
+    clock = VirtualClock()
+    engine = TimerEngine(config, clock)
+    engine.start_timer()
+
+    def op():
+        clock.advance(NS_PER_SECOND // 5)
+        engine.update()
+    return op
+
+
+def schedule_ticks(dated_count):
+    """Schedule engine update on one minute ticks of the wall clock"""
+    start = time.mktime(time.strptime(SCHEDULE_START, "%Y-%m-%d %H:%M"))
+    clock = VirtualClock(0, int(start) * NS_PER_SECOND)
+    engine = ScheduleEngine(load_schedule(dated_count), clock)
+
+    def op():
+        clock.advance(60 * NS_PER_SECOND)
+        engine.update()
+    return op
+
+
+def frames(lines, cols, timer_count=None):
+    """Render a frame a second into a virtual terminal
+    #
+    # Terminal writes and bytes per frame are counted too
+    """
+    config = load_config(timer_count)
+    clock = VirtualClock()
+    engine = TimerEngine(config, clock)
+    backend = VirtualBackend(lines, cols)
+    screen = Screen(config, backend)
+    ui = UserInterface(config, engine, screen)
+    screen.start()
+    ui.manage_windows()
+    engine.start_timer()
+
+    def op():
+        clock.advance(NS_PER_SECOND)
+        engine.update()
+        ui.handle_alarm()
+        ui.update_statusline()
+        ui.update_sidebar()
+        ui.update_content()
+        screen.flush_frame()
+    op.counters = screen.frame_counters
+    return op
+
+
+@scenario("engine_tick_default", ops=200_000)
+def engine_tick_default():
+    return engine_ticks(load_config())
+
+
+@scenario("engine_tick_500_timers", ops=200_000)
+def engine_tick_500_timers():
+    return engine_ticks(load_config(500))
+
+
+@scenario("engine_tick_10k_step_pattern", ops=200_000)
+def engine_tick_10k_step_pattern():
+    path = write_pattern_config(1250)
+    try:
+        return engine_ticks(Config(path))
+    finally:
+        os.unlink(path)
+
+
+@scenario("schedule_tick_workday", ops=20_000)
+def schedule_tick_workday():
+    return schedule_ticks(0)
+
+
+@scenario("schedule_tick_5000_slots", ops=20_000)
+def schedule_tick_5000_slots():
+    return schedule_ticks(5000)
+
+
+@scenario("frame_default", ops=2_000)
+def frame_default():
+    return frames(24, 80)
+
+
+@scenario("frame_500_timers", ops=2_000)
+def frame_500_timers():
+    return frames(24, 80, 500)
+
+
+@scenario("frame_narrow", ops=2_000)
+def frame_narrow():
+    return frames(24, 45)
+
+
+@scenario("frame_wide", ops=2_000)
+def frame_wide():
+    return frames(70, 250)
+
+
+@scenario("resize_storm", ops=50)
+def resize_storm():
+    """Burst of 20 resizes, as from dragging a terminal corner
+    #
+    # Resizes come 10 ms apart and the main loop wakes up for each, the
+    # windows are laid out once the burst has settled
+    """
+    config = load_config()
+    engine = TimerEngine(config, VirtualClock())
+    backend = VirtualBackend(24, 80)
+    screen = Screen(config, backend)
+    ui = UserInterface(config, engine, screen)
+    screen.start()
+    ui.manage_windows()
+    now = 0
+
+    def render():
+        ui.update_statusline()
+        ui.update_sidebar()
+        ui.update_content()
+        screen.flush_frame()
+
+    def op():
+        nonlocal now
+        for i in range(20):
+            backend.resize(24 + i, 60 + i * 2)
+            ui.handle_keys()
+            now += 0.01
+            if ui.handle_resize(now):
+                render()
+        now += ui.RESIZE_SETTLE
+        if ui.handle_resize(now):
+            render()
+    op.counters = screen.frame_counters
+    return op
+
+
+@scenario("history_load_10_years", ops=200)
+def history_load_10_years():
+    """Open a 10 year history for queries"""
+    path = write_history(10)
+
+    def op():
+        History(path).load().close()
+    return op
+
+
+@scenario("stats_6_months_by_weekday", ops=50)
+def stats_6_months_by_weekday():
+    """Work minutes per weekday over the last 6 months of 10 years"""
+    history = History(write_history(10)).load()
+    first_day = date.today().toordinal() - 182
+
+    def op():
+        history.aggregate(first_day, None, lambda day: day % 7)
+    return op
+
+
+@scenario("stats_10_years_by_month", ops=5)
+def stats_10_years_by_month():
+    """Totals per month over a 10 year history"""
+    history = History(write_history(10)).load()
+
+    def op():
+        history.aggregate(
+            None, None, lambda day: date.fromordinal(day).strftime("%Y-%m"))
+    return op
+
+
+@scenario("control_round_trip", ops=2_000)
+def control_round_trip():
+    """Status request over the control socket
+    #
+    # Served by a main loop running on a virtual terminal in a background
+    # thread, so each round trip includes waking up from select()
+    """
+    directory = tempfile.mkdtemp(prefix="potatotimer-bench-control-")
+    atexit.register(shutil.rmtree, directory)
+    path = os.path.join(directory, "control.sock")
+    config_file = os.path.join(directory, "config.yml")
+    with open(config_file, "w") as stream:
+        stream.write(f"journal: False\nhistory: False\nstatus_file: False\n"
+                     f"control_socket: {path}\n")
+    config = Config(config_file, use_cache=False)
+    engine = TimerEngine(config)
+    ui = UserInterface(config, engine, Screen(config, VirtualBackend(24, 80)),
+                       Daemon(config, engine))
+    threading.Thread(target=ui.start, daemon=True).start()
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    while True:
+        try:
+            client.connect(path)
+            break
+        except OSError:
+            time.sleep(0.01)
+    stream = client.makefile("rwb")
+
+    def op():
+        stream.write(b'{"command": "status"}\n')
+        stream.flush()
+        stream.readline()
+    return op
+
+
+@scenario("daemon_round_trip", ops=2_000)
+def daemon_round_trip():
+    """Command from an attached terminal to a daemon and back
+    #
+    # The daemon runs in a background thread, the response carries the
+    # engine state the terminal restores its mirror from
+    """
+    directory = tempfile.mkdtemp(prefix="potatotimer-bench-daemon-")
+    atexit.register(shutil.rmtree, directory)
+    path = os.path.join(directory, "control.sock")
+    config_file = os.path.join(directory, "config.yml")
+    with open(config_file, "w") as stream:
+        stream.write(f"journal: False\nhistory: False\nstatus_file: False\n"
+                     f"control_socket: {path}\n")
+    config = Config(config_file, use_cache=False)
+    daemon = Daemon(config, TimerEngine(config))
+    threading.Thread(target=daemon.run, daemon=True).start()
+    engine = RemoteEngine(config, path)
+    while True:
+        try:
+            engine.connect()
+            break
+        except OSError:
+            time.sleep(0.01)
+
+    def op():
+        engine.run_command("status")
+    return op
+
+
+@scenario("config_load_default", ops=200)
+def config_load_default():
+    path = os.path.join(ROOT, "config.yml")
+
+    def op():
+        Config(path)
+    return op
+
+
+@scenario("config_load_500_timers", ops=10)
+def config_load_500_timers():
+    path = write_config(500)
+    atexit.register(os.unlink, path)
+
+    def op():
+        Config(path)
+    return op
+
+
+@scenario("config_load_10k_step_pattern", ops=10)
+def config_load_10k_step_pattern():
+    """Load config and compile its timers"""
+    path = write_pattern_config(1250)
+    atexit.register(os.unlink, path)
+
+    def op():
+        Config(path).timers
+    return op
+
+
+@scenario("config_parse_500_timers", ops=10)
+def config_parse_500_timers():
+    """Load config without the compiled config cache"""
+    path = write_config(500)
+    atexit.register(os.unlink, path)
+
+    def op():
+        Config(path, use_cache=False)
+    return op
+
+
+@scenario("startup", ops=5)
+def startup():
+    """Start scripts/potatotimer without a terminal and exit"""
+    command = [sys.executable, os.path.join(ROOT, "scripts", "potatotimer"),
+               "-c", os.path.join(ROOT, "config.yml"), "--simulate", "0"]
+    env = dict(os.environ, PYTHONPATH=ROOT)
+
+    def op():
+        subprocess.run(command, env=env, check=True,
+                       stdout=subprocess.DEVNULL)
+    return op
@@ -0,0 +1,141 @@
+import queue
+import threading
+import time
+
+
+class AlarmScheduler:
+    """Alarms as scheduled events run by the main loop
+    #
+    # Repeats are timestamps instead of sleeps, so sounding an alarm never
+    # blocks input or rendering. Terminal alarms (beep, flash) run on the
+    # main thread since curses is not thread safe, external commands
+    # (notify, sound) run in a small worker pool. A scheduler sounds only
+    # the alarm types it is given: every terminal beeps and flashes its
+    # own screen, while commands are run once, by the daemon.
+    """
+
+    REPEAT_INTERVAL = 0.5  # Seconds between alarm repeats
+    MAX_WORKERS = 2  # Concurrently running external alarm commands
+    MAX_PENDING = 4  # External alarm commands queued or running at most
+    COMMAND_TIMEOUT = 10  # Seconds an external alarm command may run
+    SOUND_PLAYERS = ["paplay", "aplay", "afplay"]
+    TERMINAL_ALARMS = ("beep", "flash")
+    EXTERNAL_ALARMS = ("notify", "sound")
+
+    def __init__(self, config, screen=None, alarm_types=None):
+        self._config = config
+        self._screen = screen  # None when sounding external alarms only
+        self._alarm_types = (
+            alarm_types if alarm_types is not None
+            else self.TERMINAL_ALARMS + self.EXTERNAL_ALARMS)
+        self._deadlines = []  # Monotonic timestamps of upcoming repeats
+        self._message = ""
+        self._commands = queue.Queue()
+        self._workers = []
+        self._slots = threading.BoundedSemaphore(self.MAX_PENDING)
+
+    def trigger(self, message=""):
+        """Schedule alarm repeats starting now
+        #
+        # A new alarm replaces repeats still left from the previous one.
+        # Nothing is scheduled when none of the configured types is ours.
+        """
+        if not any(alarm_type in self._alarm_types
+                   for alarm_type in self._config.alarm_types):
+            return
+        now = time.monotonic()
+        self._message = message
+        self._deadlines = [
+            now + i * self.REPEAT_INTERVAL
+            for i in range(self._config.alarm_repeat)
+        ]
+
+    def run_due(self):
+        """Sound all alarm repeats that are due"""
+        now = time.monotonic()
+        while self._deadlines and self._deadlines[0] <= now:
+            self._deadlines.pop(0)
+            self.sound()
+
+    def next_deadline(self):
+        """Seconds until next alarm repeat, None if nothing is scheduled"""
+        if not self._deadlines:
+            return None
+        return max(0, self._deadlines[0] - time.monotonic())
+
+    def sound(self):
+        """Sound a single alarm with every configured alarm type of ours"""
+        for alarm_type in self._config.alarm_types:
+            if alarm_type not in self._alarm_types:
+                continue
+            if alarm_type == "beep":
+                self._screen.beep()
+            elif alarm_type == "flash":
+                self._screen.flash()
+            elif alarm_type == "notify":
+                import shlex
+                self.run_command(shlex.split(self._config.notify_command) +
+                                 ["Potato Timer", self._message])
+            elif alarm_type == "sound":
+                player = self.find_sound_player()
+                if player is not None and self._config.alarm_sound is not None:
+                    self.run_command(player + [self._config.alarm_sound])
+
+    def find_sound_player(self):
+        """Get command for playing sound files"""
+        import shlex
+        import shutil
+        if self._config.sound_player is not None:
+            return shlex.split(self._config.sound_player)
+        for player in self.SOUND_PLAYERS:
+            if shutil.which(player) is not None:
+                return [player]
+        return None
+
+    def run_command(self, command):
+        """Run external alarm command in the worker pool
+        #
+        # Commands are dropped when too many are already queued, a stuck
+        # notification daemon must not pile up threads or processes.
+        """
+        if not self._slots.acquire(blocking=False):
+            return
+        if len(self._workers) < self.MAX_WORKERS:
+            """Daemon threads, a hanging command must not delay quitting"""
+            worker = threading.Thread(
+                target=self._work, name="potatotimer-alarm", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        self._commands.put(command)
+
+    def shutdown(self):
+        """Stop worker threads without waiting for running commands"""
+        self._deadlines = []
+        for worker in self._workers:
+            self._commands.put(None)
+        self._workers = []
+
+    def _work(self):
+        """Worker thread: run commands, ignoring their output and failures"""
+        import subprocess
+        while True:
+            command = self._commands.get()
+            if command is None:
+                return
+            try:
+                subprocess.run(
+                    command,
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                    timeout=self.COMMAND_TIMEOUT,
+                )
+            except (OSError, subprocess.SubprocessError):
+                pass
+            finally:
+                self._slots.release()
+
+    @property
+    def active(self):
+        """Whether alarm repeats are still scheduled"""
+        return bool(self._deadlines)
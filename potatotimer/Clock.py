@@ -0,0 +1,40 @@
+import time
+
+
+class Clock:
+    """System clock used by the timer engine"""
+
+    def monotonic_ns(self):
+        """Monotonic time in ns"""
+        return time.monotonic_ns()
+
+    def time_ns(self):
+        """Wall clock time in ns since the epoch"""
+        return time.time_ns()
+
+    def localtime(self):
+        """Local wall clock time as struct_time"""
+        return time.localtime()
+
+
+class VirtualClock(Clock):
+    """Clock that only moves when told to, for simulations"""
+
+    def __init__(self, start_ns=0, wall_start_ns=None):
+        self._monotonic_ns = start_ns
+        if wall_start_ns is None:
+            wall_start_ns = time.time_ns()
+        self._wall_offset_ns = wall_start_ns - start_ns
+
+    def advance(self, ns):
+        """Move clock forward by ns"""
+        self._monotonic_ns += ns
+
+    def monotonic_ns(self):
+        return self._monotonic_ns
+
+    def time_ns(self):
+        return self._wall_offset_ns + self._monotonic_ns
+
+    def localtime(self):
+        return time.localtime(self.time_ns() // 1_000_000_000)
@@ -1,32 +1,42 @@
-import yaml
-from appdirs import AppDirs
-from pathlib import Path
+import marshal
+import os
+import sys
+import zlib
+
+
+class ConfigError(Exception):
+    """Config file could not be read"""
 
 
 class Config:
+    CACHE_VERSION = 10  # Bump when validated settings change shape
+    COLORS = {
+        "red": 2, "green": 3, "blue": 4, "yellow": 5,
+        "magenta": 6, "cyan": 7, "white": 8,
+    }
+    BUILTIN_CATEGORIES = {  # Type: (color, stat group)
+        "work": ("red", "work"),
+        "short break": ("green", "short break"),
+        "long break": ("blue", "long break"),
+    }
+    DEFAULT_COLOR = "yellow"
+    FSYNC_POLICIES = ("always", "periodic", "never")
+    WEEKDAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+    WEEKDAY_SETS = {
+        "daily": [0, 1, 2, 3, 4, 5, 6],
+        "weekdays": [0, 1, 2, 3, 4],
+        "weekend": [5, 6],
+    }
+
     def __enter__(self):
         return self
 
     def __exit__(self, type, value, traceback):
         pass
 
-    def __init__(self, config_file=None):
-        self._alarm_type = "beep"
-        self._use_colors = True
-        self._prefer_terminal_colors = False
-        self._alarm_repeat = 1
-
-        self._timers = [
-            {"type": "work", "duration": 25},
-            {"type": "short break", "duration": 5},
-            {"type": "work", "duration": 25},
-            {"type": "short break", "duration": 5},
-            {"type": "work", "duration": 25},
-            {"type": "short break", "duration": 5},
-            {"type": "work", "duration": 25},
-            {"type": "short break", "duration": 5},
-            {"type": "long break", "duration": 30},
-        ]
+    def __init__(self, config_file=None, use_cache=True):
+        self._use_cache = use_cache
+        self.set_defaults()
 
         self._possible_files = [
             "~/.config/potatotimer/config.yml",
@@ -40,49 +50,214 @@ class Config:
 
         self._selected_config = self.find_config()
         if self._selected_config is not None:
+            if use_cache and self.load_cached_config():
+                return
             try:
                 self.read_config()
             except:
                 print(f'Error reading config: {self._selected_config}')
                 print("Please check that the file is formatted correctly.")
                 exit()
+            if use_cache:
+                self.store_cached_config()
+
+    def set_defaults(self):
+        """Set all settings to their defaults"""
+        self._alarm_types = ["beep"]
+        self._alarm_sound = None
+        self._sound_player = None
+        self._notify_command = "notify-send"
+        self._use_colors = True
+        self._prefer_terminal_colors = False
+        self._alarm_repeat = 1
+        self._declared_categories = {}
+        self._journal = True
+        self._journal_fsync = "periodic"
+        self._history = True
+        self._control_socket = True
+        self._status_file = True
+        self._metrics_file = None
+        self._metrics_interval = 15
+        self._schedule = False
+
+        self._timers = [
+            {"repeat": 4, "timers": [
+                {"type": "work", "duration": 25},
+                {"type": "short break", "duration": 5},
+            ]},
+            {"type": "long break", "duration": 30},
+        ]
+        self.intern_categories()
+        self._sequence = None  # Compiled timers, see timers
 
     def find_config(self):
         """Try to find config file"""
         for possibility in self._possible_files:
-            p = Path(possibility)
-            expanded = p.expanduser()
-            """Older pythons than 3.8 might still throw an exception"""
-            try:
-                if expanded.is_file():
-                    return expanded
-            except:
-                continue
+            expanded = os.path.expanduser(possibility)
+            if os.path.isfile(expanded):
+                return expanded
         return None
 
     def insert_xdg_conf_location(self):
         """Insert XDG config file location"""
+        from appdirs import AppDirs
         dirs = AppDirs("potatotimer")
         xdg_config = dirs.user_config_dir
-        p = Path(xdg_config).joinpath('config.yml')
-        self._possible_files.insert(1, str(p))
+        self._possible_files.insert(1, os.path.join(xdg_config, 'config.yml'))
 
     def read_config(self):
-        """Load the config file"""
+        """Load the config file
+        #
+        # Uses the libyaml based loader when available
+        """
+        import yaml
+        loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
         with open(self._selected_config, 'r') as stream:
-            settings_yaml = yaml.safe_load(stream)
+            settings_yaml = yaml.load(stream, Loader=loader)
+            if not isinstance(settings_yaml, dict):
+                raise ConfigError("Config is not a mapping of settings")
             self.load_alarm_type(settings_yaml)
             self.load_alarm_repeat(settings_yaml)
             self.load_use_colors(settings_yaml)
+            self.load_journal(settings_yaml)
+            self.load_control_socket(settings_yaml)
+            self.load_metrics(settings_yaml)
+            self.load_categories(settings_yaml)
             self.load_timers(settings_yaml)
+            self.load_schedule(settings_yaml)
+            self.intern_categories()
+            self._sequence = None
+
+    def reload(self):
+        """Read the selected config file again
+        #
+        # Returns names of the settings that changed. A malformed file
+        # raises ConfigError and leaves current settings untouched.
+        """
+        previous = self.settings()
+        self.set_defaults()
+        try:
+            self.read_config()
+        except Exception as error:
+            self.apply_settings(previous)
+            if isinstance(error, ConfigError):
+                raise
+            raise ConfigError(f'{type(error).__name__}: {error}') from error
+        if self._use_cache:
+            self.store_cached_config()
+        current = self.settings()
+        return [key for key in current if current[key] != previous[key]]
+
+    def cache_file(self):
+        """Get path of compiled config cache for the selected config"""
+        from appdirs import AppDirs
+        path = os.path.abspath(self._selected_config)
+        name = f'config-{zlib.crc32(path.encode()):08x}.cache'
+        return os.path.join(AppDirs("potatotimer").user_cache_dir, name)
+
+    def cache_key(self):
+        """Get key identifying the selected config file's current contents"""
+        stat = os.stat(self._selected_config)
+        return (self.CACHE_VERSION, sys.implementation.cache_tag,
+                os.path.abspath(self._selected_config),
+                stat.st_mtime_ns, stat.st_size)
+
+    def load_cached_config(self):
+        """Load validated settings from cache if config file is unchanged
+        #
+        # Returns True when settings were loaded from cache
+        """
+        try:
+            with open(self.cache_file(), 'rb') as stream:
+                key, settings = marshal.load(stream)
+            if key != self.cache_key():
+                return False
+            self.apply_settings(settings)
+        except (OSError, EOFError, ValueError, TypeError, KeyError):
+            return False
+        return True
+
+    def store_cached_config(self):
+        """Store validated settings, failures only cost a YAML parse later"""
+        try:
+            cache_file = self.cache_file()
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            temp_file = f'{cache_file}.{os.getpid()}.tmp'
+            with open(temp_file, 'wb') as stream:
+                marshal.dump((self.cache_key(), self.settings()), stream)
+            os.replace(temp_file, cache_file)
+        except (OSError, ValueError):
+            pass
+
+    def settings(self):
+        """Get validated settings as a dictionary of plain values"""
+        return {
+            "alarm_types": self._alarm_types,
+            "alarm_sound": self._alarm_sound,
+            "sound_player": self._sound_player,
+            "notify_command": self._notify_command,
+            "alarm_repeat": self._alarm_repeat,
+            "use_colors": self._use_colors,
+            "prefer_terminal_colors": self._prefer_terminal_colors,
+            "journal": self._journal,
+            "journal_fsync": self._journal_fsync,
+            "history": self._history,
+            "control_socket": self._control_socket,
+            "status_file": self._status_file,
+            "metrics_file": self._metrics_file,
+            "metrics_interval": self._metrics_interval,
+            "timers": self._timers,
+            "schedule": self._schedule,
+            "declared_categories": self._declared_categories,
+            "categories": self._categories,
+            "groups": self._groups,
+        }
+
+    def apply_settings(self, settings):
+        """Set validated settings from a dictionary made by settings()"""
+        self._alarm_types = settings["alarm_types"]
+        self._alarm_sound = settings["alarm_sound"]
+        self._sound_player = settings["sound_player"]
+        self._notify_command = settings["notify_command"]
+        self._alarm_repeat = settings["alarm_repeat"]
+        self._use_colors = settings["use_colors"]
+        self._prefer_terminal_colors = settings["prefer_terminal_colors"]
+        self._journal = settings["journal"]
+        self._journal_fsync = settings["journal_fsync"]
+        self._history = settings["history"]
+        self._control_socket = settings["control_socket"]
+        self._status_file = settings["status_file"]
+        self._metrics_file = settings["metrics_file"]
+        self._metrics_interval = settings["metrics_interval"]
+        self._timers = settings["timers"]
+        self._schedule = settings["schedule"]
+        self._declared_categories = settings["declared_categories"]
+        self._categories = settings["categories"]
+        self._groups = settings["groups"]
+        self._sequence = None
 
     def load_alarm_type(self, settings_yaml):
-        """Try to load alarm type setting"""
+        """Try to load alarm type setting
+        #
+        # Alarm type may be a single type or a list of types
+        """
         if "alarm_type" in settings_yaml:
-            if settings_yaml["alarm_type"] == "beep":
-                self._alarm_type = "beep"
-            elif settings_yaml["alarm_type"] == "flash":
-                self._alarm_type = "flash"
+            alarm_types = settings_yaml["alarm_type"]
+            if not isinstance(alarm_types, list):
+                alarm_types = [alarm_types]
+            alarm_types = [
+                alarm_type for alarm_type in alarm_types
+                if alarm_type in ("beep", "flash", "notify", "sound")
+            ]
+            if alarm_types:
+                self._alarm_types = alarm_types
+
+        if "alarm_sound" in settings_yaml:
+            self._alarm_sound = os.path.expanduser(settings_yaml["alarm_sound"])
+        if "sound_player" in settings_yaml:
+            self._sound_player = settings_yaml["sound_player"]
+        if "notify_command" in settings_yaml:
+            self._notify_command = settings_yaml["notify_command"]
 
     def load_alarm_repeat(self, settings_yaml):
         """Try to load alarm count"""
@@ -104,34 +279,304 @@ class Config:
             else:
                 self._prefer_terminal_colors = False
 
+    def load_journal(self, settings_yaml):
+        """Try to load session journal and history settings"""
+        if "journal" in settings_yaml:
+            self._journal = bool(settings_yaml["journal"])
+        if settings_yaml.get("journal_fsync") in self.FSYNC_POLICIES:
+            self._journal_fsync = settings_yaml["journal_fsync"]
+        if "history" in settings_yaml:
+            self._history = bool(settings_yaml["history"])
+
+    def load_control_socket(self, settings_yaml):
+        """Try to load control socket (True, False or a path) and status
+        # file settings
+        """
+        if "control_socket" in settings_yaml:
+            control_socket = settings_yaml["control_socket"]
+            if isinstance(control_socket, str):
+                self._control_socket = os.path.expanduser(control_socket)
+            else:
+                self._control_socket = bool(control_socket)
+        if "status_file" in settings_yaml:
+            self._status_file = bool(settings_yaml["status_file"])
+
+    def load_metrics(self, settings_yaml):
+        """Try to load Prometheus metrics file path and write interval"""
+        if isinstance(settings_yaml.get("metrics_file"), str):
+            self._metrics_file = os.path.expanduser(settings_yaml["metrics_file"])
+        interval = settings_yaml.get("metrics_interval")
+        if isinstance(interval, (int, float)) and interval > 0:
+            self._metrics_interval = interval
+
     def load_timers(self, settings_yaml):
         """Try to load timers"""
-        loaded_timers = []
-        if "timers" in settings_yaml:
-            for timer in settings_yaml["timers"]:
-                if "type" in timer and "duration" in timer:
-                    if timer["duration"] > 0:
-                        loaded_timers.append({
-                            "type": timer["type"],
-                            "duration": timer["duration"]
-                        })
-        if loaded_timers:
-            self._timers = loaded_timers
+        if isinstance(settings_yaml.get("timers"), list):
+            loaded_timers = self.parse_timers(settings_yaml["timers"])
+            if loaded_timers:
+                self._timers = loaded_timers
+
+    @classmethod
+    def parse_timers(cls, items):
+        """Parse a list of timers and repeat blocks
+        #
+        # A repeat block runs its own list of timers and blocks repeat
+        # times over. Blocks are kept as they are, not expanded, see
+        # TimerSequence. Invalid timers and empty blocks are left out.
+        """
+        timers = []
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            if "repeat" in item:
+                repeat = item["repeat"]
+                if not isinstance(repeat, int) or isinstance(repeat, bool):
+                    continue
+                if repeat < 1 or not isinstance(item.get("timers"), list):
+                    continue
+                block = cls.parse_timers(item["timers"])
+                if block:
+                    timers.append({"repeat": repeat, "timers": block})
+            elif "type" in item and "duration" in item:
+                if item["duration"] > 0:
+                    timers.append({
+                        "type": item["type"],
+                        "duration": item["duration"]
+                    })
+        return timers
+
+    def load_schedule(self, settings_yaml):
+        """Try to load a schedule of timers at wall clock times
+        #
+        # A slot starts at a time of day on given weekdays (every day by
+        # default), or once at a date and time. A slot without a start
+        # time starts when the previous one ends. The slots replace timers,
+        # with their start as "date" (None for repeating slots), "time"
+        # (seconds from midnight) and "days" (weekday numbers).
+        """
+        if not isinstance(settings_yaml.get("schedule"), list):
+            return
+        slots = []
+        for slot in settings_yaml["schedule"]:
+            if not isinstance(slot, dict) or "type" not in slot:
+                continue
+            duration = slot.get("duration")
+            if not isinstance(duration, (int, float)) or duration <= 0:
+                continue
+            if "at" in slot:
+                start = self.parse_slot_start(slot["at"])
+                if start is None:
+                    continue
+                day, seconds = start
+                days = None
+                if day is None:
+                    days = self.parse_weekdays(slot.get("days", "daily"))
+                    if not days:
+                        continue
+            elif slots:
+                previous = slots[-1]
+                day = previous["date"]
+                days = previous["days"]
+                seconds = previous["time"] + round(previous["duration"] * 60)
+                shift, seconds = divmod(seconds, 86400)
+                if day is not None:
+                    from datetime import date, timedelta
+                    day = (date(*day) + timedelta(days=shift)).timetuple()[:3]
+                else:
+                    days = sorted((weekday + shift) % 7 for weekday in days)
+            else:
+                continue
+            slots.append({
+                "type": slot["type"],
+                "duration": duration,
+                "date": day,
+                "time": seconds,
+                "days": days,
+            })
+        if slots:
+            self._timers = slots
+            self._schedule = True
+
+    @staticmethod
+    def parse_slot_start(value):
+        """Parse start of a schedule slot
+        #
+        # Returns (date tuple or None, seconds from midnight), or None when
+        # the value is not "H:MM", "H:MM:SS" or a date and time like
+        # "2026-10-20 10:15". Unquoted 7:00 is read by YAML as 420
+        # (minutes), which is accepted too.
+        """
+        from datetime import date, datetime
+        if isinstance(value, bool):
+            return None
+        if isinstance(value, int):
+            return (None, value * 60) if 0 <= value < 1440 else None
+        if isinstance(value, datetime):
+            return (value.timetuple()[:3],
+                    value.hour * 3600 + value.minute * 60 + value.second)
+        if isinstance(value, date):
+            return (value.timetuple()[:3], 0)
+        if not isinstance(value, str):
+            return None
+        parts = value.split()
+        day = None
+        try:
+            if len(parts) == 2:
+                day = date.fromisoformat(parts[0]).timetuple()[:3]
+                parts = parts[1:]
+            if len(parts) != 1:
+                return None
+            fields = [int(field) for field in parts[0].split(":")]
+        except ValueError:
+            return None
+        if len(fields) == 2:
+            fields.append(0)
+        if len(fields) != 3:
+            return None
+        hours, minutes, seconds = fields
+        if not (0 <= hours < 24 and 0 <= minutes < 60 and 0 <= seconds < 60):
+            return None
+        return (day, hours * 3600 + minutes * 60 + seconds)
+
+    @classmethod
+    def parse_weekdays(cls, value):
+        """Parse weekdays of a repeating slot into sorted weekday numbers
+        #
+        # Takes a day name (monday or mon), daily, weekdays or weekend, or
+        # a list of them. Unknown names are left out.
+        """
+        if not isinstance(value, list):
+            value = [value]
+        days = set()
+        for name in value:
+            name = str(name).lower()
+            if name in cls.WEEKDAY_SETS:
+                days.update(cls.WEEKDAY_SETS[name])
+            elif name[:3] in cls.WEEKDAYS:
+                days.add(cls.WEEKDAYS.index(name[:3]))
+        return sorted(days)
+
+    def load_categories(self, settings_yaml):
+        """Try to load per-type colors and stat groups"""
+        if isinstance(settings_yaml.get("categories"), dict):
+            for name, category in settings_yaml["categories"].items():
+                declared = {}
+                if isinstance(category, dict):
+                    if category.get("color") in self.COLORS:
+                        declared["color"] = category["color"]
+                    if "group" in category:
+                        declared["group"] = str(category["group"])
+                self._declared_categories[name] = declared
+
+    def intern_categories(self):
+        """Give every timer type an integer category id
+        #
+        # Categories take color and stat group from config, or from built-in
+        # defaults. Other types are yellow and have a stat group of their
+        # own. Stat groups always start with work, short and long break.
+        """
+        self._groups = ["work", "short break", "long break"]
+        self._categories = []
+        category_ids = {}
+        for timer in self.pattern_timers(self._timers):
+            name = timer["type"]
+            if name not in category_ids:
+                category_ids[name] = len(self._categories)
+                color, group = self.BUILTIN_CATEGORIES.get(
+                    name, (self.DEFAULT_COLOR, str(name)))
+                declared = self._declared_categories.get(name, {})
+                color = declared.get("color", color)
+                group = declared.get("group", group)
+                if group not in self._groups:
+                    self._groups.append(group)
+                self._categories.append({
+                    "name": name,
+                    "color": self.COLORS[color],
+                    "group": self._groups.index(group),
+                })
+            timer["category"] = category_ids[name]
+
+    @classmethod
+    def pattern_timers(cls, pattern):
+        """Go through each timer of a pattern once, not expanding repeats"""
+        for item in pattern:
+            if "repeat" in item:
+                yield from cls.pattern_timers(item["timers"])
+            else:
+                yield item
 
     def get_timer(self, timer_id):
-        """Get timer by id"""
-        if timer_id < len(self._timers):
-            return self._timers[timer_id]
-        else:
-            raise IndexError("Timer not found")
+        """Get timer by id, in O(nesting depth) of repeat blocks"""
+        return self.timers[timer_id]
 
     @property
     def selected_config(self):
         return self._selected_config
 
+    @property
+    def real_path(self):
+        """Selected config file with links resolved, None for defaults"""
+        if self._selected_config is None:
+            return None
+        return os.path.realpath(self._selected_config)
+
     @property
     def timers(self):
-        return self._timers
+        """Timers as a TimerSequence, indexable and iterable like a list
+        #
+        # Compiled on first use after the timers changed
+        """
+        if self._sequence is None:
+            from .TimerSequence import TimerSequence
+            self._sequence = TimerSequence(
+                self._timers, self._categories, len(self._groups))
+        return self._sequence
+
+    @property
+    def schedule(self):
+        """Whether timers are schedule slots at wall clock times"""
+        return self._schedule
+
+    @property
+    def categories(self):
+        """Categories by id: name, color pair id and stat group id"""
+        return self._categories
+
+    @property
+    def groups(self):
+        """Stat group names by id"""
+        return self._groups
+
+    @property
+    def journal(self):
+        return self._journal
+
+    @property
+    def journal_fsync(self):
+        return self._journal_fsync
+
+    @property
+    def history(self):
+        return self._history
+
+    @property
+    def control_socket(self):
+        """Control socket path, True for the default path or False"""
+        return self._control_socket
+
+    @property
+    def status_file(self):
+        return self._status_file
+
+    @property
+    def metrics_file(self):
+        """Prometheus textfile path, None when not exporting"""
+        return self._metrics_file
+
+    @property
+    def metrics_interval(self):
+        """Seconds between metrics file writes"""
+        return self._metrics_interval
 
     @property
     def use_colors(self):
@@ -147,4 +592,20 @@ class Config:
 
     @property
     def alarm_type(self):
-        return self._alarm_type
+        return self._alarm_types[0]
+
+    @property
+    def alarm_types(self):
+        return self._alarm_types
+
+    @property
+    def alarm_sound(self):
+        return self._alarm_sound
+
+    @property
+    def sound_player(self):
+        return self._sound_player
+
+    @property
+    def notify_command(self):
+        return self._notify_command
@@ -0,0 +1,93 @@
+import os
+import struct
+
+
+class ConfigWatcher:
+    """Notice changes to the config file
+    #
+    # Uses inotify on Linux, watching the directory of the file so that
+    # editors replacing the file on save are noticed too. Elsewhere the file
+    # is polled with stat() whenever the main loop wakes up anyway.
+    """
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_NONBLOCK = 0x00000800
+    IN_CLOEXEC = 0x00080000
+    EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, name length
+
+    def __init__(self, path):
+        self._path = os.path.abspath(path)
+        self._directory, self._name = os.path.split(self._path)
+        self._fd = None
+        self._signature = self.signature()
+        self.start_inotify()
+
+    def start_inotify(self):
+        """Try to watch the config directory with inotify"""
+        try:
+            import ctypes
+            libc = ctypes.CDLL(None, use_errno=True)
+            fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return
+        if fd < 0:
+            return
+        """Only finished writes, not half written files"""
+        mask = self.IN_CLOSE_WRITE | self.IN_MOVED_TO
+        if libc.inotify_add_watch(fd, os.fsencode(self._directory), mask) < 0:
+            os.close(fd)
+            return
+        self._fd = fd
+
+    def fileno(self):
+        """File descriptor to wait on, None when polling"""
+        return self._fd
+
+    def signature(self):
+        """Modification time and size of the config file"""
+        try:
+            stat = os.stat(self._path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def changed(self):
+        """Whether the config file changed since last call
+        #
+        # With inotify this only reads pending events, without it the file
+        # is stat()ed. A file that disappeared (mid-save) is not a change.
+        """
+        if self._fd is not None and not self.read_events():
+            return False
+        signature = self.signature()
+        if signature is None or signature == self._signature:
+            return False
+        self._signature = signature
+        return True
+
+    def read_events(self):
+        """Read pending inotify events, True if any concerned the file"""
+        concerned = False
+        while True:
+            try:
+                data = os.read(self._fd, 4096)
+            except (BlockingIOError, InterruptedError):
+                return concerned
+            if not data:
+                return concerned
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = self.EVENT_HEADER.unpack_from(
+                    data, offset)
+                offset += self.EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                if os.fsdecode(name) == self._name:
+                    concerned = True
+
+    def close(self):
+        """Stop watching"""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
@@ -0,0 +1,204 @@
+import json
+import os
+import socket
+from .StatusSnapshot import StatusSnapshot
+
+
+class ControlConnection:
+    """Client connected to the control socket"""
+
+    def __init__(self, sock):
+        self.socket = sock
+        self.input = bytearray()
+        self.output = bytearray()
+        self.subscribed = False
+
+    def fileno(self):
+        return self.socket.fileno()
+
+
+class ControlServer:
+    """Line-delimited JSON control API on a Unix domain socket
+    #
+    # Requests are JSON objects with a command: status, start, stop, next,
+    # reset, subscribe or shutdown. Each gets one JSON response line,
+    # echoing the id of the request if it has one. Subscribers also get a
+    # line for every engine event and notice. Sockets are non-blocking and
+    # served by the main loop, which also waits for clients with queued
+    # output to take more. A client that does not keep up with its output
+    # is disconnected.
+    """
+
+    COMMANDS = (
+        "status", "start", "stop", "next", "reset", "subscribe", "shutdown")
+    MAX_LINE = 4096  # Bytes in a request line at most
+    MAX_OUTPUT = 64 * 1024  # Bytes waiting for a slow client at most
+
+    def __init__(self, handler, path=None):
+        self._handler = handler  # Runs a command, returns response dict
+        self._path = path if path is not None else self.default_path()
+        self._listener = None
+        self._connections = {}  # By file descriptor
+
+    @staticmethod
+    def default_path():
+        """Get default control socket location"""
+        return os.path.join(StatusSnapshot.runtime_dir(), "control.sock")
+
+    def start(self):
+        """Start listening
+        #
+        # A socket left behind by a crashed timer is replaced, one that is
+        # still answering belongs to another timer and raises OSError.
+        """
+        os.makedirs(os.path.dirname(self._path), mode=0o700, exist_ok=True)
+        if os.path.exists(self._path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self._path)
+            except OSError:
+                os.unlink(self._path)
+            else:
+                raise OSError(f'{self._path} is in use by another timer')
+            finally:
+                probe.close()
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o177)
+        try:
+            listener.bind(self._path)
+        finally:
+            os.umask(old_umask)
+        listener.listen(8)
+        listener.setblocking(False)
+        self._listener = listener
+
+    def fds(self):
+        """File descriptors for the main loop to wait on"""
+        if self._listener is None:
+            return []
+        return [self._listener.fileno()] + list(self._connections)
+
+    def write_fds(self):
+        """File descriptors with queued output to wait on for writing"""
+        return [fd for fd, connection in self._connections.items()
+                if connection.output]
+
+    def poll(self, ready):
+        """Accept connections and serve requests on ready descriptors
+        #
+        # Queued output is written to every client that takes it
+        """
+        if self._listener is None:
+            return
+        if self._listener.fileno() in ready:
+            self.accept()
+        for fd in ready:
+            connection = self._connections.get(fd)
+            if connection is not None:
+                self.receive(connection)
+        self.flush()
+
+    def accept(self):
+        """Accept pending connections"""
+        while True:
+            try:
+                sock, address = self._listener.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            sock.setblocking(False)
+            self._connections[sock.fileno()] = ControlConnection(sock)
+
+    def receive(self, connection):
+        """Read from a client and answer each complete request line"""
+        try:
+            data = connection.socket.recv(self.MAX_LINE)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self.disconnect(connection)
+            return
+        connection.input += data
+        while True:
+            end = connection.input.find(b"\n")
+            if end < 0:
+                break
+            line = bytes(connection.input[:end])
+            del connection.input[:end + 1]
+            if line.strip():
+                self.send(connection, self.respond(connection, line))
+        if len(connection.input) > self.MAX_LINE:
+            self.send(connection, {"ok": False, "error": "request too long"})
+            self.flush()
+            self.disconnect(connection)
+
+    def respond(self, connection, line):
+        """Run a request line and get the response"""
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return {"ok": False, "error": "invalid JSON"}
+        if not isinstance(request, dict):
+            return {"ok": False, "error": "request is not an object"}
+        command = request.get("command")
+        if command not in self.COMMANDS:
+            response = {"ok": False, "error": f'unknown command: {command}'}
+        else:
+            if command == "subscribe":
+                connection.subscribed = True
+                command = "status"
+            response = self._handler(command)
+        if "id" in request:
+            response["id"] = request["id"]
+        return response
+
+    def publish(self, message):
+        """Push a message to all subscribers"""
+        for connection in list(self._connections.values()):
+            if connection.subscribed:
+                self.send(connection, message)
+        self.flush()
+
+    def send(self, connection, message):
+        """Queue a JSON line for a client"""
+        connection.output += json.dumps(message).encode() + b"\n"
+
+    def flush(self):
+        """Write queued output without blocking"""
+        for connection in list(self._connections.values()):
+            if not connection.output:
+                continue
+            try:
+                sent = connection.socket.send(connection.output)
+            except (BlockingIOError, InterruptedError):
+                sent = 0
+            except OSError:
+                self.disconnect(connection)
+                continue
+            del connection.output[:sent]
+            if len(connection.output) > self.MAX_OUTPUT:
+                self.disconnect(connection)
+
+    def disconnect(self, connection):
+        """Close a client connection"""
+        self._connections.pop(connection.fileno(), None)
+        connection.socket.close()
+
+    def close(self):
+        """Close all connections and remove the socket"""
+        for connection in list(self._connections.values()):
+            self.disconnect(connection)
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+            try:
+                os.unlink(self._path)
+            except OSError:
+                pass
+
+    @property
+    def path(self):
+        return self._path
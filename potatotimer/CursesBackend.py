@@ -0,0 +1,160 @@
+import curses
+import os
+import select
+import signal
+import sys
+import time
+
+
+class CursesBackend:
+    """Terminal backend for Screen using curses"""
+
+    KEY_RESIZE = curses.KEY_RESIZE
+
+    def __init__(self):
+        self._wakeup_pipe = None
+        self._previous_sigwinch = None
+        self._resize_pending = False
+
+    def start(self):
+        """Initialize curses with defaults"""
+        self.stdscr = curses.initscr()
+        curses.noecho()
+        curses.cbreak()
+        curses.curs_set(0)
+        self.stdscr.keypad(True)
+        curses.setsyx(-1, -1)
+        self.watch_resize()
+
+    def stop(self):
+        """Revert terminal to original state"""
+        self.unwatch_resize()
+        curses.nocbreak()
+        self.stdscr.keypad(False)
+        curses.echo()
+        curses.endwin()
+
+    def has_colors(self):
+        """Whether the terminal supports colors"""
+        return curses.has_colors()
+
+    def start_colors(self, prefer_terminal_colors):
+        """Initialize colors"""
+        curses.start_color()
+        curses.use_default_colors()
+
+        if curses.can_change_color() and not prefer_terminal_colors:
+            curses.init_color(curses.COLOR_RED, 1000, 300, 300)
+            curses.init_color(curses.COLOR_GREEN, 500, 1000, 300)
+            curses.init_color(curses.COLOR_BLUE, 300, 700, 1000)
+            curses.init_color(curses.COLOR_YELLOW, 1000, 750, 0)
+
+        curses.init_pair(2, curses.COLOR_RED, -1)
+        curses.init_pair(3, curses.COLOR_GREEN, -1)
+        curses.init_pair(4, curses.COLOR_BLUE, -1)
+        curses.init_pair(5, curses.COLOR_YELLOW, -1)
+        curses.init_pair(6, curses.COLOR_MAGENTA, -1)
+        curses.init_pair(7, curses.COLOR_CYAN, -1)
+        curses.init_pair(8, curses.COLOR_WHITE, -1)
+
+    def new_window(self, height, width, start_y, start_x):
+        """Create a new curses window"""
+        return curses.newwin(height, width, start_y, start_x)
+
+    def color_pair(self, i):
+        """Get attribute for color pair"""
+        return curses.color_pair(i)
+
+    def screen_size(self):
+        """Get screen size"""
+        if self._wakeup_pipe is not None:
+            """Our SIGWINCH handler replaced ncurses' own, resize manually"""
+            size = os.get_terminal_size(sys.__stdout__.fileno())
+            if (size.lines, size.columns) != (curses.LINES, curses.COLS):
+                curses.resizeterm(size.lines, size.columns)
+        curses.update_lines_cols()
+        return curses.LINES, curses.COLS
+
+    def update(self):
+        """Send windows staged with noutrefresh to the terminal"""
+        curses.doupdate()
+
+    def output_counters(self):
+        """Terminal writes and bytes emitted, unknown to curses"""
+        return {}
+
+    def beep(self):
+        """Ring the terminal bell"""
+        curses.beep()
+
+    def flash(self):
+        """Flash the terminal window"""
+        curses.flash()
+
+    def wait_for_input(self, timeout, fds=(), write_fds=()):
+        """Block until input is available or timeout (seconds) has passed
+        #
+        # Returns the list of file descriptors that are ready for reading.
+        # Wakes up early on terminal resize or when one of write_fds is
+        # ready for writing.
+        """
+        readers = [sys.stdin] + list(fds)
+        if self._wakeup_pipe is not None:
+            readers.append(self._wakeup_pipe[0])
+        try:
+            ready, _, _ = select.select(readers, list(write_fds), [], timeout)
+        except (OSError, ValueError):
+            """Console handles can't be selected on every platform"""
+            time.sleep(min(timeout, 0.2))
+            return [sys.stdin]
+        if self._wakeup_pipe is not None and self._wakeup_pipe[0] in ready:
+            self._drain_wakeup_pipe()
+            ready.remove(self._wakeup_pipe[0])
+        return ready
+
+    def consume_resize(self):
+        """Whether terminal was resized since last call"""
+        resized = self._resize_pending
+        self._resize_pending = False
+        return resized
+
+    def watch_resize(self):
+        """Wake up wait_for_input on SIGWINCH
+        #
+        # Python retries select() after signals handled in C, so ncurses'
+        # own SIGWINCH handler would not interrupt the wait.
+        """
+        if not hasattr(signal, "SIGWINCH"):
+            return
+        try:
+            read_fd, write_fd = os.pipe()
+            os.set_blocking(read_fd, False)
+            os.set_blocking(write_fd, False)
+            signal.set_wakeup_fd(write_fd)
+        except (OSError, ValueError):
+            return
+        self._wakeup_pipe = (read_fd, write_fd)
+        self._previous_sigwinch = signal.signal(
+            signal.SIGWINCH, self._handle_sigwinch)
+
+    def unwatch_resize(self):
+        """Restore signal handling changed by watch_resize"""
+        if self._wakeup_pipe is None:
+            return
+        signal.signal(signal.SIGWINCH, self._previous_sigwinch or signal.SIG_DFL)
+        signal.set_wakeup_fd(-1)
+        for fd in self._wakeup_pipe:
+            os.close(fd)
+        self._wakeup_pipe = None
+
+    def _handle_sigwinch(self, signum, frame):
+        """Flag terminal resize, the wakeup fd interrupts the wait"""
+        self._resize_pending = True
+
+    def _drain_wakeup_pipe(self):
+        """Empty the signal wakeup pipe"""
+        try:
+            while os.read(self._wakeup_pipe[0], 512):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
@@ -0,0 +1,353 @@
+import select
+import sys
+import time
+from .AlarmScheduler import AlarmScheduler
+from .Config import ConfigError
+from .ConfigWatcher import ConfigWatcher
+from .ControlServer import ControlServer
+from .History import History
+from .Journal import Journal
+from .MetricsExporter import MetricsExporter
+from .ScheduleEngine import ScheduleEngine
+from .StatusSnapshot import StatusSnapshot
+from .TimerEngine import NS_PER_SECOND
+
+
+class Daemon:
+    """Timer engine with its journal, history, control socket and exports
+    #
+    # The daemon owns the only engine. Terminals attach to it over the
+    # control socket (see RemoteEngine) and are pushed state on engine
+    # events, so the engine runs once however many terminals are open,
+    # and closing all of them does not stop the timer. Notification and
+    # sound alarms are raised here too, so they go off once, with or
+    # without terminals, and counts and totals start over at midnight.
+    # Without a control socket the daemon runs inside the user interface
+    # instead.
+    """
+
+    CONFIG_POLL_INTERVAL = 2  # Seconds between config checks without inotify
+    TIMER_SETTINGS = {"timers", "schedule", "categories", "groups"}
+
+    def __init__(self, config, engine, instruments=None):
+        self._config = config
+        self._engine = engine
+        self._instruments = instruments  # Timing histograms, None when off
+        self._watcher = None
+        self._journal = None
+        self._history = None
+        self._control = None
+        self._status_file = None
+        self._metrics = None
+        self._alarms = AlarmScheduler(
+            config, alarm_types=AlarmScheduler.EXTERNAL_ALARMS)
+        self._midnight_ns = None  # Wall clock start of the next day
+        self._notices = []  # Messages for the user not shown yet
+        self._stopping = False
+
+    def open(self):
+        """Start serving the engine
+        #
+        # The control socket comes first: when another daemon already has
+        # it, the journal and history must be left to that one.
+        """
+        self._midnight_ns = Journal.next_midnight_ns(time.time_ns())
+        if self._config.selected_config is not None:
+            self._watcher = ConfigWatcher(self._config.selected_config)
+        if self._config.control_socket:
+            self.open_control()
+        if self._config.control_socket and self._control is None:
+            return
+        self._engine.add_listener(self.raise_alarm)
+        if self._config.journal:
+            self.open_journal()
+        if self._config.history:
+            self.open_history()
+        if self._config.status_file:
+            self.open_status_file()
+        if self._config.metrics_file is not None:
+            self._metrics = MetricsExporter(
+                self._config.metrics_file, self._config, self._engine,
+                self._instruments)
+            self._metrics.start()
+
+    def close(self):
+        """Stop serving, writing out everything recorded"""
+        self._alarms.shutdown()
+        if self._watcher is not None:
+            self._watcher.close()
+        if self._journal is not None:
+            self._journal.close()
+        if self._history is not None:
+            self._history.close()
+        if self._control is not None:
+            self._control.close()
+        if self._status_file is not None:
+            self._status_file.close()
+        if self._metrics is not None:
+            self._metrics.close()
+
+    def open_journal(self):
+        """Restore previous session from journal and record this one
+        #
+        # The timer works without a journal when it can't be opened
+        """
+        journal = Journal(self._config)
+        try:
+            if journal.open(self._engine):
+                self.notice("Session restored from journal")
+        except OSError as error:
+            self.notice(f'Journal not in use: {error.strerror}')
+            return
+        self._journal = journal
+
+    def open_history(self):
+        """Record time spent in timers to history for stats"""
+        history = History()
+        try:
+            history.open(self._engine)
+        except OSError as error:
+            self.notice(f'History not in use: {error.strerror}')
+            return
+        self._history = history
+
+    def open_control(self):
+        """Serve the control API on a Unix socket"""
+        path = self._config.control_socket
+        control = ControlServer(
+            self.run_command, path if isinstance(path, str) else None)
+        try:
+            control.start()
+        except OSError as error:
+            self.notice(f'Control socket not in use: {error.strerror or error}')
+            return
+        self._control = control
+        self._engine.add_listener(self.publish_event)
+
+    def open_status_file(self):
+        """Publish timer status to a memory-mapped file for status bars"""
+        status_file = StatusSnapshot()
+        try:
+            status_file.open()
+        except OSError as error:
+            self.notice(f'Status file not in use: {error.strerror or error}')
+            return
+        status_file.publish(self._engine)
+        self._status_file = status_file
+        self._engine.add_listener(self.publish_status)
+
+    def run(self):
+        """Serve attached terminals until told to shut down
+        #
+        # Sleeps until a client sends something, the config file changes or
+        # the running timer runs out. Notices go to stderr. Returns False
+        # when the control socket could not be opened.
+        """
+        self.open()
+        instruments = self._instruments
+        if instruments is not None:
+            self._engine.add_listener(self.record_lateness)
+        try:
+            self.print_notices()
+            if self._control is None:
+                return False
+            while not self._stopping:
+                timeout = self.next_wakeup()
+                if instruments is not None and timeout is not None:
+                    planned = (time.perf_counter_ns() +
+                               round(timeout * NS_PER_SECOND))
+                ready, _, _ = select.select(
+                    self.fds(), self.write_fds(), [], timeout)
+                if instruments is not None and timeout is not None:
+                    lateness = time.perf_counter_ns() - planned
+                    if lateness >= 0:
+                        instruments.record("loop_lateness", lateness)
+                self.serve(ready)
+                if instruments is None:
+                    self._engine.update()
+                else:
+                    instruments.timed("engine_update", self._engine.update)
+                self.check_day()
+                """No terminal here, the alarm is acknowledged once raised"""
+                self._engine.ack_alarm()
+                self._alarms.run_due()
+                self.print_notices()
+        finally:
+            self.close()
+        return True
+
+    def print_notices(self):
+        """Write notices to stderr, the log of a background daemon"""
+        for notice in self.take_notices():
+            print(notice, file=sys.stderr, flush=True)
+
+    def fds(self):
+        """File descriptors to wait on"""
+        fds = []
+        if self._watcher is not None and self._watcher.fileno() is not None:
+            fds.append(self._watcher.fileno())
+        if self._control is not None:
+            fds.extend(self._control.fds())
+        return fds
+
+    def write_fds(self):
+        """File descriptors to wait on for writing"""
+        if self._control is None:
+            return []
+        return self._control.write_fds()
+
+    def next_wakeup(self):
+        """Seconds until the daemon has something to do, None for never"""
+        timeout = self._engine.time_to_deadline()
+        midnight = max(0, self._midnight_ns - time.time_ns()) / NS_PER_SECOND
+        for deadline in (self._alarms.next_deadline(), midnight):
+            if deadline is not None and (timeout is None or deadline < timeout):
+                timeout = deadline
+        if self._watcher is not None and self._watcher.fileno() is None:
+            if timeout is None or timeout > self.CONFIG_POLL_INTERVAL:
+                timeout = self.CONFIG_POLL_INTERVAL
+        return timeout
+
+    def poll(self, ready):
+        """Serve clients on ready descriptors and run the engine"""
+        self.serve(ready)
+        self._engine.update()
+        self.check_day()
+        self._alarms.run_due()
+
+    def serve(self, ready):
+        """Serve clients on ready descriptors and reload changed config"""
+        if self._control is not None:
+            self._control.poll(ready)
+        self.check_config()
+
+    def check_config(self):
+        """Reload config file if it changed
+        #
+        # Counters and the current timer are kept. Timers are rebuilt only
+        # when settings they are made of changed, listeners (and through the
+        # control socket attached terminals) get a reload event then. Other
+        # changes only make attached terminals read the file again. A
+        # malformed file is rejected and the previous settings stay in use.
+        """
+        if self._watcher is None or not self._watcher.changed():
+            return
+        try:
+            changed = self._config.reload()
+        except ConfigError as error:
+            self.notice(f'Config not reloaded: {str(error).splitlines()[0]}')
+            return
+        if self.TIMER_SETTINGS & set(changed):
+            self._engine.reload_timers()
+        elif changed and self._control is not None:
+            self._control.publish({"event": "config"})
+        if changed:
+            self.notice("Config reloaded")
+
+    def check_day(self):
+        """Start counts and totals over on the first update of a new day
+        #
+        # As journal replay does on startup. History gets the time up to
+        # now first, listeners get a day event after.
+        """
+        now = time.time_ns()
+        if now < self._midnight_ns:
+            return
+        self._midnight_ns = Journal.next_midnight_ns(now)
+        if self._history is not None:
+            self._history.record("day", self._engine)
+        self._engine.clear_stats()
+        self._engine.notify("day")
+
+    def run_command(self, command):
+        """Run a timer command from a terminal or the control socket
+        #
+        # Returns a control API response with the resulting status
+        """
+        self._engine.update()
+        if command == "start":
+            self._engine.start_timer()
+        elif command == "stop":
+            self._engine.stop_timer()
+        elif command == "next":
+            self._engine.next_timer()
+            self._engine.reset_timer()
+        elif command == "reset":
+            self._engine.reset_timer()
+        elif command == "shutdown":
+            self._stopping = True
+        return {"ok": True, "status": self.status()}
+
+    def status(self):
+        """Timer status as a dictionary of plain values
+        #
+        # State is the engine snapshot attached terminals restore from, and
+        # config the file it is made of, for them to check theirs against
+        """
+        engine = self._engine
+        category = self._config.categories[engine.timer_category]
+        return {
+            "running": engine.running,
+            "timer": engine.timer_name,
+            "timer_id": engine.current_timer_id,
+            "group": self._config.groups[category["group"]],
+            "elapsed": engine.time_elapsed,
+            "duration": engine.timer_duration,
+            "remaining": engine.timer_duration - engine.time_elapsed,
+            "counts": {
+                name: engine.count(group)
+                for group, name in enumerate(engine.group_names)
+            },
+            "totals": {
+                name: engine.total_time(group) / NS_PER_SECOND
+                for group, name in enumerate(engine.group_names)
+            },
+            "state": engine.snapshot(),
+            "config": self._config.real_path,
+        }
+
+    def publish_event(self, event, engine):
+        """Engine listener: push event and status to control subscribers"""
+        self._control.publish({"event": event, "status": self.status()})
+
+    def raise_alarm(self, event, engine):
+        """Engine listener: run notification and sound alarms
+        #
+        # On a schedule the timer may stop, to wait for the next slot
+        """
+        if event != "complete":
+            return
+        message = f'{engine.timer_name} started'
+        if not engine.running:
+            slot = self._config.get_timer(engine.current_timer_id)
+            message = (f'Waiting for {engine.timer_name} at '
+                       f'{ScheduleEngine.format_slot_start(slot)}')
+        if engine.transitions > 1:
+            message = f'{message} (missed {engine.transitions} timer transitions)'
+        self._alarms.trigger(message)
+
+    def record_lateness(self, event, engine):
+        """Engine listener: record how late timer ends were noticed"""
+        if event == "complete":
+            self._instruments.record("alarm_latency", engine.lateness_ns)
+
+    def publish_status(self, event, engine):
+        """Engine listener: update status file for status bars"""
+        self._status_file.publish(engine)
+
+    def notice(self, message):
+        """Queue a message for the user, attached terminals get it too"""
+        self._notices.append(message)
+        if self._control is not None:
+            self._control.publish({"event": "notice", "notice": message})
+
+    def take_notices(self):
+        """Get and forget queued notices"""
+        notices = self._notices
+        self._notices = []
+        return notices
+
+    @property
+    def stopping(self):
+        """Whether a shutdown command was received"""
+        return self._stopping
@@ -0,0 +1,102 @@
+import time
+from datetime import datetime, timezone
+from .TimerEngine import NS_PER_SECOND
+
+
+class Exporter:
+    """Write history rows as CSV, JSON Lines or iCalendar events
+    #
+    # Rows are taken from a generator and written one by one, so memory use
+    # stays the same no matter how long the history is.
+    """
+
+    FORMATS = ("csv", "jsonl", "ics")
+    FIELDS = ["start", "end", "category", "duration", "completed"]
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def export(self, rows, format):
+        """Write rows of (start ns, duration ns, category, completed)"""
+        getattr(self, f'write_{format}')(rows)
+
+    def write_csv(self, rows):
+        """Write rows as CSV with a header line, durations in seconds"""
+        import csv
+        writer = csv.writer(self._stream)
+        writer.writerow(self.FIELDS)
+        for start, duration, category, completed in rows:
+            writer.writerow([
+                self.local_time(start), self.local_time(start + duration),
+                category, duration / NS_PER_SECOND, completed,
+            ])
+
+    def write_jsonl(self, rows):
+        """Write rows as JSON objects one per line, durations in seconds"""
+        import json
+        for start, duration, category, completed in rows:
+            self._stream.write(json.dumps(dict(zip(self.FIELDS, [
+                self.local_time(start), self.local_time(start + duration),
+                category, duration / NS_PER_SECOND, completed,
+            ]))) + "\n")
+
+    def write_ics(self, rows):
+        """Write rows as VEVENTs of an iCalendar file
+        #
+        # Times are in UTC, lines end in CRLF and are folded at 75 octets
+        # as RFC 5545 requires
+        """
+        write = self._stream.write
+        stamp = self.utc_time(time.time_ns())
+        write("BEGIN:VCALENDAR\r\nVERSION:2.0\r\n"
+              "PRODID:-//potatotimer//history export//EN\r\n")
+        for start, duration, category, completed in rows:
+            category = self.escape_text(category)
+            write("BEGIN:VEVENT\r\n"
+                  f"{self.fold(f'UID:{start}-{category}@potatotimer')}\r\n"
+                  f"DTSTAMP:{stamp}\r\n"
+                  f"DTSTART:{self.utc_time(start)}\r\n"
+                  f"DTEND:{self.utc_time(start + duration)}\r\n"
+                  f"{self.fold(f'SUMMARY:{category}')}\r\n"
+                  "END:VEVENT\r\n")
+        write("END:VCALENDAR\r\n")
+
+    @staticmethod
+    def local_time(wall_ns):
+        """Format wall clock ns as local ISO 8601 time with UTC offset"""
+        return datetime.fromtimestamp(
+            wall_ns // NS_PER_SECOND).astimezone().isoformat()
+
+    @staticmethod
+    def utc_time(wall_ns):
+        """Format wall clock ns as iCalendar UTC date-time"""
+        return datetime.fromtimestamp(
+            wall_ns // NS_PER_SECOND, timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+    @staticmethod
+    def fold(line):
+        """Fold iCalendar content line to lines of at most 75 octets
+        #
+        # Continuation lines start with a space, characters are not split
+        """
+        if len(line.encode()) <= 75:
+            return line
+        lines = []
+        current = ""
+        size = 0
+        for char in line:
+            length = len(char.encode())
+            if size + length > 75:
+                lines.append(current)
+                current = " "
+                size = 1
+            current += char
+            size += length
+        lines.append(current)
+        return "\r\n".join(lines)
+
+    @staticmethod
+    def escape_text(text):
+        """Escape iCalendar TEXT value"""
+        return (text.replace("\\", "\\\\").replace(";", "\\;")
+                .replace(",", "\\,").replace("\n", "\\n"))
@@ -0,0 +1,313 @@
+import bisect
+import mmap
+import os
+import time
+from array import array
+from datetime import date
+from .Clock import Clock
+from .TimerEngine import NS_PER_SECOND
+
+
+class History:
+    """Columnar store of time spent in timers
+    #
+    # Each row is time spent in one stat group between two engine events:
+    # wall clock start (ns), duration (ns), category id and the number of
+    # timers completed. Every column is a file of fixed width values, read
+    # back through mmap without building Python objects per row. Rows are
+    # appended in time order and a per-day index (local date ordinal and
+    # first row of the day) turns date ranges into row ranges.
+    """
+
+    COLUMNS = {"start": "q", "duration": "q", "category": "H", "completed": "H"}
+    INDEX = {"days": "i", "day_rows": "q"}
+
+    def __init__(self, path=None, clock=None):
+        self._path = path if path is not None else self.default_path()
+        self._clock = clock if clock is not None else Clock()
+        self._categories = []  # Category names by id
+        self._days = array(self.INDEX["days"])
+        self._day_rows = array(self.INDEX["day_rows"])
+        self._rows = 0
+        self._fds = {}
+        self._maps = []  # Column maps and their memoryviews
+        self._columns = {}
+        self._latest = None  # Wall ns, totals and counts at latest event
+
+    @staticmethod
+    def default_path():
+        """Get history location in the user data directory"""
+        from appdirs import AppDirs
+        return os.path.join(AppDirs("potatotimer").user_data_dir, "history")
+
+    def file(self, name):
+        """Get path of a column, index or category names file"""
+        return os.path.join(self._path, name)
+
+    def load(self):
+        """Read category names and day index, and map columns for queries
+        #
+        # A crash may leave columns of different lengths or an index that
+        # lags behind, only complete rows are used and the index is fixed.
+        """
+        try:
+            with open(self.file("categories"), encoding="utf-8") as stream:
+                self._categories = stream.read().splitlines()
+        except FileNotFoundError:
+            self._categories = []
+        sizes = {}
+        for name, typecode in self.COLUMNS.items():
+            try:
+                size = os.path.getsize(self.file(name))
+            except FileNotFoundError:
+                size = 0
+            sizes[name] = size // array(typecode).itemsize
+        self._rows = min(sizes.values())
+        for name, typecode in self.INDEX.items():
+            index = array(typecode)
+            try:
+                with open(self.file(name), 'rb') as stream:
+                    index.frombytes(stream.read())
+            except FileNotFoundError:
+                pass
+            setattr(self, f'_{name}', index)
+        length = min(len(self._days), len(self._day_rows))
+        while length and self._day_rows[length - 1] >= self._rows:
+            length -= 1
+        del self._days[length:]
+        del self._day_rows[length:]
+        self.map_columns()
+        first = self._day_rows[-1] if self._day_rows else 0
+        for row in range(first, self._rows):
+            self.index_row(row, self._columns["start"][row])
+        return self
+
+    def map_columns(self):
+        """Map column files read-only, limited to complete rows"""
+        self.unmap_columns()
+        for name, typecode in self.COLUMNS.items():
+            size = self._rows * array(typecode).itemsize
+            if size == 0:
+                self._columns[name] = memoryview(array(typecode))
+                continue
+            with open(self.file(name), 'rb') as stream:
+                mapped = mmap.mmap(stream.fileno(), size, access=mmap.ACCESS_READ)
+            view = memoryview(mapped)
+            self._maps.append((mapped, view))
+            self._columns[name] = view.cast(typecode)
+
+    def unmap_columns(self):
+        """Release column maps"""
+        for column in self._columns.values():
+            column.release()
+        self._columns = {}
+        for mapped, view in self._maps:
+            view.release()
+            mapped.close()
+        self._maps = []
+
+    def open(self, engine):
+        """Start recording time spent in timers of engine
+        #
+        # Files are truncated to complete rows and the day index is brought
+        # up to date, then rows are appended on every engine event.
+        """
+        os.makedirs(self._path, exist_ok=True)
+        self.load()
+        self.unmap_columns()
+        for name, typecode in self.COLUMNS.items():
+            fd = os.open(self.file(name), os.O_RDWR | os.O_CREAT, 0o600)
+            os.ftruncate(fd, self._rows * array(typecode).itemsize)
+            os.lseek(fd, 0, os.SEEK_END)
+            self._fds[name] = fd
+        for name in self.INDEX:
+            index = getattr(self, f'_{name}')
+            with open(self.file(name), 'wb') as stream:
+                index.tofile(stream)
+            self._fds[name] = os.open(
+                self.file(name), os.O_WRONLY | os.O_APPEND, 0o600)
+        self._latest = self.engine_state(engine)
+        engine.add_listener(self.record)
+
+    def close(self):
+        """Stop recording and release files"""
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds = {}
+        self.unmap_columns()
+
+    def engine_state(self, engine):
+        """Wall clock time, totals and counts of engine by stat group name"""
+        groups = range(len(engine.group_names))
+        return (
+            self._clock.time_ns(),
+            dict(zip(engine.group_names, map(engine.total_time, groups))),
+            dict(zip(engine.group_names, map(engine.count, groups))),
+        )
+
+    def record(self, event, engine):
+        """Engine listener: append time spent since the previous event
+        #
+        # One row for each stat group that gained time or completed timers,
+        # starting at the previous event.
+        """
+        start, totals, counts = self._latest
+        self._latest = self.engine_state(engine)
+        rows = []
+        for name, total in self._latest[1].items():
+            duration = max(0, total - totals.get(name, 0))
+            completed = max(0, self._latest[2][name] - counts.get(name, 0))
+            if duration or completed:
+                rows.append((start, duration, self.category_id(name), completed))
+        if rows:
+            self.append(rows)
+
+    def category_id(self, name):
+        """Get id of category name, adding new names to the names file"""
+        name = name.replace("\n", " ")
+        try:
+            return self._categories.index(name)
+        except ValueError:
+            pass
+        with open(self.file("categories"), 'a', encoding="utf-8") as stream:
+            stream.write(f'{name}\n')
+        self._categories.append(name)
+        return len(self._categories) - 1
+
+    def append(self, rows):
+        """Append rows of (start, duration, category, completed)
+        #
+        # Columns are written before the index, so that an interrupted
+        # append leaves at most an index to fix on the next load.
+        """
+        for position, (name, typecode) in enumerate(self.COLUMNS.items()):
+            values = array(typecode, [row[position] for row in rows])
+            os.write(self._fds[name], values.tobytes())
+        days = len(self._days)
+        for row in rows:
+            self.index_row(self._rows, row[0])
+            self._rows += 1
+        if len(self._days) > days:
+            for name in self.INDEX:
+                index = getattr(self, f'_{name}')
+                os.write(self._fds[name], index[days:].tobytes())
+
+    def index_row(self, row, start_ns):
+        """Start a new day in the index if row starts one"""
+        day = self.day_number(start_ns)
+        if not self._days or day > self._days[-1]:
+            self._days.append(day)
+            self._day_rows.append(row)
+
+    @staticmethod
+    def day_number(wall_ns):
+        """Local date ordinal of wall clock time"""
+        year, month, day = time.localtime(wall_ns // NS_PER_SECOND)[:3]
+        return date(year, month, day).toordinal()
+
+    def aggregate(self, first_day=None, last_day=None, key=None):
+        """Sum completed timers and durations by key and category
+        #
+        # Days are date ordinals, key maps a date ordinal to a grouping key
+        # (None sums everything). Returns {(key, category id): [completed,
+        # duration ns]} and {key: number of days with any rows}.
+        """
+        lo, hi = self.day_range(first_day, last_day)
+        duration = self._columns["duration"]
+        category = self._columns["category"]
+        completed = self._columns["completed"]
+        sums = {}
+        day_counts = {}
+        for i in range(lo, hi):
+            day_key = key(self._days[i]) if key is not None else None
+            day_counts[day_key] = day_counts.get(day_key, 0) + 1
+            first = self._day_rows[i]
+            last = self._day_rows[i + 1] if i + 1 < len(self._days) else self._rows
+            for d, c, n in zip(duration[first:last], category[first:last],
+                               completed[first:last]):
+                entry = sums.get((day_key, c))
+                if entry is None:
+                    entry = sums[(day_key, c)] = [0, 0]
+                entry[0] += n
+                entry[1] += d
+        return sums, day_counts
+
+    def day_range(self, first_day=None, last_day=None):
+        """Get index positions of days from first_day to last_day"""
+        lo = 0 if first_day is None else bisect.bisect_left(self._days, first_day)
+        hi = (len(self._days) if last_day is None
+              else bisect.bisect_right(self._days, last_day))
+        return lo, hi
+
+    def row_range(self, first_day=None, last_day=None):
+        """Get rows from first_day to last_day as a range"""
+        lo, hi = self.day_range(first_day, last_day)
+        if lo >= hi:
+            return range(0)
+        last = self._day_rows[hi] if hi < len(self._days) else self._rows
+        return range(self._day_rows[lo], last)
+
+    def find_category(self, name):
+        """Get id of category name, None when history has no such category"""
+        try:
+            return self._categories.index(name)
+        except ValueError:
+            return None
+
+    def iter_rows(self, first_day=None, last_day=None, category_id=None):
+        """Generate (start ns, duration ns, category name, completed) rows
+        #
+        # Rows come straight from the mapped columns one at a time. Days are
+        # date ordinals, category_id limits rows to one category.
+        """
+        rows = self.row_range(first_day, last_day)
+        start = self._columns["start"]
+        duration = self._columns["duration"]
+        completed = self._columns["completed"]
+        if category_id is not None:
+            name = self._categories[category_id]
+            for row in self.category_rows(rows, category_id):
+                yield start[row], duration[row], name, completed[row]
+            return
+        columns = [
+            self._columns[name][rows.start:rows.stop]
+            for name in ("start", "duration", "category", "completed")
+        ]
+        for start, duration, row_category, completed in zip(*columns):
+            yield start, duration, self._categories[row_category], completed
+
+    def category_rows(self, rows, category_id):
+        """Generate rows of a row range that are in one category
+        #
+        # The category column is searched for the id as bytes, so rows of
+        # other categories are skipped without a Python step per row.
+        """
+        itemsize = self._columns["category"].itemsize
+        data = self._columns["category"][rows.start:rows.stop].tobytes()
+        needle = array(self.COLUMNS["category"], [category_id]).tobytes()
+        offset = data.find(needle)
+        while offset >= 0:
+            if offset % itemsize:
+                """Straddles two values, the id is not in either"""
+                offset = data.find(needle, offset + 1)
+                continue
+            yield rows.start + offset // itemsize
+            offset = data.find(needle, offset + itemsize)
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def categories(self):
+        """Category names by id"""
+        return self._categories
+
+    @property
+    def rows(self):
+        return self._rows
+
+    @property
+    def days(self):
+        """Date ordinals of days with rows, in order"""
+        return self._days
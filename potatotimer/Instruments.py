@@ -0,0 +1,151 @@
+import time
+from array import array
+
+
+class Histogram:
+    """Fixed-size histogram of durations
+    #
+    # Bucket k counts durations of at most 2**k microseconds, the last one
+    # everything longer. Recording is a division, a bit_length and an
+    # array increment, and memory use never grows.
+    """
+
+    BUCKETS = 28  # Up to 2**26 us (67 s), then everything longer
+
+    def __init__(self):
+        self._buckets = array("q", bytes(8 * self.BUCKETS))
+        self._count = 0
+        self._sum_ns = 0
+        self._max_ns = 0
+
+    def record(self, ns):
+        """Record a duration in ns"""
+        bucket = (max(0, ns - 1) // 1000).bit_length()
+        self._buckets[min(bucket, self.BUCKETS - 1)] += 1
+        self._count += 1
+        self._sum_ns += ns
+        if ns > self._max_ns:
+            self._max_ns = ns
+
+    @classmethod
+    def upper_bound_us(cls, bucket):
+        """Largest duration in bucket in microseconds, None for no limit"""
+        if bucket >= cls.BUCKETS - 1:
+            return None
+        return 2 ** bucket
+
+    def quantile_us(self, fraction):
+        """Upper bound of the bucket holding the given fraction of durations
+        #
+        # Capped at the longest duration recorded
+        """
+        if not self._count:
+            return 0
+        wanted = fraction * self._count
+        seen = 0
+        for bucket, count in enumerate(self._buckets):
+            seen += count
+            if seen >= wanted:
+                bound = self.upper_bound_us(bucket)
+                if bound is None or bound > self._max_ns / 1000:
+                    return self._max_ns / 1000
+                return bound
+        return self._max_ns / 1000
+
+    @property
+    def buckets(self):
+        return self._buckets
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def sum_ns(self):
+        return self._sum_ns
+
+    @property
+    def max_ns(self):
+        return self._max_ns
+
+
+class Instruments:
+    """Timing histograms of the main loop, with optional cProfile tracing
+    #
+    # Engine update and render time of each window are measured per frame,
+    # loop lateness is how much later than planned the main loop woke up
+    # and alarm latency how long after the end of a timer its alarm was
+    # raised. Without instruments none of this is measured at all.
+    # Tracing with cProfile can be started and stopped while running.
+    """
+
+    METRICS = [
+        "engine_update", "render_statusline", "render_sidebar",
+        "render_content", "loop_lateness", "alarm_latency",
+    ]
+
+    def __init__(self, path):
+        self._path = path
+        self._histograms = {name: Histogram() for name in self.METRICS}
+        self._profiler = None
+        self._tracing = False
+
+    def record(self, metric, ns):
+        """Record a duration in ns"""
+        self._histograms[metric].record(ns)
+
+    def timed(self, metric, function):
+        """Run function, recording its duration"""
+        started = time.perf_counter_ns()
+        function()
+        self._histograms[metric].record(time.perf_counter_ns() - started)
+
+    def toggle_tracing(self, signum=None, frame=None):
+        """Start or stop cProfile tracing, usable as a signal handler"""
+        if self._profiler is None:
+            import cProfile
+            self._profiler = cProfile.Profile()
+        if self._tracing:
+            self._profiler.disable()
+        else:
+            self._profiler.enable()
+        self._tracing = not self._tracing
+
+    def close(self):
+        """Stop tracing and write histograms, and trace if any, to path
+        #
+        # cProfile stats go to path.pstats, for pstats or snakeviz
+        """
+        if self._tracing:
+            self.toggle_tracing()
+        with open(self._path, "w") as stream:
+            stream.write(self.report())
+        if self._profiler is not None:
+            self._profiler.dump_stats(f'{self._path}.pstats')
+
+    def report(self):
+        """Histograms as a text table, times in microseconds"""
+        lines = [
+            f'{"metric":<18} {"count":>8} {"mean":>9} {"p50":>9} '
+            f'{"p90":>9} {"p99":>9} {"max":>9}'
+        ]
+        for name, histogram in self._histograms.items():
+            mean = histogram.sum_ns / histogram.count / 1000 if histogram.count else 0
+            lines.append(
+                f'{name:<18} {histogram.count:>8} {mean:>9.1f} '
+                f'{histogram.quantile_us(0.5):>9.0f} '
+                f'{histogram.quantile_us(0.9):>9.0f} '
+                f'{histogram.quantile_us(0.99):>9.0f} '
+                f'{histogram.max_ns / 1000:>9.1f}')
+        lines.append("")
+        lines.append("Percentiles are bucket upper bounds (powers of two)")
+        return "\n".join(lines) + "\n"
+
+    @property
+    def histograms(self):
+        """Histograms by metric name"""
+        return self._histograms
+
+    @property
+    def tracing(self):
+        return self._tracing
@@ -0,0 +1,405 @@
+import marshal
+import os
+import struct
+import threading
+import time
+import zlib
+from .Clock import Clock, VirtualClock
+from .TimerEngine import TimerEngine, NS_PER_SECOND
+
+
+class Journal:
+    """Append-only journal of timer engine events
+    #
+    # Every record is a length and CRC-32 prefixed payload followed by the
+    # length again, so the journal can be read from either end. Payload is
+    # the event code, wall clock and run clock timestamps in ns and the
+    # timer position after the event. Snapshot records carry the
+    # marshalled engine state as well. Records are written by a background
+    # thread in batches, so the main loop never waits for the disk. A torn
+    # record at the end (crash while writing) fails its checksum and is
+    # dropped on the next start. Once the journal has grown past
+    # COMPACT_SIZE, the writer replaces it with a single snapshot.
+    """
+
+    SNAPSHOT = 0
+    EVENTS = ["start", "stop", "next", "reset", "complete"]
+    EVENT_CODES = {event: code for code, event in enumerate(EVENTS, 1)}
+    HEADER = struct.Struct("<HI")  # Payload length, CRC-32 of payload
+    TRAILER = struct.Struct("<H")  # Payload length
+    """Event, running, wall ns, run ns, elapsed ns, timer id"""
+    RECORD = struct.Struct("<B?qqqi")
+    BATCH_INTERVAL = 0.5  # Seconds to collect records before writing
+    FSYNC_INTERVAL = 10  # Seconds between fsyncs with periodic policy
+    COMPACT_SIZE = 256 * 1024  # Rewrite journal as a snapshot when bigger
+    TAIL_BLOCK = 4096  # Bytes read from the end on start, grown as needed
+
+    def __init__(self, config, path=None, clock=None):
+        self._config = config
+        self._path = path if path is not None else self.default_path()
+        self._clock = clock if clock is not None else Clock()
+        self._fsync = config.journal_fsync
+        self._fd = None
+        self._pending = []  # Framed records waiting for the writer
+        self._compacted = None  # Snapshot to replace the journal with
+        self._size = 0  # Journal size once pending records are written
+        self._closing = False
+        self._wakeup = threading.Condition()
+        self._writer = None
+
+    @staticmethod
+    def default_path():
+        """Get journal location in the user data directory"""
+        from appdirs import AppDirs
+        return os.path.join(AppDirs("potatotimer").user_data_dir, "journal")
+
+    def open(self, engine):
+        """Restore engine from journal and start recording its events
+        #
+        # Returns True when a previous session was restored. The journal
+        # is compacted to a single snapshot when it has grown big, and a
+        # snapshot of the restored state starts every session.
+        """
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        records, self._size = self.read_tail()
+        if records is None:
+            """Torn or corrupt tail, find the valid part the slow way"""
+            records, self._size = self.parse(self.read())
+            os.truncate(self._path, self._size)
+        restored = self.replay(records, engine)
+        if self._size > self.COMPACT_SIZE:
+            self.write_compacted(self.frame(self.snapshot_payload(engine)))
+            self._size = 0
+        self._fd = self.open_append()
+        self._writer = threading.Thread(
+            target=self._write, name="potatotimer-journal", daemon=True)
+        self._writer.start()
+        self.snapshot(engine)
+        engine.add_listener(self.record)
+        return restored
+
+    def open_append(self):
+        """Open the journal file for the writer"""
+        return os.open(
+            self._path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+
+    def read_tail(self):
+        """Read records needed for replay from the end of the journal file
+        #
+        # A block is read from the end of the file and grown while the
+        # records needed reach further back, so a long journal is not read
+        # whole. Returns the records and the size of the file, records are
+        # None when the end of the journal is not a valid record.
+        """
+        try:
+            stream = open(self._path, 'rb')
+        except FileNotFoundError:
+            return [], 0
+        with stream:
+            size = os.fstat(stream.fileno()).st_size
+            block = self.TAIL_BLOCK
+            while True:
+                offset = max(0, size - block)
+                stream.seek(offset)
+                data = stream.read(size - offset)
+                records, complete = self.tail_records(data, offset == 0)
+                if complete:
+                    return records, size
+                block *= 4
+
+    def read(self):
+        """Read journal file, missing file is an empty journal"""
+        try:
+            with open(self._path, 'rb') as stream:
+                return stream.read()
+        except FileNotFoundError:
+            return b""
+
+    def parse(self, data):
+        """Split journal data into records
+        #
+        # Returns the records and the length of the valid part of data.
+        # Parsing stops at the first record that is cut short or corrupt.
+        """
+        records = []
+        offset = 0
+        while offset < len(data):
+            parsed = self.parse_record(data, offset)
+            if parsed is None:
+                break
+            record, offset = parsed
+            records.append(record)
+        return records, offset
+
+    def tail_records(self, data, whole=True):
+        """Read records needed for replay backwards from the end
+        #
+        # Stops at the latest snapshot or at the latest record from before
+        # today, so startup does not depend on the length of the journal.
+        # Data is the end of the journal, or all of it when whole. Returns
+        # the records, None when the end of the journal is not a valid
+        # record, and whether data reached back far enough to tell.
+        """
+        day_start_ns = self.day_start_ns(self._clock.time_ns())
+        records = []
+        end = len(data)
+        while end > 0:
+            if end < self.HEADER.size + self.TRAILER.size:
+                return None, whole
+            length, = self.TRAILER.unpack_from(data, end - self.TRAILER.size)
+            start = end - self.TRAILER.size - length - self.HEADER.size
+            if start < 0 and not whole:
+                return None, False
+            parsed = self.parse_record(data, max(0, start))
+            if start < 0 or parsed is None or parsed[1] != end:
+                return None, True
+            record = parsed[0]
+            records.append(record)
+            if record[0] == self.SNAPSHOT or record[2] < day_start_ns:
+                break
+            end = start
+        if end == 0 and not whole:
+            return None, False
+        records.reverse()
+        return records, True
+
+    def parse_record(self, data, offset):
+        """Parse record at offset
+        #
+        # Records are (event code, running, wall ns, run ns, elapsed ns,
+        # timer id, state) tuples, state is None except for snapshots.
+        # Returns the record and the offset of the next one, or None when
+        # the record is cut short or corrupt.
+        """
+        start = offset + self.HEADER.size
+        if start > len(data):
+            return None
+        length, crc = self.HEADER.unpack_from(data, offset)
+        end = start + length + self.TRAILER.size
+        payload = data[start:start + length]
+        if (length < self.RECORD.size or end > len(data) or
+                zlib.crc32(payload) != crc or
+                self.TRAILER.unpack_from(data, end - self.TRAILER.size)[0] != length):
+            return None
+        state = None
+        if payload[0] == self.SNAPSHOT:
+            try:
+                state = marshal.loads(payload[self.RECORD.size:])
+            except (EOFError, ValueError, TypeError):
+                return None
+        return self.RECORD.unpack_from(payload) + (state,), end
+
+    def replay(self, records, engine):
+        """Restore engine to the outcome of the journalled session
+        #
+        # Replay starts from the latest snapshot, or from the timer position
+        # of the latest record from before today. Records after that are run
+        # through an engine on virtual time that reads the run clock of each
+        # record, so the replaying engine arrives at the same counts and
+        # totals. Counts and totals start over on the first record of each
+        # new day.
+        """
+        day_start_ns = self.day_start_ns(self._clock.time_ns())
+        start = 0
+        for index in range(len(records) - 1, -1, -1):
+            code, running, wall_ns = records[index][:3]
+            if code == self.SNAPSHOT or wall_ns < day_start_ns:
+                start = index
+                break
+        records = records[start:]
+        if not records:
+            return False
+
+        clock = VirtualClock(records[0][3])
+        replayer = TimerEngine(self._config, clock)
+        midnight_ns = self.next_midnight_ns(records[0][2])
+        started_at = None
+        code, running, wall_ns, run_ns, elapsed_ns, timer_id, state = records[0]
+        if code != self.SNAPSHOT and wall_ns < day_start_ns:
+            """Position of an earlier day is all that is needed from it"""
+            state = {
+                "running": running, "run_ns": run_ns, "timer_id": timer_id,
+                "elapsed_ns": elapsed_ns, "groups": [], "counts": [],
+                "totals": [], "started_at": None,
+            }
+            replayer.restore(state)
+            records = records[1:]
+
+        for code, running, wall_ns, run_ns, elapsed_ns, timer_id, state in records:
+            if run_ns > clock.monotonic_ns():
+                clock.advance(run_ns - clock.monotonic_ns())
+            if wall_ns >= midnight_ns:
+                replayer.update()
+                replayer.clear_stats()
+                started_at = None
+                midnight_ns = self.next_midnight_ns(wall_ns)
+            if code == self.SNAPSHOT:
+                replayer.restore(state)
+                if state["started_at"] is not None:
+                    started_at = state["started_at"]
+                continue
+            event = self.EVENTS[code - 1]
+            if event == "start":
+                replayer.start_timer()
+                if started_at is None:
+                    started_at = tuple(time.localtime(wall_ns // NS_PER_SECOND))
+            elif event == "stop":
+                replayer.stop_timer()
+            elif event == "next":
+                replayer.next_timer()
+            elif event == "reset":
+                replayer.reset_timer()
+            else:
+                replayer.update()
+
+        state = replayer.snapshot()
+        state["running"] = False
+        state["started_at"] = started_at
+        if self._clock.time_ns() >= midnight_ns:
+            state["counts"] = [0] * len(state["counts"])
+            state["totals"] = [0] * len(state["totals"])
+            state["started_at"] = None
+        engine.restore(state)
+        return True
+
+    @staticmethod
+    def day_start_ns(wall_ns):
+        """Get wall clock time of the local midnight preceding wall_ns"""
+        year, month, day = time.localtime(wall_ns // NS_PER_SECOND)[:3]
+        midnight = time.mktime((year, month, day, 0, 0, 0, 0, 0, -1))
+        return int(midnight) * NS_PER_SECOND
+
+    @staticmethod
+    def next_midnight_ns(wall_ns):
+        """Get wall clock time of the local midnight following wall_ns"""
+        year, month, day = time.localtime(wall_ns // NS_PER_SECOND)[:3]
+        midnight = time.mktime((year, month, day + 1, 0, 0, 0, 0, 0, -1))
+        return int(midnight) * NS_PER_SECOND
+
+    def compact(self, engine):
+        """Have the writer replace the journal with a snapshot of engine
+        #
+        # Records still pending are covered by the snapshot and dropped
+        """
+        record = self.frame(self.snapshot_payload(engine))
+        with self._wakeup:
+            self._pending = []
+            self._compacted = record
+            self._size = len(record)
+            self._wakeup.notify()
+
+    def write_compacted(self, record):
+        """Replace journal file with a single snapshot record"""
+        temp_file = f'{self._path}.{os.getpid()}.tmp'
+        with open(temp_file, 'wb') as stream:
+            stream.write(record)
+            stream.flush()
+            os.fsync(stream.fileno())
+        os.replace(temp_file, self._path)
+
+    def snapshot(self, engine):
+        """Record engine state, replay starts from the latest snapshot"""
+        self.append(self.frame(self.snapshot_payload(engine)))
+
+    def snapshot_payload(self, engine):
+        """Snapshot record payload of engine state"""
+        return self.payload(self.SNAPSHOT, engine) + marshal.dumps(
+            engine.snapshot())
+
+    def record(self, event, engine):
+        """Engine listener: queue an event record for the writer
+        #
+        # A config reload is recorded as a snapshot, so that replay never
+        # runs events from before the change over the changed timers, and
+        # so is the start of a new day. On a schedule every event is, since
+        # slots follow the wall clock and can't be replayed on the run
+        # clock. The journal is compacted once it has grown too big.
+        """
+        if self._size > self.COMPACT_SIZE:
+            self.compact(engine)
+        elif event in ("reload", "day") or self._config.schedule:
+            self.snapshot(engine)
+        else:
+            self.append(
+                self.frame(self.payload(self.EVENT_CODES[event], engine)))
+
+    def payload(self, code, engine):
+        """Record payload with timer position of engine"""
+        return self.RECORD.pack(
+            code, engine.running, self._clock.time_ns(), engine.run_ns,
+            engine.time_elapsed_ns, engine.current_timer_id)
+
+    def frame(self, payload):
+        """Surround payload with its length and checksum"""
+        return (self.HEADER.pack(len(payload), zlib.crc32(payload)) +
+                payload + self.TRAILER.pack(len(payload)))
+
+    def append(self, record):
+        """Queue a framed record, waking the writer for a new batch"""
+        with self._wakeup:
+            self._pending.append(record)
+            self._size += len(record)
+            if len(self._pending) == 1:
+                self._wakeup.notify()
+
+    def close(self):
+        """Write and fsync queued records and stop the writer"""
+        if self._writer is None:
+            return
+        with self._wakeup:
+            self._closing = True
+            self._wakeup.notify()
+        self._writer.join()
+        self._writer = None
+        os.close(self._fd)
+        self._fd = None
+
+    def _write(self):
+        """Writer thread: write records in batches and fsync by policy
+        #
+        # Written records survive a crash of the program. The fsync policy
+        # decides how much may be lost when the whole system goes down:
+        # always syncs each batch, periodic at most every FSYNC_INTERVAL
+        # and never leaves it to the operating system. A compacted journal
+        # is written in place of the file before the batch.
+        """
+        synced = time.monotonic()
+        unsynced = False
+        while True:
+            with self._wakeup:
+                if (not self._pending and self._compacted is None and
+                        not self._closing):
+                    self._wakeup.wait(self.FSYNC_INTERVAL if unsynced else None)
+                if self._pending and not self._closing:
+                    """Let the batch fill up, only close interrupts"""
+                    self._wakeup.wait(self.BATCH_INTERVAL)
+                compacted = self._compacted
+                self._compacted = None
+                data = b"".join(self._pending)
+                self._pending = []
+                closing = self._closing
+            try:
+                if compacted is not None:
+                    self.write_compacted(compacted)
+                    fd = self.open_append()
+                    os.close(self._fd)
+                    self._fd = fd
+                    synced = time.monotonic()
+                    unsynced = False
+                if data:
+                    os.write(self._fd, data)
+                    unsynced = self._fsync != "never"
+                if unsynced and (closing or self._fsync == "always" or
+                                 time.monotonic() - synced >= self.FSYNC_INTERVAL):
+                    os.fsync(self._fd)
+                    synced = time.monotonic()
+                    unsynced = False
+            except OSError:
+                """A full disk must not take the timer down with it"""
+                pass
+            if closing:
+                return
+
+    @property
+    def path(self):
+        return self._path
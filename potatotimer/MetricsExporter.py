@@ -0,0 +1,247 @@
+import os
+import sys
+import threading
+import time
+from .Instruments import Histogram
+from .TimerEngine import NS_PER_SECOND
+
+
+class MetricsExporter:
+    """Timer usage and process health for the Prometheus textfile collector
+    #
+    # A background thread renders the metrics every interval and replaces
+    # the file atomically (write a temporary file, rename it over), so the
+    # collector never reads half a file and the main loop never waits for
+    # the disk. Nothing is written while the timer stands still. The
+    # thread never touches engine or config: on every engine event the
+    # main loop captures a view of plain values and swaps it in whole.
+    # The running timer is brought up to date from the time the view was
+    # captured, since a daemon may not update for minutes. Counts and
+    # totals start over at midnight, so they are gauges, not counters.
+    """
+
+    HISTOGRAMS = {
+        "engine_update": ("potatotimer_engine_update_seconds", {},
+                          "Time taken by an engine update"),
+        "render_statusline": ("potatotimer_render_seconds",
+                              {"window": "statusline"},
+                              "Time taken to render a window"),
+        "render_sidebar": ("potatotimer_render_seconds",
+                           {"window": "sidebar"}, None),
+        "render_content": ("potatotimer_render_seconds",
+                           {"window": "content"}, None),
+        "loop_lateness": ("potatotimer_loop_lateness_seconds", {},
+                          "How much later than planned the main loop woke up"),
+        "alarm_latency": ("potatotimer_alarm_latency_seconds", {},
+                          "How long after the end of a timer it was noticed"),
+    }
+
+    def __init__(self, path, config, engine, instruments=None):
+        self._path = path
+        self._config = config
+        self._engine = engine
+        self._instruments = instruments
+        self._started_at = time.time()
+        self._view = None  # Timer values captured by the main loop
+        self._written = None  # Timer and histogram metrics last written
+        self._stop = threading.Event()
+        self._writer = None
+
+    def start(self):
+        """Write metrics now and every interval from a background thread"""
+        self.capture(None, self._engine)
+        self._engine.add_listener(self.capture)
+        self.write()
+        self._writer = threading.Thread(
+            target=self._run, name="potatotimer-metrics", daemon=True)
+        self._writer.start()
+
+    def close(self):
+        """Stop the writer after a final write"""
+        if self._writer is None:
+            return
+        self._stop.set()
+        self._writer.join()
+        self._writer = None
+        self.capture(None, self._engine)
+        self.write()
+
+    def capture(self, event, engine):
+        """Engine listener: capture timer values for the writer thread"""
+        state = engine.snapshot()
+        self._view = {
+            "state": state,
+            "timer": engine.timer_name,
+            "group": self._config.categories[engine.timer_category]["group"],
+            "duration_ns": engine.timer_duration_ns,
+            "run_clock_ns": engine.run_clock(),
+            "captured_ns": time.monotonic_ns(),
+            "interval": self._config.metrics_interval,
+        }
+
+    def _run(self):
+        """Writer thread: write every interval until stopped
+        #
+        # A failing write is logged, the next interval tries again
+        """
+        while not self._stop.wait(self._view["interval"]):
+            try:
+                self.write()
+            except Exception as error:
+                print(f'Metrics not written: {type(error).__name__}: {error}',
+                      file=sys.stderr, flush=True)
+
+    def write(self):
+        """Replace metrics file if timer or histogram metrics changed
+        #
+        # Process health alone is no reason to write
+        """
+        metrics = self.timer_metrics() + self.histogram_metrics()
+        if metrics == self._written:
+            return
+        temp_file = f'{self._path}.{os.getpid()}.tmp'
+        try:
+            with open(temp_file, "w") as stream:
+                stream.write(metrics + self.process_metrics())
+            os.replace(temp_file, self._path)
+        except OSError:
+            """A missing collector directory must not take the timer down"""
+            return
+        self._written = metrics
+
+    def timer_metrics(self):
+        """Counters, totals and current timer of the captured view"""
+        view = self._view
+        state = view["state"]
+        current_group = view["group"]
+        catch_up = 0
+        if state["running"]:
+            catch_up = max(0, view["run_clock_ns"] - state["run_ns"] +
+                           time.monotonic_ns() - view["captured_ns"])
+        lines = []
+        self.metric_header(
+            lines, "potatotimer_timers_completed", "gauge",
+            "Timers completed today by stat group")
+        for name, count in zip(state["groups"], state["counts"]):
+            lines.append(self.sample(
+                "potatotimer_timers_completed", {"group": name}, count))
+        self.metric_header(
+            lines, "potatotimer_time_spent_seconds", "gauge",
+            "Time spent in timers today by stat group")
+        for group, (name, total) in enumerate(zip(state["groups"], state["totals"])):
+            if group == current_group:
+                total += catch_up
+            lines.append(self.sample(
+                "potatotimer_time_spent_seconds", {"group": name},
+                total / NS_PER_SECOND))
+        self.metric_header(
+            lines, "potatotimer_running", "gauge",
+            "Whether the timer is running")
+        lines.append(self.sample("potatotimer_running", {}, int(state["running"])))
+        self.metric_header(
+            lines, "potatotimer_current_timer_info", "gauge",
+            "Current timer, always 1")
+        lines.append(self.sample("potatotimer_current_timer_info", {
+            "timer": view["timer"],
+            "group": state["groups"][current_group],
+            "position": str(state["timer_id"]),
+        }, 1))
+        self.metric_header(
+            lines, "potatotimer_timer_elapsed_seconds", "gauge",
+            "Time elapsed in the current timer")
+        elapsed = min(state["elapsed_ns"] + catch_up, view["duration_ns"])
+        lines.append(self.sample(
+            "potatotimer_timer_elapsed_seconds", {}, elapsed / NS_PER_SECOND))
+        self.metric_header(
+            lines, "potatotimer_timer_duration_seconds", "gauge",
+            "Duration of the current timer")
+        lines.append(self.sample(
+            "potatotimer_timer_duration_seconds", {},
+            view["duration_ns"] / NS_PER_SECOND))
+        return "\n".join(lines) + "\n"
+
+    def histogram_metrics(self):
+        """Loop and render timing histograms, when instruments are on
+        #
+        # The count is the sum of the copied buckets, so it always matches
+        # the +Inf bucket even when the main loop records in between
+        """
+        if self._instruments is None:
+            return ""
+        lines = []
+        for metric, histogram in self._instruments.histograms.items():
+            name, labels, help_text = self.HISTOGRAMS[metric]
+            if help_text is not None:
+                self.metric_header(lines, name, "histogram", help_text)
+            buckets = histogram.buckets[:]
+            sum_ns = histogram.sum_ns
+            cumulative = 0
+            for bucket, count in enumerate(buckets):
+                cumulative += count
+                bound = Histogram.upper_bound_us(bucket)
+                le = "+Inf" if bound is None else repr(bound / 1_000_000)
+                lines.append(self.sample(
+                    f'{name}_bucket', dict(labels, le=le), cumulative))
+            lines.append(self.sample(
+                f'{name}_sum', labels, sum_ns / NS_PER_SECOND))
+            lines.append(self.sample(f'{name}_count', labels, cumulative))
+        return "\n".join(lines) + "\n"
+
+    def process_metrics(self):
+        """Start time, CPU time and memory use of this process"""
+        lines = []
+        self.metric_header(
+            lines, "potatotimer_process_start_time_seconds", "gauge",
+            "Start time of the process since the epoch")
+        lines.append(self.sample(
+            "potatotimer_process_start_time_seconds", {}, self._started_at))
+        self.metric_header(
+            lines, "potatotimer_process_cpu_seconds_total", "counter",
+            "User and system CPU time spent")
+        times = os.times()
+        lines.append(self.sample(
+            "potatotimer_process_cpu_seconds_total", {}, times.user + times.system))
+        resident = self.resident_memory()
+        if resident is not None:
+            self.metric_header(
+                lines, "potatotimer_process_resident_memory_bytes", "gauge",
+                "Resident memory size")
+            lines.append(self.sample(
+                "potatotimer_process_resident_memory_bytes", {}, resident))
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def resident_memory():
+        """Resident memory in bytes from /proc, None elsewhere"""
+        try:
+            with open("/proc/self/statm") as stream:
+                pages = int(stream.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            return None
+        return pages * os.sysconf("SC_PAGE_SIZE")
+
+    @staticmethod
+    def metric_header(lines, name, metric_type, help_text):
+        """Add HELP and TYPE lines of a metric"""
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+
+    @classmethod
+    def sample(cls, name, labels, value):
+        """Format a sample line"""
+        if labels:
+            pairs = ",".join(
+                f'{key}="{cls.escape_label(value)}"'
+                for key, value in labels.items())
+            return f'{name}{{{pairs}}} {value}'
+        return f'{name} {value}'
+
+    @staticmethod
+    def escape_label(value):
+        """Escape a label value for the exposition format"""
+        return (str(value).replace("\\", "\\\\").replace('"', '\\"')
+                .replace("\n", "\\n"))
+
+    @property
+    def path(self):
+        return self._path
@@ -0,0 +1,230 @@
+import json
+import socket
+from .Config import ConfigError
+from .ControlServer import ControlServer
+from .TimerEngine import TimerEngine
+
+
+class RemoteEngine(TimerEngine):
+    """Timer engine mirroring the engine of a daemon
+    #
+    # Subscribes to the control socket of the daemon and restores every
+    # state pushed on an engine event, so nothing is sent while the timer
+    # just runs. In between the mirror keeps time on its own clock for
+    # display, but never runs past the end of the current timer: timers
+    # only end in the daemon, whose complete event moves the mirror on and
+    # raises the terminal alarm here. Commands are sent to the daemon.
+    # Timer ids and stat groups only mean the same on both ends with the
+    # same config file, so a daemon running another one is refused. The
+    # duration of the current timer is the daemon's, which a schedule may
+    # have cut short. A daemon that does not answer in time or goes away
+    # is reported as a notice, the terminal stays until the user quits.
+    """
+
+    __slots__ = ("_path", "_socket", "_input", "_response", "_notices",
+                 "_request_id")
+
+    RECEIVE_SIZE = 4096
+    TIMEOUT = 5  # Seconds to wait for the daemon to answer
+
+    def __init__(self, config, path=None, clock=None):
+        super().__init__(config, clock)
+        self._path = path if path is not None else ControlServer.default_path()
+        self._socket = None
+        self._input = bytearray()
+        self._response = None
+        self._notices = []
+        self._request_id = 0
+
+    def connect(self):
+        """Attach to the daemon and take over its state
+        #
+        # Raises OSError when no daemon is listening and ConfigError when
+        # it runs another config file
+        """
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.TIMEOUT)
+        try:
+            sock.connect(self._path)
+        except OSError:
+            sock.close()
+            raise
+        self._socket = sock
+        try:
+            self.request("subscribe")
+        except (OSError, ConfigError):
+            self.close()
+            raise
+
+    def close(self):
+        """Detach from the daemon, the timer keeps running there"""
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def fds(self):
+        """File descriptors for the main loop to wait on"""
+        if self._socket is None:
+            return []
+        return [self._socket.fileno()]
+
+    def write_fds(self):
+        """File descriptors to wait on for writing, requests are blocking"""
+        return []
+
+    def poll(self, ready):
+        """Take in state pushed by the daemon"""
+        if self._socket is not None and self._socket.fileno() in ready:
+            try:
+                self.receive()
+            except OSError as error:
+                self.detach(error)
+
+    def run_command(self, command):
+        """Send a command to the daemon and wait for its response
+        #
+        # A daemon that is gone or does not answer in time gets a notice
+        # and an error response
+        """
+        if self._socket is None:
+            self._notices.append("Not attached to the timer daemon")
+            return {"ok": False, "error": "not attached"}
+        try:
+            return self.request(command)
+        except socket.timeout:
+            self._notices.append(f'Timer daemon did not answer {command}')
+            return {"ok": False, "error": "timeout"}
+        except OSError as error:
+            self.detach(error)
+            return {"ok": False, "error": str(error)}
+
+    def request(self, command):
+        """Send a command and wait for the response with its id
+        #
+        # Events pushed before the response are taken in on the way, a late
+        # response to an earlier request is skipped. Raises OSError when the
+        # daemon is gone or does not answer in time.
+        """
+        self._request_id += 1
+        self._socket.sendall(json.dumps(
+            {"command": command, "id": self._request_id}).encode() + b"\n")
+        self._response = None
+        while self._response is None:
+            self.receive()
+        return self._response
+
+    def detach(self, error):
+        """Stop mirroring a daemon that went away"""
+        self.close()
+        self._notices.append(f'Timer daemon went away: {error}')
+
+    def receive(self):
+        """Read from the daemon and handle each complete message
+        #
+        # Raises ConnectionError when the daemon has gone away
+        """
+        data = self._socket.recv(self.RECEIVE_SIZE)
+        if not data:
+            raise ConnectionError("connection closed")
+        self._input += data
+        while True:
+            end = self._input.find(b"\n")
+            if end < 0:
+                return
+            message = json.loads(self._input[:end])
+            del self._input[:end + 1]
+            self.handle(message)
+
+    def handle(self, message):
+        """Handle a response, pushed event, notice or changed settings"""
+        event = message.get("event")
+        if event == "notice":
+            self._notices.append(message["notice"])
+        elif event == "config":
+            self.reload_config()
+        elif event is not None:
+            self.apply(event, message["status"]["state"])
+        else:
+            if message.get("ok"):
+                self.check_config(message["status"])
+                self.apply(None, message["status"]["state"])
+            if message.get("id") == self._request_id:
+                self._response = message
+
+    def check_config(self, status):
+        """Raise ConfigError when the daemon runs another config file"""
+        theirs = status.get("config")
+        ours = self._config.real_path
+        if theirs != ours:
+            raise ConfigError(
+                f'The running timer uses {theirs or "default settings"}, '
+                f'not {ours or "default settings"}. Shut it down first '
+                f'(Q in a terminal attached to it) or use the same config.')
+
+    def apply(self, event, state):
+        """Restore state of the daemon engine after event
+        #
+        # Timers completed by the daemon raise the alarm, late by the time
+        # the news took to arrive. Listeners of this engine get the event
+        # the daemon had.
+        """
+        completed = sum(self._counts)
+        lateness = self.run_clock() - self._deadline_ns
+        if event == "reload":
+            self.reload_config()
+        self.restore(state)
+        if event == "complete":
+            """A schedule slot starting completes no timer, still alarms"""
+            self._alarm_triggered = True
+            self._transitions += max(1, sum(self._counts) - completed)
+            self._lateness_ns = lateness
+        if event is not None:
+            self.notify(event)
+
+    def restore(self, state):
+        """Like TimerEngine, with the duration of the daemon timer"""
+        super().restore(state)
+        self._timer_duration = state["duration_ns"]
+        elapsed = min(state["elapsed_ns"], self._timer_duration - 1)
+        self._timer_origin_ns = self._run_ns - elapsed
+        self._deadline_ns = self._timer_origin_ns + self._timer_duration
+
+    def reload_config(self):
+        """Read the config file again after the daemon did"""
+        try:
+            self._config.reload()
+        except ConfigError as error:
+            self._notices.append(
+                f'Config not reloaded: {str(error).splitlines()[0]}')
+
+    def take_notices(self):
+        """Get and forget notices from the daemon"""
+        notices = self._notices
+        self._notices = []
+        return notices
+
+    def update(self):
+        """Keep time up to the end of the current timer"""
+        if self._running:
+            self._run_ns = min(self.run_clock(), self._deadline_ns - 1)
+
+    def time_to_next_tick(self):
+        """Like TimerEngine, but None once the current timer has run out
+        #
+        # Then only the daemon has news, the main loop waits for it
+        """
+        if self._running and self.run_clock() >= self._deadline_ns:
+            return None
+        return super().time_to_next_tick()
+
+    def start_timer(self):
+        self.run_command("start")
+
+    def stop_timer(self):
+        self.run_command("stop")
+
+    def next_timer(self):
+        self.run_command("next")
+
+    def reset_timer(self):
+        self.run_command("reset")
@@ -0,0 +1,332 @@
+import bisect
+import time
+from datetime import date, timedelta
+from .TimerEngine import TimerEngine, NS_PER_SECOND
+
+SECONDS_PER_DAY = 86400
+
+
+class ScheduleEngine(TimerEngine):
+    """Timer engine following a schedule of slots at local wall clock times
+    #
+    # Timers are the slots of Config.schedule. A slot runs from its start
+    # for its duration, or until the next slot starts. Between slots the
+    # engine is stopped, waiting for the next one. Repeating slots are in
+    # a sorted index of their second of the week, dated slots in a sorted
+    # index of their start time, and the slot on at any moment is found
+    # by bisecting both, so lookups cost the same for a few slots or a
+    # whole term of lectures. Starts are turned into wall clock time with
+    # the local time zone of their own day, so slots keep their local
+    # time over DST changes. A start falling into the hour skipped by DST
+    # moves forward by the hour, a start falling into the hour repeated by
+    # DST runs once, at its first occurrence.
+    #
+    # The run clock advances while a slot is on, as time spent in timers,
+    # so snapshots, journal, history and attached terminals work as with
+    # TimerEngine. Position is read from the wall clock on every update,
+    # restore and reload, so the engine catches up after suspend or a
+    # restart. Start, stop, next and reset are up to the schedule.
+    """
+
+    __slots__ = (
+        "_week_keys", "_week_slots", "_dated_keys", "_dated_slots",
+        "_slot_start_ns", "_boundary_ns",
+    )
+
+    def __init__(self, config, clock=None):
+        self._week_keys = []  # Sorted second of the week of slot starts
+        self._week_slots = []  # Slot id of each week key
+        self._dated_keys = []  # Sorted wall clock ns of dated slot starts
+        self._dated_slots = []  # Slot id of each dated key
+        self._slot_start_ns = 0  # Wall clock start of current or next slot
+        self._boundary_ns = None  # Wall clock end of slot, or next start
+        super().__init__(config, clock)
+        self.relocate()
+
+    def load_groups(self):
+        """Take stat groups from the config and index its slots"""
+        super().load_groups()
+        self.index_slots()
+
+    def index_slots(self):
+        """Sort repeating slots by second of the week, dated by start"""
+        week = []
+        dated = []
+        for slot_id, slot in enumerate(self._config.timers):
+            if "time" not in slot:
+                continue
+            if slot["date"] is not None:
+                day = date(*slot["date"])
+                dated.append((self.local_ns(day, slot["time"]), slot_id))
+            else:
+                for weekday in slot["days"]:
+                    week.append((weekday * SECONDS_PER_DAY + slot["time"], slot_id))
+        week.sort()
+        dated.sort()
+        self._week_keys = [key for key, slot_id in week]
+        self._week_slots = [slot_id for key, slot_id in week]
+        self._dated_keys = [key for key, slot_id in dated]
+        self._dated_slots = [slot_id for key, slot_id in dated]
+
+    @staticmethod
+    def local_ns(day, seconds):
+        """Wall clock ns of a local time of day
+        #
+        # A time repeated by DST gets the first of its two instants: mktime
+        # may read it either way (it depends on earlier calls), and when it
+        # reads standard time, an offset larger a day before means it
+        # picked the later one. A time skipped by DST is read as standard
+        # time, which lands after the gap. mktime is called with isdst -1
+        # first, as given isdst it is slow in zones without DST.
+        """
+        hours, seconds = divmod(seconds, 3600)
+        minutes, seconds = divmod(seconds, 60)
+        fields = (day.year, day.month, day.day, hours, minutes, seconds)
+        start = int(time.mktime(fields + (0, 0, -1)))
+        local = time.localtime(start)
+        if local[:6] != fields:
+            start = int(time.mktime(fields + (0, 0, 0)))
+            return start * NS_PER_SECOND
+        if not local.tm_isdst and time.daylight:
+            earlier = time.localtime(start - SECONDS_PER_DAY)
+            shift = earlier.tm_gmtoff - local.tm_gmtoff
+            if shift > 0 and time.localtime(start - shift)[:6] == fields:
+                start -= shift
+        return start * NS_PER_SECOND
+
+    def week_occurrence(self, monday, index):
+        """Start and slot id of the index-th weekly slot from monday on
+        #
+        # Indexes below zero or past the week wrap over to other weeks
+        """
+        weeks, index = divmod(index, len(self._week_keys))
+        key = self._week_keys[index]
+        day = monday + timedelta(days=7 * weeks + key // SECONDS_PER_DAY)
+        return (self.local_ns(day, key % SECONDS_PER_DAY),
+                self._week_slots[index])
+
+    def weekly_around(self, wall_ns):
+        """Latest repeating slot start at or before wall_ns and the next one
+        #
+        # Returns two (start, slot id) pairs, None without repeating slots
+        """
+        if not self._week_keys:
+            return None, None
+        local = time.localtime(wall_ns // NS_PER_SECOND)
+        monday = (date(local.tm_year, local.tm_mon, local.tm_mday) -
+                  timedelta(days=local.tm_wday))
+        key = (local.tm_wday * SECONDS_PER_DAY + local.tm_hour * 3600 +
+               local.tm_min * 60 + local.tm_sec)
+        index = bisect.bisect_right(self._week_keys, key) - 1
+        previous = self.week_occurrence(monday, index)
+        while previous[0] > wall_ns:
+            """Moved forward by DST, it has not started yet"""
+            index -= 1
+            previous = self.week_occurrence(monday, index)
+        following = self.week_occurrence(monday, index + 1)
+        while following[0] <= wall_ns:
+            """Moved back by DST, it has started already"""
+            index += 1
+            previous = following
+            following = self.week_occurrence(monday, index + 1)
+        return previous, following
+
+    def dated_around(self, wall_ns):
+        """Latest dated slot start at or before wall_ns and the next one"""
+        index = bisect.bisect_right(self._dated_keys, wall_ns)
+        previous = following = None
+        if index > 0:
+            previous = (self._dated_keys[index - 1], self._dated_slots[index - 1])
+        if index < len(self._dated_keys):
+            following = (self._dated_keys[index], self._dated_slots[index])
+        return previous, following
+
+    def find_slot(self, wall_ns):
+        """Slot on at wall_ns, or the next one to start
+        #
+        # Returns (slot id, start ns, end ns, on) or None when no slot is
+        # ahead. A dated slot wins over a repeating one starting at the
+        # same time, and a slot ends early when the next one starts.
+        """
+        weekly_previous, weekly_next = self.weekly_around(wall_ns)
+        dated_previous, dated_next = self.dated_around(wall_ns)
+        following = None
+        for candidate in (dated_next, weekly_next):
+            if candidate is not None and (
+                    following is None or candidate[0] < following[0]):
+                following = candidate
+        previous = None
+        for candidate in (dated_previous, weekly_previous):
+            if candidate is not None and (
+                    previous is None or candidate[0] > previous[0]):
+                previous = candidate
+        if previous is not None:
+            start, slot_id = previous
+            end = start + self.duration_ns(self._config.get_timer(slot_id))
+            if following is not None:
+                end = min(end, following[0])
+            if wall_ns < end:
+                return slot_id, start, end, True
+        if following is None:
+            return None
+        start, slot_id = following
+        return slot_id, start, start, False
+
+    def locate(self, wall_ns, catch_up=False):
+        """Make the slot on at wall_ns, or the next one, current
+        #
+        # With catch_up, time since the start of the slot is added to the
+        # run clock and totals. Otherwise it is shown as elapsed only.
+        """
+        found = self.find_slot(wall_ns)
+        self._running = False
+        self._timer_origin_ns = self._run_ns
+        self._segment_start_ns = self._run_ns
+        if found is None:
+            self._boundary_ns = None
+            self._deadline_ns = self._timer_origin_ns + self._timer_duration
+            return
+        slot_id, start, end, on = found
+        self._current_timer_id = slot_id
+        self.select_timer(slot_id)
+        self._slot_start_ns = start
+        self._boundary_ns = end
+        if on:
+            self._running = True
+            self._timer_duration = end - start
+            elapsed = wall_ns - start
+            if catch_up:
+                self._run_ns += elapsed
+            else:
+                self._timer_origin_ns -= elapsed
+                self._segment_start_ns = self._run_ns
+            if self._started_at is None:
+                self._started_at = time.localtime(start // NS_PER_SECOND)
+        self._deadline_ns = self._timer_origin_ns + self._timer_duration
+
+    def relocate(self):
+        """Continue in the slot on now, time before now is not counted"""
+        self.locate(self._clock.time_ns())
+
+    def restore(self, state):
+        """Take counts and totals from state, position from the wall clock"""
+        super().restore(state)
+        self.relocate()
+
+    def run_clock(self):
+        """Current run clock reading in ns, advancing while a slot is on"""
+        if not self._running:
+            return self._run_ns
+        return max(self._run_ns, self._timer_origin_ns +
+                   self._clock.time_ns() - self._slot_start_ns)
+
+    def update(self):
+        """Update timer status from the wall clock
+        #
+        # Moves to the next slot, or waits for one, when the current one
+        # has ended, and finds its place again if the wall clock was set
+        # back.
+        """
+        wall_ns = self._clock.time_ns()
+        if self._boundary_ns is not None and wall_ns >= self._boundary_ns:
+            self.advance(wall_ns)
+        elif self._running and wall_ns < self._slot_start_ns:
+            self.advance(wall_ns)
+        elif self._running:
+            self._run_ns = self.run_clock()
+
+    def advance(self, wall_ns):
+        """Move over slot starts and ends up to wall_ns at once
+        #
+        # Slots that went by entirely (suspend, long stalls) are counted
+        # as completed with their whole duration. Every slot started and
+        # a slot ending without another starting is a transition, all of
+        # them raise a single alarm.
+        """
+        previous = (self._current_timer_id, self._slot_start_ns, self._running)
+        boundary = self._boundary_ns
+        transitions = 0
+        if self._running:
+            end = min(wall_ns, boundary)
+            self._run_ns = max(self._run_ns, self._timer_origin_ns +
+                               end - self._slot_start_ns)
+            self.settle()
+            if wall_ns >= boundary:
+                self._counts[self._timer_group] += 1
+
+        moment = boundary
+        while moment is not None and moment <= wall_ns:
+            found = self.find_slot(moment)
+            if found is None:
+                break
+            slot_id, start, end, on = found
+            if not on:
+                moment = start
+                continue
+            if end > wall_ns:
+                break
+            slot = self._config.get_timer(slot_id)
+            group = self._config.categories[slot["category"]]["group"]
+            self._counts[group] += 1
+            self._totals[group] += end - start
+            self._run_ns += end - start
+            transitions += 1
+            moment = end
+
+        self.locate(wall_ns, catch_up=True)
+        if self._running and (not previous[2] or previous[:2] != (
+                self._current_timer_id, self._slot_start_ns)):
+            transitions += 1
+        elif not self._running and previous[2] and not transitions:
+            transitions = 1
+        if not transitions:
+            return
+        self._lateness_ns = 0
+        if boundary is not None and wall_ns >= boundary:
+            self._lateness_ns = wall_ns - boundary
+        self._transitions += transitions
+        self._alarm_triggered = True
+        self.notify("complete")
+
+    def time_to_next_tick(self):
+        """Like TimerEngine, but between slots the time to the next one"""
+        if not self._running:
+            return self.time_to_deadline()
+        return super().time_to_next_tick()
+
+    def time_to_deadline(self):
+        """Seconds until the current slot ends or the next one starts
+        #
+        # None when no slot is ahead
+        """
+        if self._boundary_ns is None:
+            return None
+        wall_ns = self._clock.time_ns()
+        return max(0, self._boundary_ns - wall_ns) / NS_PER_SECOND
+
+    def start_timer(self):
+        """Slots start by the schedule"""
+
+    def stop_timer(self):
+        """Slots end by the schedule"""
+
+    def next_timer(self):
+        """The schedule decides the next slot"""
+
+    def reset_timer(self):
+        """Slots keep their place in the schedule"""
+
+    @staticmethod
+    def format_slot_start(slot):
+        """Format start of a slot as HH:MM, with date when dated"""
+        hours, seconds = divmod(slot["time"], 3600)
+        start = f'{hours:02}:{seconds // 60:02}'
+        if slot["date"] is not None:
+            year, month, day = slot["date"]
+            start = f'{year}-{month:02}-{day:02} {start}'
+        return start
+
+    @property
+    def slot_start_ns(self):
+        """Wall clock start of the current slot, or of the next one"""
+        return self._slot_start_ns
@@ -1,37 +1,37 @@
-import curses
-import time
-
-
 class Screen:
-    def __init__(self, config):
+    def __init__(self, config, backend=None):
         self._config = config
+        if backend is None:
+            from .CursesBackend import CursesBackend
+            backend = CursesBackend()
+        self._backend = backend
         self._windows = {}  # Store windows as a dictionary for easy usage
+        self._drawn = {}  # Last drawn strings per window, keyed by (y, x)
+        # Borders, lines and backgrounds are recorded with negative x
+        self._dirty = set()  # Windows changed since their last refresh
+        self._shown = {}  # Drawn strings per window as of the last flush
+        self._frame_changed = False  # Staged windows differ from the shown
+        self._overlays = []  # Windows kept on top of the others
+        self._frames = 0
+        self._flushes = 0
+        self._window_writes = 0
         self._is_resized = False
         self._use_colors = False
 
     def start(self):
-        """Initialize curses with defaults"""
-        self.stdscr = curses.initscr()
-        curses.noecho()
-        curses.cbreak()
-        curses.curs_set(0)
+        """Initialize terminal with defaults"""
+        self._backend.start()
         self.try_colors()
-        self.stdscr.keypad(True)
-        curses.setsyx(-1, -1)
 
     def stop(self):
         """Revert terminal to original state"""
-        curses.nocbreak()
-        self.stdscr.keypad(False)
-        curses.echo()
-        curses.endwin()
+        self._backend.stop()
 
     def try_colors(self):
         """Try to use colors"""
-        if curses.has_colors and self._config.use_colors:
+        if self._backend.has_colors() and self._config.use_colors:
             self._use_colors = True
-            curses.start_color()
-            self._init_colors()
+            self._backend.start_colors(self._config.prefer_terminal_colors)
 
     """Window-specific functions"""
 
@@ -43,21 +43,45 @@ class Screen:
         if self.test_existence(win):
             self._windows[win].resize(height, width)
         else:
-            self._windows[win] = curses.newwin(height, width, start_y, start_x)
+            self._windows[win] = self._backend.new_window(
+                height, width, start_y, start_x)
+        self._forget_window(win)
+        self._shown.pop(win, None)
 
     def remove_window(self, win):
-        """Remove window"""
+        """Remove window
+        #
+        # Windows below a removed overlay are repainted where it covered them
+        """
         if self.test_existence(win):
-            del self._windows[win]
+            window = self._windows.pop(win)
+            self._drawn.pop(win, None)
+            self._shown.pop(win, None)
+            self._dirty.discard(win)
+            if win in self._overlays:
+                self._overlays.remove(win)
+                self._repair_region(window)
+
+    def set_overlay(self, win):
+        """Keep window on top of the others, e.g. for a dialog
+        #
+        # Overlays are staged again after the windows below on each frame
+        """
+        if win not in self._overlays:
+            self._overlays.append(win)
 
     def move_window(self, win, y, x):
         """Move window"""
         self._windows[win].mvwin(y, x)
+        self._shown.pop(win, None)
+        self._dirty.add(win)
 
     def set_background(self, win, chr, color):
         """Set window background"""
         if self._use_colors:
-            self._windows[win].bkgd(chr, curses.color_pair(color))
+            self._windows[win].bkgd(chr, self._backend.color_pair(color))
+            self._drawn[win][(-1, -2)] = ("background", chr, color)
+            self._dirty.add(win)
 
     def get_char(self, win):
         """Get character from specified curses window"""
@@ -70,18 +94,86 @@ class Screen:
         if self.test_existence(win):
             self._windows[win].erase()
             y, x = self._windows[win].getmaxyx()
+            self._forget_window(win)
             if y >= 3 and x >= 3:  # borders only for big enough window
                 self._windows[win].border()
+                self._drawn[win][(-1, -1)] = ("border",)
 
     def refresh_window(self, win):
-        """Refresh selected window"""
-        self._windows[win].refresh()
+        """Refresh selected window at once if anything was drawn on it"""
+        self.stage_window(win)
+        self.flush_frame()
+
+    def stage_window(self, win):
+        """Stage selected window for the next frame if anything was drawn
+        #
+        # The window is copied to the virtual screen (noutrefresh), nothing
+        # goes to the terminal before flush_frame.
+        """
+        if win not in self._dirty:
+            return
+        self._windows[win].noutrefresh()
+        self._dirty.discard(win)
+        self._window_writes += 1
+        drawn = self._drawn[win]
+        if self._shown.get(win) != drawn:
+            self._shown[win] = dict(drawn)
+            self._frame_changed = True
+
+    def flush_frame(self):
+        """Send staged windows to the terminal in a single update
+        #
+        # Skipped when the staged windows show what they showed after the
+        # last flush, e.g. when a window was erased and drawn again as it
+        # was.
+        """
+        self._frames += 1
+        if not self._frame_changed:
+            return
+        for win in self._overlays:
+            self._windows[win].touchwin()
+            self._windows[win].noutrefresh()
+        self._backend.update()
+        self._frame_changed = False
+        self._flushes += 1
+
+    def repaint(self):
+        """Flush the next frame even if no window changed
+        #
+        # After a terminal resize, the terminal is repainted from windows
+        # staged earlier
+        """
+        self._frame_changed = True
+
+    def frame_counters(self):
+        """Frames, flushes and window writes so far
+        #
+        # Backends able to tell add terminal writes and bytes emitted
+        """
+        counters = {
+            "frames": self._frames,
+            "flushes": self._flushes,
+            "window_writes": self._window_writes,
+        }
+        counters.update(self._backend.output_counters())
+        return counters
 
     def set_nodelays(self):
         """Set nodelay attributes to True for all windows"""
         for window in self._windows.values():
             window.nodelay(True)
 
+    def wait_for_input(self, timeout, fds=(), write_fds=()):
+        """Block until input is available or timeout (seconds) has passed
+        #
+        # Returns the list of file descriptors that are ready for reading.
+        # Also wakes up when one of write_fds is ready for writing.
+        """
+        ready = self._backend.wait_for_input(timeout, fds, write_fds)
+        if self._backend.consume_resize():
+            self._is_resized = True
+        return ready
+
     def test_existence(self, win):
         """Test for window existence"""
         return win in self._windows
@@ -102,14 +194,28 @@ class Screen:
     """Text management functions"""
 
     def add_str(self, win, y, x, message, color=None):
-        """Add string to screen"""
+        """Add string to screen
+        #
+        # Strings identical to the one last drawn at the same position are
+        # skipped. A shorter string is padded with spaces to cover the
+        # previous one.
+        """
         max_y, max_x = self._windows[win].getmaxyx()
         max_len = max_x-x-1  # accommodate borders + padding
         if y < max_y and x < max_x and max_len > 0:
+            drawn = self._drawn[win]
+            previous = drawn.get((y, x))
+            text = message
+            if previous is not None:
+                if previous[0] == message and previous[1] == color:
+                    return
+                text = message.ljust(previous[2])
+            drawn[(y, x)] = (message, color, len(text))
+            self._dirty.add(win)
             if color is not None and self._use_colors:
-                self._windows[win].addnstr(y, x, message, max_len, color)
+                self._windows[win].addnstr(y, x, text, max_len, color)
             else:
-                self._windows[win].addnstr(y, x, message, max_len)
+                self._windows[win].addnstr(y, x, text, max_len)
 
     def add_centered_str(self, win, y, message, color=None):
         """Add centered string to screen"""
@@ -122,6 +228,9 @@ class Screen:
         max_len = max_x-4  # accommodate borders + padding
         if y < max_y:
             self._windows[win].hline(y, 2, chr, max_len)
+            self._forget_line(win, y)
+            self._drawn[win][(y, -1)] = ("hline", chr)
+            self._dirty.add(win)
 
     def calc_start_x(self, win, text):
         """Calculate starting point for horizontally centered text"""
@@ -153,13 +262,12 @@ class Screen:
 
     def update_status(self, c):
         """Update screen status"""
-        if c == curses.KEY_RESIZE:
+        if c == self._backend.KEY_RESIZE:
             self._is_resized = True
 
     def screen_size(self):
         """Get screen size"""
-        curses.update_lines_cols()
-        return curses.LINES, curses.COLS
+        return self._backend.screen_size()
 
     def color_pair(self, i):
         """Returns curses color pair
@@ -167,30 +275,43 @@ class Screen:
         # Returns NoneType if colors are not in use
         """
         if self._use_colors:
-            return curses.color_pair(i)
+            return self._backend.color_pair(i)
         else:
             return None
 
-    def alarm(self):
-        """Sound the actual alarm"""
-        for i in range(self._config.alarm_repeat):
-            if self._config.alarm_type == "beep":
-                curses.beep()
-            elif self._config.alarm_type == "flash":
-                curses.flash()
-            time.sleep(0.5)
-
-    def _init_colors(self):
-        """Initialize colors"""
-        curses.use_default_colors()
-
-        if curses.can_change_color() and not self._config.prefer_terminal_colors:
-            curses.init_color(curses.COLOR_RED, 1000, 300, 300)
-            curses.init_color(curses.COLOR_GREEN, 500, 1000, 300)
-            curses.init_color(curses.COLOR_BLUE, 300, 700, 1000)
-            curses.init_color(curses.COLOR_YELLOW, 1000, 750, 0)
-
-        curses.init_pair(2, curses.COLOR_RED, -1)
-        curses.init_pair(3, curses.COLOR_GREEN, -1)
-        curses.init_pair(4, curses.COLOR_BLUE, -1)
-        curses.init_pair(5, curses.COLOR_YELLOW, -1)
+    def beep(self):
+        """Ring the terminal bell"""
+        self._backend.beep()
+
+    def flash(self):
+        """Flash the terminal window"""
+        self._backend.flash()
+
+    def _repair_region(self, removed):
+        """Stage the rows of other windows a removed window covered
+        #
+        # The windows kept their contents, so only the damaged region
+        # differs from the terminal and gets sent on the next flush.
+        """
+        top, left = removed.getbegyx()
+        height, width = removed.getmaxyx()
+        for window in self._windows.values():
+            y, x = window.getbegyx()
+            max_y, max_x = window.getmaxyx()
+            start = max(top, y)
+            end = min(top + height, y + max_y)
+            if start < end and max(left, x) < min(left + width, x + max_x):
+                window.touchline(start - y, end - start)
+                window.noutrefresh()
+                self._frame_changed = True
+
+    def _forget_window(self, win):
+        """Forget what has been drawn on a window, it will be drawn anew"""
+        self._drawn[win] = {}
+        self._dirty.add(win)
+
+    def _forget_line(self, win, y):
+        """Forget what has been drawn on a single line of a window"""
+        drawn = self._drawn[win]
+        for key in [key for key in drawn if key[0] == y]:
+            del drawn[key]
@@ -0,0 +1,110 @@
+import random
+import time
+from .Clock import VirtualClock
+from .TimerEngine import TimerEngine, NS_PER_SECOND
+
+
+class Simulation:
+    """Headless driver running TimerEngine through virtual time
+    #
+    # Feeds the engine the same keystrokes as the user interface would
+    # (start/stop, next, reset) at random moments, with occasional long
+    # stalls like laptop suspends, and checks counter invariants against
+    # an independent bookkeeping of running time.
+    """
+
+    TICK_NS = NS_PER_SECOND  # Main loop wakes about once a second
+    KEY_PROBABILITY = 0.001  # Chance of a keystroke per tick
+    STALL_PROBABILITY = 0.0001  # Chance of a stall per tick
+    MAX_STALL_NS = 12 * 60 * 60 * NS_PER_SECOND
+
+    def __init__(self, config, days=7, seed=None):
+        self._config = config
+        self._days = days
+        self._random = random.Random(seed)
+        self._clock = VirtualClock()
+        self._engine = TimerEngine(config, self._clock)
+        self._running_ns = 0  # Running time as seen by the driver
+        self._ticks = 0
+        self._keystrokes = 0
+        self._stalls = 0
+        self._violations = []
+
+    def run(self):
+        """Run the simulation and return a report dictionary"""
+        end_ns = self._clock.monotonic_ns() + self._days * 86400 * NS_PER_SECOND
+        self._engine.start_timer()
+        started = time.perf_counter()
+        while self._clock.monotonic_ns() < end_ns:
+            self.step()
+        wall_time = time.perf_counter() - started
+        return self.report(wall_time)
+
+    def step(self):
+        """Advance virtual time by one tick or stall and update engine"""
+        roll = self._random.random()
+        if roll < self.STALL_PROBABILITY:
+            elapsed = self._random.randrange(self.MAX_STALL_NS)
+            self._stalls += 1
+        else:
+            elapsed = self.TICK_NS + self._random.randrange(-1000, 1000)
+        self._clock.advance(elapsed)
+        if self._engine.running:
+            self._running_ns += elapsed
+
+        if self._random.random() < self.KEY_PROBABILITY:
+            self.press_key(self._random.choice("ssnr"))
+
+        self._engine.update()
+        self._engine.ack_alarm()
+        self._ticks += 1
+        self.check_invariants()
+
+    def press_key(self, key):
+        """Act like the user interface does on a keystroke"""
+        self._keystrokes += 1
+        if key == "s":
+            if self._engine.running:
+                self._engine.stop_timer()
+            else:
+                self._engine.start_timer()
+        elif key == "n":
+            self._engine.next_timer()
+            self._engine.reset_timer()
+        elif key == "r":
+            self._engine.reset_timer()
+
+    def check_invariants(self):
+        """Record any broken engine invariant"""
+        engine = self._engine
+        if not 0 <= engine.time_elapsed_ns < engine.timer_duration_ns:
+            self._violations.append(
+                f"tick {self._ticks}: elapsed {engine.time_elapsed_ns} "
+                f"outside timer duration {engine.timer_duration_ns}")
+        if engine.run_ns != self._running_ns:
+            self._violations.append(
+                f"tick {self._ticks}: run clock {engine.run_ns} "
+                f"diverged from running time {self._running_ns}")
+
+    def report(self, wall_time):
+        """Collect simulation results"""
+        engine = self._engine
+        group_total = sum(
+            engine.total_time(group)
+            for group in range(len(engine.group_names)))
+        return {
+            "simulated_days": self._days,
+            "ticks": self._ticks,
+            "keystrokes": self._keystrokes,
+            "stalls": self._stalls,
+            "wall_time": wall_time,
+            "ticks_per_second": self._ticks / wall_time if wall_time else 0,
+            "work_count": engine.work_count,
+            "short_count": engine.short_count,
+            "long_count": engine.long_count,
+            "others_count": engine.others_count,
+            "total_time_elapsed_ns": engine.run_ns,
+            "total_divergence_ns": group_total - engine.run_ns,
+            "violations": self._violations[:10],
+            "violation_count": len(self._violations),
+        }
@@ -0,0 +1,188 @@
+import mmap
+import os
+import struct
+import time
+
+NS_PER_SECOND = 1_000_000_000
+
+
+class StatusSnapshot:
+    """Timer status in a small memory-mapped file for status bars
+    #
+    # The file has a fixed layout: magic, sequence number and a body with
+    # the timer status. The writer makes the sequence odd while it writes
+    # the body and even again when done (a seqlock), readers retry until
+    # they see the same even sequence before and after copying the body,
+    # so they never see a half written status. Elapsed time is stored with
+    # the wall clock time it was taken at, so the file only changes on
+    # timer events and readers work out the current elapsed time. The file
+    # belongs to the process whose pid it holds, another timer leaves it
+    # alone while that process runs.
+    """
+
+    MAGIC = b"PTS1"
+    HEADER = struct.Struct("<4sI")  # Magic, sequence
+    SEQUENCE = struct.Struct("<I")
+    # Writer pid, running, timer id, elapsed ns, wall clock ns elapsed was
+    # taken at, duration ns, work/short/long break/other counts, timer name
+    BODY = struct.Struct("<i?xxxiqqq4I64s")
+    SIZE = HEADER.size + BODY.size
+    READ_ATTEMPTS = 1000
+
+    def __init__(self, path=None):
+        self._path = path if path is not None else self.default_path()
+        self._fd = None
+        self._map = None
+        self._sequence = 0
+
+    @staticmethod
+    def runtime_dir():
+        """Get per-user directory for sockets and other runtime files"""
+        runtime = os.environ.get("XDG_RUNTIME_DIR")
+        if runtime:
+            return os.path.join(runtime, "potatotimer")
+        tmp = os.environ.get("TMPDIR", "/tmp")
+        return os.path.join(tmp, f'potatotimer-{os.getuid()}')
+
+    @classmethod
+    def default_path(cls):
+        """Get default status file location"""
+        return os.path.join(cls.runtime_dir(), "status")
+
+    def open(self):
+        """Create the status file and map it for writing
+        #
+        # A file written by a timer that is still running raises OSError
+        """
+        os.makedirs(os.path.dirname(self._path), mode=0o700, exist_ok=True)
+        fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            owner = self.owner(fd)
+            if owner != os.getpid() and self.is_alive(owner):
+                raise OSError(f'{self._path} is in use by another timer')
+            os.ftruncate(fd, self.SIZE)
+            self._map = mmap.mmap(fd, self.SIZE)
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+        self._sequence = self.SEQUENCE.unpack_from(self._map, 4)[0] & ~1
+
+    @classmethod
+    def owner(cls, fd):
+        """Get writer pid of an open status file, None for an empty file"""
+        data = os.pread(fd, cls.SIZE, 0)
+        if len(data) < cls.SIZE or data[:4] != cls.MAGIC:
+            return None
+        return cls.BODY.unpack_from(data, cls.HEADER.size)[0]
+
+    @staticmethod
+    def is_alive(pid):
+        """Whether process pid is running"""
+        if pid is None or pid <= 0:
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def publish(self, engine):
+        """Write status of engine"""
+        name = engine.timer_name.encode("utf-8")[:64]
+        body = self.BODY.pack(
+            os.getpid(), engine.running, engine.current_timer_id,
+            engine.time_elapsed_ns, time.time_ns(), engine.timer_duration_ns,
+            engine.work_count, engine.short_count, engine.long_count,
+            engine.others_count, name)
+        self.write(body)
+
+    def write(self, body):
+        """Write status body under the seqlock"""
+        self._sequence = (self._sequence + 1) & 0xffffffff
+        self.HEADER.pack_into(self._map, 0, self.MAGIC, self._sequence)
+        self._map[self.HEADER.size:] = body
+        self._sequence = (self._sequence + 1) & 0xffffffff
+        self.SEQUENCE.pack_into(self._map, 4, self._sequence)
+
+    def close(self):
+        """Remove status file, the timer is no longer running
+        #
+        # A file that another timer has taken over since is left in place
+        """
+        if self._map is None:
+            return
+        self._map.close()
+        self._map = None
+        try:
+            with open(self._path, 'rb') as stream:
+                if self.owner(stream.fileno()) == os.getpid():
+                    os.unlink(self._path)
+        except OSError:
+            pass
+        finally:
+            os.close(self._fd)
+
+    @classmethod
+    def read(cls, path=None):
+        """Read timer status as a dictionary for formatting
+        #
+        # Returns None when no timer is running (no file, or the timer that
+        # wrote it is gone) or the file is not a status file.
+        """
+        try:
+            with open(path or cls.default_path(), 'rb') as stream:
+                mapped = mmap.mmap(stream.fileno(), cls.SIZE,
+                                   access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        with mapped:
+            for attempt in range(cls.READ_ATTEMPTS):
+                magic, before = cls.HEADER.unpack_from(mapped)
+                if before & 1:
+                    continue
+                body = mapped[cls.HEADER.size:]
+                if cls.SEQUENCE.unpack_from(mapped, 4)[0] == before:
+                    break
+            else:
+                return None
+        if magic != cls.MAGIC:
+            return None
+        (pid, running, timer_id, elapsed, taken_at, duration, work, short,
+         long, others, name) = cls.BODY.unpack(body)
+        if not cls.is_alive(pid):
+            return None
+        if running:
+            elapsed = min(duration, elapsed + time.time_ns() - taken_at)
+        elapsed_s = elapsed // NS_PER_SECOND
+        duration_s = duration // NS_PER_SECOND
+        remaining_s = duration_s - elapsed_s
+        return {
+            "timer": name.rstrip(b"\0").decode("utf-8", "ignore"),
+            "timer_id": timer_id,
+            "state": "running" if running else "stopped",
+            "elapsed": cls.format_seconds(elapsed_s),
+            "duration": cls.format_seconds(duration_s),
+            "remaining": cls.format_seconds(remaining_s),
+            "elapsed_s": elapsed_s,
+            "duration_s": duration_s,
+            "remaining_s": remaining_s,
+            "percent": 100 * elapsed // duration if duration else 0,
+            "work": work,
+            "short": short,
+            "long": long,
+            "others": others,
+        }
+
+    @staticmethod
+    def format_seconds(seconds):
+        """Format seconds as H:MM:SS"""
+        minutes, seconds = divmod(seconds, 60)
+        hours, minutes = divmod(minutes, 60)
+        return f'{hours}:{minutes:02}:{seconds:02}'
+
+    @property
+    def path(self):
+        return self._path
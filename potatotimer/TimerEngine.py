@@ -1,114 +1,305 @@
 import time
+from .Clock import Clock
+
+NS_PER_SECOND = 1_000_000_000
+NS_PER_MINUTE = 60 * NS_PER_SECOND
 
 
 class TimerEngine:
-    def __init__(self, config):
+    """Timer engine keeping time as integer nanoseconds
+    #
+    # Time is measured on a run clock that advances only while the timer
+    # runs: run time banked over previous runs plus time since the latest
+    # start. Elapsed time and totals are derived from run clock timestamps
+    # instead of summing float deltas, so they never drift.
+    """
+
+    WORK = 0  # Stat groups that always exist, see Config.intern_categories
+    SHORT_BREAK = 1
+    LONG_BREAK = 2
+
+    __slots__ = (
+        "_config", "_clock", "_alarm_triggered", "_transitions", "_counts",
+        "_totals", "_current_timer_id", "_running", "_started_at",
+        "_timer_name", "_timer_category", "_timer_duration", "_resumed_ns",
+        "_banked_ns", "_run_ns", "_timer_origin_ns", "_segment_start_ns",
+        "_deadline_ns", "_group_names", "_timer_group", "_listeners",
+        "_lateness_ns",
+    )
+
+    def __init__(self, config, clock=None):
         self._config = config
+        self._clock = clock if clock is not None else Clock()
         self._alarm_triggered = False
-        self._work_count = 0
-        self._short_count = 0
-        self._long_count = 0
-        self._others_count = 0
+        self._transitions = 0
         self._current_timer_id = 0
-        self._previous_monotonic = 0
         self._running = False
         self._started_at = None
         self._timer_name = None
-        self._timer_duration = 0
-        self._time_elapsed = 0
-        self._total_time_elapsed = 0
-        self._total_time_working = 0
-        self._total_time_s_breaks = 0
-        self._total_time_l_breaks = 0
-        self._total_time_others = 0
+        self._timer_category = 0
+        self._timer_group = 0
+        self._timer_duration = 0  # ns
+        self._resumed_ns = 0  # Monotonic time of latest start
+        self._banked_ns = 0  # Run clock at latest start
+        self._run_ns = 0  # Run clock at latest update
+        self._timer_origin_ns = 0  # Run clock at start of current timer
+        self._segment_start_ns = 0  # Run clock up to which totals are settled
+        self._deadline_ns = 0  # Run clock at end of current timer
+        self._lateness_ns = 0  # Run clock past deadline at latest transition
+        self._group_names = []
+        self._listeners = []
+        self.load_groups()
+        self._counts = [0] * len(self._group_names)  # Completed per group
+        self._totals = [0] * len(self._group_names)  # Settled ns per group
         self.select_timer(0)
+        self._deadline_ns = self._timer_duration
+
+    def load_groups(self):
+        """Take stat groups from the config
+        #
+        # Stat groups of the config come first, groups that disappeared
+        # from the config are kept so their counts and totals survive.
+        # Cumulative durations and counts are kept by the compiled timers
+        # (see TimerSequence).
+        """
+        self._group_names = self._config.groups + [
+            name for name in self._group_names
+            if name not in self._config.groups
+        ]
+
+    def reload_timers(self):
+        """Apply a changed timers list in place
+        #
+        # Keeps current position, elapsed time, counts and totals. Time so
+        # far is settled on the old timer before the new list takes over.
+        # If the current timer is gone, continues from the last one.
+        """
+        self._run_ns = self.run_clock()
+        self.settle()
+        counts = dict(zip(self._group_names, self._counts))
+        totals = dict(zip(self._group_names, self._totals))
+        self.load_groups()
+        self._counts = [counts.get(name, 0) for name in self._group_names]
+        self._totals = [totals.get(name, 0) for name in self._group_names]
+        self.relocate()
+        self.notify("reload")
+
+    def relocate(self):
+        """Continue at the current position after the timers changed"""
+        self._current_timer_id = min(
+            self._current_timer_id, len(self._config.timers) - 1)
+        self.select_timer(self._current_timer_id)
+        self._deadline_ns = self._timer_origin_ns + self._timer_duration
+
+    def add_listener(self, listener):
+        """Call listener(event, engine) after engine events
+        #
+        # Events are start, stop, next, reset, complete (one or more
+        # timers ran out) and reload (config changed).
+        """
+        self._listeners.append(listener)
+
+    def notify(self, event):
+        """Tell listeners about an event"""
+        for listener in self._listeners:
+            listener(event, self)
+
+    def snapshot(self):
+        """Engine state as of latest update as a dictionary of plain values"""
+        return {
+            "running": self._running,
+            "run_ns": self._run_ns,
+            "timer_id": self._current_timer_id,
+            "elapsed_ns": self._run_ns - self._timer_origin_ns,
+            "duration_ns": self._timer_duration,
+            "groups": list(self._group_names),
+            "counts": list(self._counts),
+            "totals": [
+                self.total_time(group) for group in range(len(self._counts))
+            ],
+            "started_at": (
+                tuple(self._started_at) if self._started_at is not None
+                else None),
+        }
+
+    def restore(self, state):
+        """Continue from a state made by snapshot()
+        #
+        # Like reload_timers, counts and totals are matched by stat group
+        # name and the timer position is clamped to the current timers.
+        """
+        self._running = state["running"]
+        self._run_ns = state["run_ns"]
+        self._banked_ns = self._run_ns
+        self._resumed_ns = self._clock.monotonic_ns()
+        self._segment_start_ns = self._run_ns
+        self._group_names = state["groups"]
+        self.load_groups()
+        counts = dict(zip(state["groups"], state["counts"]))
+        totals = dict(zip(state["groups"], state["totals"]))
+        self._counts = [counts.get(name, 0) for name in self._group_names]
+        self._totals = [totals.get(name, 0) for name in self._group_names]
+        self._current_timer_id = min(
+            state["timer_id"], len(self._config.timers) - 1)
+        self.select_timer(self._current_timer_id)
+        elapsed = min(state["elapsed_ns"], self._timer_duration - 1)
+        self._timer_origin_ns = self._run_ns - elapsed
+        self._deadline_ns = self._timer_origin_ns + self._timer_duration
+        self._started_at = None
+        if state["started_at"] is not None:
+            self._started_at = time.struct_time(state["started_at"])
+
+    def clear_stats(self):
+        """Zero counts and totals, keeping the timer position"""
+        self._counts = [0] * len(self._group_names)
+        self._totals = [0] * len(self._group_names)
+        self._segment_start_ns = self._run_ns
+        self._started_at = None
 
     def ack_alarm(self):
         """Acknowledge alarm"""
         self._alarm_triggered = False
+        self._transitions = 0
 
     def start_timer(self):
         """Start current timer"""
+        if self._running:
+            return
         self._running = True
-        self._previous_monotonic = time.monotonic()
+        self._resumed_ns = self._clock.monotonic_ns()
+        self._banked_ns = self._run_ns
         if self._started_at == None:
-            self._started_at = time.localtime()
+            self._started_at = self._clock.localtime()
+        self.notify("start")
 
     def stop_timer(self):
         """Stop current timer"""
-        self._running = False
+        if self._running:
+            self.update()
+            self._running = False
+            self.notify("stop")
 
     def update(self):
         """Update timer status
-        # 
+        #
         # Calling update actually runs the timer.
         # Make sure to call update at least every few seconds
         """
         if self._running:
-            since_update = self.get_elapsed_time()
-            self._time_elapsed += since_update
-            self.calc_total_time_spent(since_update)
-            if self._time_elapsed >= self._timer_duration:
-                """
-                Issue 6: Elapsed time can't just be set to zero since it would mean
-                losing the overflow on slower update cycles. This presets the next
-                timer with the time spent over designated duration of a previous timer
-                and effectively eliminates lag.
-                """
-                self._time_elapsed = self._time_elapsed - self._timer_duration
-                self._alarm_triggered = True
-                self.increase_counts()
-                self.next_timer()
-
-    def get_elapsed_time(self):
-        """Returns time elapsed since last call"""
-        current_m = time.monotonic()
-        elapsed = (current_m - self._previous_monotonic)
-        self._previous_monotonic = current_m
-        return elapsed
+            self._run_ns = self.run_clock()
+            if self._run_ns >= self._deadline_ns:
+                self.advance()
+
+    def run_clock(self):
+        """Current run clock reading in ns"""
+        if not self._running:
+            return self._run_ns
+        return self._banked_ns + self._clock.monotonic_ns() - self._resumed_ns
+
+    def advance(self):
+        """Advance over one or more timer transitions at once
+        #
+        # Time since last update may span several timers, even several
+        # cycles (suspend, long stalls). The new timer is located and counts
+        # and totals are updated from prefix sums of the compiled timers,
+        # with divmod over cycles and repeat blocks, so the cost does not
+        # depend on how many timers were skipped. Overflow over the previous
+        # timer carries over to the next one (issue 6). All transitions
+        # raise a single alarm.
+        """
+        timers = self._config.timers
+        timer_start = timers.start_ns(self._current_timer_id)
+        start = timer_start + self._segment_start_ns - self._timer_origin_ns
+        end = timer_start + self._run_ns - self._timer_origin_ns
+        index, index_start = timers.locate_ns(end)
+        transitions = index - self._current_timer_id
+
+        times_before = timers.time_before(start)
+        times_after = timers.time_before(end)
+        counts_before = timers.count_before(self._current_timer_id)
+        counts_after = timers.count_before(index)
+        for g in range(len(times_before)):
+            self._totals[g] += times_after[g] - times_before[g]
+            self._counts[g] += counts_after[g] - counts_before[g]
+
+        timer_id = index % len(timers)
+        self._lateness_ns = self._run_ns - self._deadline_ns
+        self._current_timer_id = timer_id
+        self.select_timer(timer_id)
+        self._timer_origin_ns = self._run_ns - (end - index_start)
+        self._segment_start_ns = self._run_ns
+        self._deadline_ns = self._timer_origin_ns + self._timer_duration
+        self._transitions += transitions
+        self._alarm_triggered = True
+        self.notify("complete")
+
+    def settle(self):
+        """Add time of current segment to totals of current timer"""
+        self._totals[self._timer_group] += self._run_ns - self._segment_start_ns
+        self._segment_start_ns = self._run_ns
+
+    def time_to_next_tick(self):
+        """Seconds until the next visible change of the running timer
+        #
+        # Returns None when the timer is stopped. Otherwise returns the time
+        # until the rounded elapsed time changes or the current timer runs
+        # out, whichever comes first.
+        """
+        if not self._running:
+            return None
+        run_ns = self.run_clock()
+        elapsed = run_ns - self._timer_origin_ns
+        half = NS_PER_SECOND // 2
+        to_second = (elapsed + half) // NS_PER_SECOND * NS_PER_SECOND + half - elapsed
+        to_end = self._deadline_ns - run_ns
+        return max(0, min(to_second, to_end)) / NS_PER_SECOND
+
+    def time_to_deadline(self):
+        """Seconds until the current timer runs out, None when stopped"""
+        if not self._running:
+            return None
+        return max(0, self._deadline_ns - self.run_clock()) / NS_PER_SECOND
 
     def next_timer(self):
         """Jump to next timer
-        # 
+        #
         # Loops the timers list indefinitely
         """
+        self._run_ns = self.run_clock()
+        self.settle()
         self._current_timer_id += 1
         if self._current_timer_id >= len(self._config.timers):
             self._current_timer_id = 0
         self.select_timer(self._current_timer_id)
+        self._deadline_ns = self._timer_origin_ns + self._timer_duration
+        self.notify("next")
 
-    def increase_counts(self):
-        """Increase timer counts based on currently selected timer"""
-        if self._timer_name == "work":
-            self._work_count += 1
-        elif self._timer_name == "short break":
-            self._short_count += 1
-        elif self._timer_name == "long break":
-            self._long_count += 1
-        else:
-            self._others_count += 1
-
-    def calc_total_time_spent(self, since_update):
-        """Calculate total time elapsed and time spent working"""
-        if self._timer_name == "work":
-            self._total_time_working += since_update
-        elif self._timer_name == "short break":
-            self._total_time_s_breaks += since_update
-        elif self._timer_name == "long break":
-            self._total_time_l_breaks += since_update
-        else:
-            self._total_time_others += since_update
-        self._total_time_elapsed += since_update
+    def duration_ns(self, timer):
+        """Get timer duration (minutes in config) in ns"""
+        return round(timer["duration"] * NS_PER_MINUTE)
 
     def select_timer(self, timer_id):
         """Load timer from timers list"""
         timer = self._config.get_timer(timer_id)
         self._timer_name = timer["type"]
-        self._timer_duration = timer["duration"]*60
+        self._timer_category = timer["category"]
+        self._timer_group = self._config.categories[timer["category"]]["group"]
+        self._timer_duration = self.duration_ns(timer)
 
     def reset_timer(self):
         """Reset current timer to beginning"""
-        self._time_elapsed = 0
+        self._run_ns = self.run_clock()
+        self.settle()
+        self._timer_origin_ns = self._run_ns
+        self._deadline_ns = self._timer_origin_ns + self._timer_duration
+        self.notify("reset")
+
+    def total_time(self, group):
+        """Total time spent in group timers as of latest update in ns"""
+        total = self._totals[group]
+        if self._timer_group == group:
+            total += self._run_ns - self._segment_start_ns
+        return total
 
     @property
     def running(self):
@@ -126,50 +317,89 @@ class TimerEngine:
     def alarm_triggered(self):
         return self._alarm_triggered
 
+    @property
+    def transitions(self):
+        """Timer transitions since the alarm was last acknowledged"""
+        return self._transitions
+
+    @property
+    def lateness_ns(self):
+        """How long after its end the latest timer transition was noticed"""
+        return self._lateness_ns
+
     @property
     def started_at(self):
         return self._started_at
 
+    def count(self, group):
+        """Completed timers in stat group"""
+        return self._counts[group]
+
+    @property
+    def group_names(self):
+        """Stat group names by group id"""
+        return self._group_names
+
+    @property
+    def timer_category(self):
+        return self._timer_category
+
     @property
     def long_count(self):
-        return self._long_count
+        return self._counts[self.LONG_BREAK]
 
     @property
     def short_count(self):
-        return self._short_count
+        return self._counts[self.SHORT_BREAK]
 
     @property
     def work_count(self):
-        return self._work_count
+        return self._counts[self.WORK]
 
     @property
     def others_count(self):
-        return self._others_count
+        return sum(self._counts[self.LONG_BREAK + 1:])
 
     @property
     def total_time_working(self):
-        return self._total_time_working
+        return self.total_time(self.WORK) / NS_PER_SECOND
 
     @property
     def total_time_s_breaks(self):
-        return self._total_time_s_breaks
+        return self.total_time(self.SHORT_BREAK) / NS_PER_SECOND
 
     @property
     def total_time_l_breaks(self):
-        return self._total_time_l_breaks
+        return self.total_time(self.LONG_BREAK) / NS_PER_SECOND
 
     @property
     def total_time_others(self):
-        return self._total_time_others
+        return sum(
+            self.total_time(group)
+            for group in range(self.LONG_BREAK + 1, len(self._group_names))
+        ) / NS_PER_SECOND
 
     @property
     def total_time_elapsed(self):
-        return self._total_time_elapsed
+        return self._run_ns / NS_PER_SECOND
 
     @property
     def timer_duration(self):
-        return self._timer_duration
+        return self._timer_duration / NS_PER_SECOND
 
     @property
     def time_elapsed(self):
-        return self._time_elapsed
+        return (self._run_ns - self._timer_origin_ns) / NS_PER_SECOND
+
+    @property
+    def run_ns(self):
+        """Run clock (total time spent running) as of latest update in ns"""
+        return self._run_ns
+
+    @property
+    def time_elapsed_ns(self):
+        return self._run_ns - self._timer_origin_ns
+
+    @property
+    def timer_duration_ns(self):
+        return self._timer_duration
@@ -0,0 +1,179 @@
+import bisect
+from .TimerEngine import NS_PER_MINUTE
+
+
+class TimerSequence:
+    """Timers of a config as a compiled pattern of repeat blocks
+    #
+    # A block is a list of timers and nested blocks run repeat times over.
+    # Each block keeps, per item, cumulative steps, duration and duration
+    # and count per stat group, so a timer is found by its index or its
+    # time from cycle start descending one block per nesting level,
+    # without expanding the pattern. Memory use depends on the size of
+    # the pattern, not on how many timers it runs. Indexes and positions
+    # past the end continue over repeated cycles. Per group sums are rows
+    # of group_count values in one flat list, a timer only adds a value
+    # for its own group and shares the others with the row before.
+    """
+
+    __slots__ = (
+        "_repeat", "_group_count", "_items", "_item_groups", "_steps",
+        "_times", "_group_times", "_group_counts",
+    )
+
+    def __init__(self, pattern, categories, group_count, repeat=1):
+        self._repeat = repeat
+        self._group_count = group_count
+        self._items = []
+        self._item_groups = []  # Stat group of each timer, None for blocks
+        self._steps = [0]  # Timers before each item in one repeat
+        self._times = [0]  # Duration in ns before each item in one repeat
+        self._group_times = [0] * group_count  # Same per stat group
+        self._group_counts = [0] * group_count  # Timers per stat group
+        for item in pattern:
+            group_times = self._group_times[-group_count:]
+            group_counts = self._group_counts[-group_count:]
+            if "repeat" in item:
+                item = TimerSequence(
+                    item["timers"], categories, group_count, item["repeat"])
+                group = None
+                steps = len(item)
+                duration = item.duration_ns
+                for g, (time, count) in enumerate(zip(
+                        item.group_durations_ns, item.group_lengths)):
+                    if count:
+                        group_times[g] += time
+                        group_counts[g] += count
+            else:
+                group = categories[item["category"]]["group"]
+                steps = 1
+                duration = round(item["duration"] * NS_PER_MINUTE)
+                group_times[group] += duration
+                group_counts[group] += 1
+            self._items.append(item)
+            self._item_groups.append(group)
+            self._steps.append(self._steps[-1] + steps)
+            self._times.append(self._times[-1] + duration)
+            self._group_times += group_times
+            self._group_counts += group_counts
+
+    def __len__(self):
+        return self._repeat * self._steps[-1]
+
+    def __iter__(self):
+        """Go through timers in order, expanding blocks on the way"""
+        for repeat in range(self._repeat):
+            for item in self._items:
+                if isinstance(item, TimerSequence):
+                    yield from item
+                else:
+                    yield item
+
+    def __getitem__(self, index):
+        """Get timer by index"""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Timer not found")
+        block = self
+        while True:
+            index %= block._steps[-1]
+            item_id = bisect.bisect_right(block._steps, index) - 1
+            index -= block._steps[item_id]
+            item = block._items[item_id]
+            if not isinstance(item, TimerSequence):
+                return item
+            block = item
+
+    def start_ns(self, index):
+        """Time from first cycle start to the start of timer index in ns"""
+        start = 0
+        block = self
+        while True:
+            repeats, index = divmod(index, block._steps[-1])
+            item_id = bisect.bisect_right(block._steps, index) - 1
+            start += repeats * block._times[-1] + block._times[item_id]
+            index -= block._steps[item_id]
+            item = block._items[item_id]
+            if not isinstance(item, TimerSequence):
+                return start
+            block = item
+
+    def locate_ns(self, position):
+        """Index and start in ns of the timer running at position in ns
+        #
+        # Both count from the first cycle start
+        """
+        index = 0
+        start = 0
+        block = self
+        while True:
+            repeats, position = divmod(position, block._times[-1])
+            item_id = bisect.bisect_right(block._times, position) - 1
+            index += repeats * block._steps[-1] + block._steps[item_id]
+            start += repeats * block._times[-1] + block._times[item_id]
+            position -= block._times[item_id]
+            item = block._items[item_id]
+            if not isinstance(item, TimerSequence):
+                return index, start
+            block = item
+
+    def time_before(self, position):
+        """Time spent in timers of each stat group up to position in ns"""
+        group_count = self._group_count
+        times = [0] * group_count
+        block = self
+        while True:
+            repeats, position = divmod(position, block._times[-1])
+            item_id = bisect.bisect_right(block._times, position) - 1
+            row = item_id * group_count
+            last = len(block._group_times) - group_count
+            for group in range(group_count):
+                times[group] += (repeats * block._group_times[last + group] +
+                                 block._group_times[row + group])
+            position -= block._times[item_id]
+            item = block._items[item_id]
+            if not isinstance(item, TimerSequence):
+                times[block._item_groups[item_id]] += position
+                return times
+            block = item
+
+    def count_before(self, index):
+        """Number of timers of each stat group before timer index"""
+        group_count = self._group_count
+        counts = [0] * group_count
+        block = self
+        while True:
+            repeats, index = divmod(index, block._steps[-1])
+            item_id = bisect.bisect_right(block._steps, index) - 1
+            row = item_id * group_count
+            last = len(block._group_counts) - group_count
+            for group in range(group_count):
+                counts[group] += (repeats * block._group_counts[last + group] +
+                                  block._group_counts[row + group])
+            index -= block._steps[item_id]
+            item = block._items[item_id]
+            if not isinstance(item, TimerSequence):
+                return counts
+            block = item
+
+    @property
+    def duration_ns(self):
+        """Duration of all timers, repeats included, in ns"""
+        return self._repeat * self._times[-1]
+
+    @property
+    def group_durations_ns(self):
+        """Duration of all timers of each stat group in ns"""
+        return [
+            self._repeat * time
+            for time in self._group_times[-self._group_count:]
+        ]
+
+    @property
+    def group_lengths(self):
+        """Number of timers of each stat group"""
+        return [
+            self._repeat * count
+            for count in self._group_counts[-self._group_count:]
+        ]
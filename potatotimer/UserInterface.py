@@ -1,70 +1,211 @@
 import time
 from datetime import timedelta
+from functools import lru_cache
+from .AlarmScheduler import AlarmScheduler
+from .ScheduleEngine import ScheduleEngine
+from .TimerEngine import NS_PER_SECOND
 
 
 class UserInterface:
-    def __init__(self, config, engine, screen):
+    STAT_LABELS = {
+        "work": "Work stints:",
+        "short break": "Short breaks:",
+        "long break": "Long breaks:",
+    }
+    HELP = [
+        "Potato Timer Help",
+        "",
+        "s: Start and stop timers",
+        "n: Next timer (starts from 0)",
+        "r: Reset current timer",
+        "h: Show/hide help",
+        "q: Quit, a background timer keeps running",
+        "Q: Quit and shut the timer down",
+        "",
+        "For more help and config examples please consult:",
+        "github.com/mtijas/potato-timer",
+        "",
+        "(c) Markus Ijäs",
+    ]
+    RESIZE_SETTLE = 0.1  # Seconds without resizes before windows are laid out
+
+    def __init__(self, config, engine, screen, daemon=None, instruments=None):
         self._config = config
         self._engine = engine
         self._screen = screen
+        self._daemon = daemon  # Runs engine in process, None when attached
+        self._session = daemon if daemon is not None else engine  # Commands
+        self._instruments = instruments  # Timing histograms, None when off
+        self._status = None  # Status text currently on statusline
+        self._notice = ""  # One-off message shown until next keystroke
+        self._alarms = AlarmScheduler(  # Notify and sound are the daemon's
+            config, screen, AlarmScheduler.TERMINAL_ALARMS)
+        self._sidebar_top = 0  # Timer id shown on first sidebar row
+        self._marker_id = None  # Timer id the sidebar marker is drawn at
+        self._help = False  # Whether help is shown over the other windows
+        self._layout = ()  # Window geometries in use, see layout
+        self._relayout_at = None  # Monotonic time to lay windows out again
 
     def start(self):
-        """Start user interface"""
+        """Start user interface
+        #
+        # Returns True when the user chose to shut the timer down too
+        """
+        if self._daemon is not None:
+            self._daemon.open()
+        self._engine.add_listener(self.handle_event)
         self._screen.start()
         self.manage_windows()
         try:
-            self.main_loop()
+            return self.main_loop()
         finally:
+            self._alarms.shutdown()
+            self._session.close()
             self._screen.stop()
 
     def main_loop(self):
         """User interface main loop
         # 
-        # Handles keystrokes, updates UI and runs timer engine
+        # Sleeps until a key is pressed, the daemon has news or until the
+        # next visible change (timer second boundary, clock second), then
+        # handles keystrokes, updates UI and runs timer engine. Windows
+        # updated are flushed to the terminal as one frame before sleeping.
+        """
+        instruments = self._instruments
+        while True:
+            self._screen.flush_frame()
+            timeout = self.next_wakeup()
+            if instruments is not None:
+                planned = time.perf_counter_ns() + round(timeout * NS_PER_SECOND)
+            ready = self._screen.wait_for_input(
+                timeout, self._session.fds(), self._session.write_fds())
+            if instruments is not None:
+                lateness = time.perf_counter_ns() - planned
+                if lateness >= 0:
+                    instruments.record("loop_lateness", lateness)
+            keys = self.handle_keys()
+            if keys is not None:
+                return keys
+            self._session.poll(ready)
+            for notice in self._session.take_notices():
+                self._notice = notice
+            if self._daemon is not None and self._daemon.stopping:
+                return True
+
+            settled = self.handle_resize(time.monotonic())
+
+            if instruments is None:
+                self._engine.update()
+                self.handle_alarm()
+                if settled:
+                    self.update_statusline()
+                    self.update_sidebar()
+                    self.update_content()
+            else:
+                instruments.timed("engine_update", self._engine.update)
+                self.handle_alarm()
+                if settled:
+                    instruments.timed(
+                        "render_statusline", self.update_statusline)
+                    instruments.timed("render_sidebar", self.update_sidebar)
+                    instruments.timed("render_content", self.update_content)
+
+    def handle_keys(self):
+        """Handle all pending keystrokes
+        #
+        # Returns None to go on, False when the user wants to quit and True
+        # to shut the timer down as well
         """
         while True:
             c = self._screen.get_char("statusline")
+            if c == -1:
+                return None
+            self._notice = ""
             if c == ord('q'):
-                break
+                return False
+            elif c == ord('Q'):
+                self._session.run_command("shutdown")
+                return True
+            elif c in (ord('s'), ord('n'), ord('r')) and self._config.schedule:
+                self._notice = "The schedule runs the timers"
             elif c == ord('s'):
-                if self._engine.running:
-                    self._engine.stop_timer()
-                else:
-                    self._engine.start_timer()
+                self._session.run_command(
+                    "stop" if self._engine.running else "start")
             elif c == ord('n'):
-                self._engine.next_timer()
-                self._engine.reset_timer()
+                self._session.run_command("next")
             elif c == ord('r'):
-                self._engine.reset_timer()
+                self._session.run_command("reset")
             elif c == ord('h'):
-                self.show_help()
-
-            if self._screen.is_resized:
-                self.manage_windows()
-                self._screen.ack_resize()
-
-            self._engine.update()
-            self.handle_alarm()
-            self.update_statusline()
-            self.update_sidebar()
-            self.update_content()
-            time.sleep(0.2)
+                self.toggle_help()
+
+    def handle_event(self, event, engine):
+        """Engine listener: rebuild windows after a config reload"""
+        if event == "reload":
+            self.prepopulate_sidebar()
+            self.prepopulate_content()
+
+    def handle_resize(self, now):
+        """Lay windows out again once a burst of resizes has settled
+        #
+        # Dragging a terminal corner resizes it many times a second, so
+        # windows are laid out RESIZE_SETTLE seconds after the last resize
+        # only. Returns False while waiting, windows are not drawn then.
+        """
+        if self._screen.is_resized:
+            self._screen.ack_resize()
+            self._relayout_at = now + self.RESIZE_SETTLE
+        if self._relayout_at is None:
+            return True
+        if now < self._relayout_at:
+            return False
+        self._relayout_at = None
+        self.manage_windows()
+        return True
+
+    def next_wakeup(self):
+        """Seconds until the main loop has something to redraw
+        #
+        # The clock in content window changes on every wall clock second,
+        # the running timer on its own second boundaries and alarms repeat
+        # on their own schedule. Windows are laid out when resizes settle.
+        # A daemon running in process has its own things to do.
+        """
+        timeout = 1 - time.time() % 1
+        relayout = None
+        if self._relayout_at is not None:
+            relayout = max(0, self._relayout_at - time.monotonic())
+        daemon = None
+        if self._daemon is not None:
+            daemon = self._daemon.next_wakeup()
+        for deadline in (self._engine.time_to_next_tick(),
+                         self._alarms.next_deadline(), relayout, daemon):
+            if deadline is not None and deadline < timeout:
+                timeout = deadline
+        return timeout
 
     def update_statusline(self):
-        """Update statusline window"""
+        """Update statusline window
+        #
+        # The window is erased only when the status text changes
+        """
         if not self._screen.test_existence("statusline"):
             return
 
-        self._screen.erase_window("statusline")
         max_y, max_x = self._screen.get_max_yx("statusline")
         if self._engine.running:
-            color = self.get_color_id(self._engine.timer_name)
+            color = self.get_color_id(self._engine.timer_category)
             status = f'[ Running: {self._engine.timer_name} ]'
+        elif self._config.schedule:
+            color = 0
+            status = f'[ Waiting for {self._engine.timer_name} ]'
         else:
             color = 0
             status = "[ Stopped ]"
 
-        self._screen.set_background("statusline", " ", color)
+        if status != self._status:
+            self._status = status
+            self._screen.erase_window("statusline")
+            self._screen.set_background("statusline", " ", color)
         self._screen.add_centered_str("statusline", 0, status)
 
         if max_y >= 1:
@@ -73,7 +214,7 @@ class UserInterface:
             self._screen.draw_progress_bar(
                 "statusline", 1, 1, max_x-2, percent)
 
-        self._screen.refresh_window("statusline")
+        self._screen.stage_window("statusline")
 
     def update_content(self):
         """Update content window"""
@@ -81,46 +222,41 @@ class UserInterface:
             return
 
         max_y, max_x = self._screen.get_max_yx("content")
-        elapsed_delta = timedelta(seconds=round(self._engine.time_elapsed))
-        duration_delta = timedelta(seconds=self._engine.timer_duration)
-        total_delta = timedelta(seconds=round(self._engine.total_time_elapsed))
-        working_delta = timedelta(seconds=round(
-            self._engine.total_time_working))
-        short_delta = timedelta(seconds=round(
-            self._engine.total_time_s_breaks))
-        long_delta = timedelta(seconds=round(self._engine.total_time_l_breaks))
-        others_delta = timedelta(seconds=round(self._engine.total_time_others))
-
-        self._screen.clear_line("content", 1)
+        elapsed = self.format_duration(round(self._engine.time_elapsed))
+        duration = self.format_duration(round(self._engine.timer_duration))
+
         self._screen.add_str(
             "content",
             1, 
             2, 
-            f'{str(elapsed_delta)}/{str(duration_delta)} in {self._engine.timer_name}'
+            f'{elapsed}/{duration} in {self._engine.timer_name}'
         )
+        self._screen.add_str("content", 2, 2, self._notice)
 
-        self._screen.add_str("content", 4, 16, f'{self._engine.work_count}')
-        self._screen.add_str("content", 4, 20, f'{working_delta}')
-        self._screen.add_str("content", 5, 16, f'{self._engine.short_count}')
-        self._screen.add_str("content", 5, 20, f'{short_delta}')
-        self._screen.add_str("content", 6, 16, f'{self._engine.long_count}')
-        self._screen.add_str("content", 6, 20, f'{long_delta}')
-        self._screen.add_str("content", 7, 16, f'{self._engine.others_count}')
-        self._screen.add_str("content", 7, 20, f'{others_delta}')
-        self._screen.add_str("content", 8, 20, f'{str(total_delta)}')
+        labels = self.stat_labels()
+        count_x = max(16, max(len(label) for label in labels) + 4)
+        for group, label in enumerate(labels):
+            self._screen.add_str(
+                "content", 4+group, count_x, f'{self._engine.count(group)}')
+            self._screen.add_str(
+                "content", 4+group, count_x+4, self.format_duration(
+                    round(self._engine.total_time(group) / NS_PER_SECOND)))
+        self._screen.add_str(
+            "content", 4+len(labels), count_x+4, self.format_duration(
+                round(self._engine.total_time_elapsed)))
 
+        start_time = ""  # Cleared when a new day starts over
         if self._engine.started_at is not None:
-            start_time = time.strftime("%H:%M:%S", self._engine.started_at)
-            self._screen.add_str("content", 10, 25, f'{start_time}')
+            start_time = self.format_clock(self._engine.started_at)
+        self._screen.add_str("content", 6+len(labels), 25, start_time)
 
+        clock = self.format_clock(time.localtime(int(time.time())))
         if max_x > 12:
-            self._screen.add_str("content", 0, max_x-12,
-                                 f' {time.strftime("%H:%M:%S")} ')
+            self._screen.add_str("content", 0, max_x-12, f' {clock} ')
         else:
-            self._screen.add_str(
-                "content", 0, 0, f'{time.strftime("%H:%M:%S")}')
+            self._screen.add_str("content", 0, 0, clock)
 
-        self._screen.refresh_window("content")
+        self._screen.stage_window("content")
 
     def prepopulate_content(self):
         """Prepopulate content window with static content"""
@@ -131,31 +267,42 @@ class UserInterface:
         max_y, max_x = self._screen.get_max_yx("content")
 
         self._screen.add_str("content", 3, 2, 'Completed:')
-        self._screen.add_str("content", 4, 2, 'Work stints:')
-        self._screen.add_str("content", 5, 2, 'Short breaks:')
-        self._screen.add_str("content", 6, 2, 'Long breaks:')
-        self._screen.add_str("content", 7, 2, 'Other timers:')
-        self._screen.add_str("content", 8, 2, 'Total time spent:')
-        self._screen.add_str("content", 10, 2, f'First timer started at')
+        labels = self.stat_labels()
+        for group, label in enumerate(labels):
+            self._screen.add_str("content", 4+group, 2, label)
+        self._screen.add_str("content", 4+len(labels), 2, 'Total time spent:')
+        self._screen.add_str(
+            "content", 6+len(labels), 2, f'First timer started at')
         self._screen.add_str("content", max_y-2, 2,
                              f"Config: {self._config.selected_config}")
         self._screen.add_str("content", max_y-1, 2,
                              "(s)tart/(s)top, (h)elp, (q)uit")
 
-        self._screen.refresh_window("content")
+        self._screen.stage_window("content")
 
     def update_sidebar(self):
-        """Update sidebar window"""
+        """Update sidebar window
+        #
+        # Only the rows of the previous and the current timer are rewritten.
+        # When the current timer is outside the viewport, the sidebar is
+        # scrolled and the visible rows redrawn.
+        """
         if not self._screen.test_existence("sidebar"):
             return
 
-        for idx, timer in enumerate(self._config.timers):
-            if idx == self._engine.current_timer_id:
-                self._screen.add_str("sidebar", idx+4, 2, '>')
-            else:
-                self._screen.add_str("sidebar", idx+4, 2, ' ')
+        current = self._engine.current_timer_id
+        if current == self._marker_id:
+            return
+        top = self._sidebar_top
+        if not top <= current < top + self.sidebar_capacity():
+            self.scroll_sidebar(current)
+            self.draw_sidebar_rows()
+        elif self._marker_id is not None:
+            self.draw_sidebar_marker(self._marker_id, ' ')
+        self.draw_sidebar_marker(current, '>')
+        self._marker_id = current
 
-        self._screen.refresh_window("sidebar")
+        self._screen.stage_window("sidebar")
 
     def prepopulate_sidebar(self):
         """Prepopulate sidebar window with static content"""
@@ -168,87 +315,181 @@ class UserInterface:
         self._screen.add_str("sidebar", 2, 2, "Type (time):")
         self._screen.add_hline("sidebar", 3, "-")
 
-        for idx, timer in enumerate(self._config.timers):
-            color = self.get_color_id(timer["type"])
-            duration = timedelta(minutes=timer["duration"])
+        self.scroll_sidebar(self._engine.current_timer_id)
+        self.draw_sidebar_rows()
+        self._marker_id = None
+
+        self._screen.stage_window("sidebar")
 
+    def sidebar_capacity(self):
+        """Number of timer rows fitting in sidebar below the headers"""
+        max_y, max_x = self._screen.get_max_yx("sidebar")
+        return max(0, max_y - 5)
+
+    def scroll_sidebar(self, timer_id):
+        """Scroll sidebar so that timer is visible
+        #
+        # The timer is placed on the second row, showing the previous timer
+        # above it, unless the end of the list would leave rows empty.
+        """
+        capacity = self.sidebar_capacity()
+        last_top = max(0, len(self._config.timers) - capacity)
+        self._sidebar_top = max(0, min(timer_id - 1, last_top))
+
+    def draw_sidebar_rows(self):
+        """Draw timers inside sidebar viewport, without the marker"""
+        top = self._sidebar_top
+        timers = self._config.timers
+        for row in range(self.sidebar_capacity()):
+            idx = top + row
+            self._screen.add_str("sidebar", row+4, 2, ' ')
+            if idx >= len(timers):
+                self._screen.add_str("sidebar", row+4, 4, '')
+                continue
+            timer = timers[idx]
+            color = self.get_color_id(timer["category"])
+            duration = timedelta(minutes=timer["duration"])
+            label = f'{timer["type"]} ({duration})'
+            if self._config.schedule:
+                label = f'{ScheduleEngine.format_slot_start(timer)} {label}'
             self._screen.add_str(
                 "sidebar",
-                idx+4,
+                row+4,
                 4,
-                f'{timer["type"]} ({duration})',
+                label,
                 self._screen.color_pair(color)
             )
 
-        self._screen.refresh_window("sidebar")
+    def draw_sidebar_marker(self, timer_id, marker):
+        """Draw marker on the row of a timer, if the row is visible"""
+        row = timer_id - self._sidebar_top
+        if 0 <= row < self.sidebar_capacity():
+            self._screen.add_str("sidebar", row+4, 2, marker)
 
     def manage_windows(self):
-        """Create, remove and resize windows"""
+        """Create, remove and resize windows
+        #
+        # Windows keeping their geometry are left as they are, the terminal
+        # is repainted from what they have. Curses may have shrunk windows
+        # to fit the terminal already, so the geometry is compared to the
+        # previous layout and not to the windows.
+        """
         lines, cols = self._screen.screen_size()
-        content_width = cols
+        previous = dict(self._layout)
+        self._layout = self.layout(lines, cols)
+        changed = set()
+        for win, geometry in self._layout:
+            if geometry == previous.get(win):
+                continue
+            changed.add(win)
+            if geometry is None:
+                self._screen.remove_window(win)
+            else:
+                self._screen.resize_or_create_window(win, *geometry)
+                self._screen.move_window(win, geometry[2], geometry[3])
 
+        self._screen.set_nodelays()
+        if "statusline" in changed:
+            self._status = None
+        if "sidebar" in changed:
+            self.prepopulate_sidebar()
+        if "content" in changed:
+            self.prepopulate_content()
+        if self._help:
+            self.show_help()
+        self._screen.repaint()
+
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def layout(lines, cols):
+        """Window geometries for screen size
+        #
+        # Returns (window, (height, width, y, x)) pairs, None as geometry
+        # for windows not fitting on screen
+        """
+        content_width = cols
+        sidebar = None
         if cols >= 50:
             content_width = round(cols * 0.6)
-            sidebar_width = cols - content_width
-            self._screen.resize_or_create_window(
-                "sidebar", lines, sidebar_width, 0, content_width)
-            self._screen.move_window("sidebar", 0, content_width)
-        else:
-            self._screen.remove_window("sidebar")
+            sidebar = (lines, cols - content_width, 0, content_width)
 
         if lines >= 6:
-            self._screen.resize_or_create_window(
-                "content", lines-3, content_width, 3, 0)
-            self._screen.resize_or_create_window(
-                "statusline", 3, content_width, 0, 0)
-        else:
-            self._screen.remove_window("content")
-            self._screen.resize_or_create_window(
-                "statusline", 1, content_width, 0, 0)
-
-        self._screen.set_nodelays()
-        self.prepopulate_sidebar()
-        self.prepopulate_content()
-
-    def get_color_id(self, type):
-        """Get the id number of color for timer type"""
-        if type == "work":
-            return 2
-        elif type == "short break":
-            return 3
-        elif type == "long break":
-            return 4
+            content = (lines-3, content_width, 3, 0)
+            statusline = (3, content_width, 0, 0)
         else:
-            return 5
+            content = None
+            statusline = (1, content_width, 0, 0)
+        return (("sidebar", sidebar), ("content", content),
+                ("statusline", statusline))
+
+    def get_color_id(self, category):
+        """Get the id number of color for timer category"""
+        return self._config.categories[category]["color"]
+
+    def stat_labels(self):
+        """Labels of stat groups by group id"""
+        return [
+            self.STAT_LABELS.get(name, f'{name.capitalize()}:')
+            for name in self._engine.group_names
+        ]
+
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def format_duration(seconds):
+        """Format whole seconds as H:MM:SS, cached per second"""
+        return str(timedelta(seconds=seconds))
+
+    @staticmethod
+    @lru_cache(maxsize=8)
+    def format_clock(struct_time):
+        """Format local time as HH:MM:SS, cached per second"""
+        return time.strftime("%H:%M:%S", struct_time)
 
     def handle_alarm(self):
-        """Handle timer alarms"""
+        """Handle timer alarms on this terminal
+        #
+        # Several transitions at once (e.g. after suspend) sound one alarm.
+        # Notifications and sounds are left to the daemon, which runs them
+        # once however many terminals are attached.
+        """
         if self._engine.alarm_triggered:
-            self._screen.alarm()
+            if self._engine.transitions > 1:
+                self._notice = f'Missed {self._engine.transitions} timer transitions'
+            self._alarms.trigger()
+            if self._instruments is not None:
+                self._instruments.record(
+                    "alarm_latency", max(0, self._engine.lateness_ns))
             self._engine.ack_alarm()
+        self._alarms.run_due()
 
-    def show_help(self):
-        """Show help inside content window"""
-        self._screen.erase_window("content")
-        self._screen.add_str("content", 1, 2, "Potato Timer Help")
-        self._screen.add_str("content", 3, 2, "s: Start and stop timers")
-        self._screen.add_str("content", 4, 2, "n: Next timer (starts from 0)")
-        self._screen.add_str("content", 5, 2, "r: Reset current timer")
-        self._screen.add_str("content", 6, 2, "h: Show/hide help")
-        self._screen.add_str("content", 7, 2, "q: Quit")
-
-        self._screen.add_str(
-            "content", 9, 2, "For more help and config examples please consult:")
-        self._screen.add_str(
-            "content", 10, 2, "github.com/mtijas/potato-timer")
-        self._screen.add_str("content", 12, 2, "(c) Markus Ijäs")
-
-        self._screen.refresh_window("content")
+    def toggle_help(self):
+        """Show or hide help
+        #
+        # Help is an overlay, the timer goes on and windows below it are
+        # kept up to date. Hiding it repaints only what it covered.
+        """
+        self._help = not self._help
+        if self._help:
+            self.show_help()
+        else:
+            self._screen.remove_window("help")
 
-        while True:
-            c = self._screen.get_char("content")
-            if c == ord('h'):
-                break
-            time.sleep(0.5)
-        self._screen.erase_window("content")
-        self.prepopulate_content()
+    def show_help(self):
+        """Draw help in an overlay window centered on screen
+        #
+        # The window is created anew, a curses window can't be moved where
+        # it wouldn't fit with its old size
+        """
+        self._screen.remove_window("help")
+        lines, cols = self._screen.screen_size()
+        height = min(len(self.HELP) + 2, lines)
+        width = min(max(len(line) for line in self.HELP) + 4, cols)
+        start_y = (lines - height) // 2
+        start_x = (cols - width) // 2
+        self._screen.resize_or_create_window(
+            "help", height, width, start_y, start_x)
+        self._screen.set_overlay("help")
+        self._screen.erase_window("help")
+        for row, line in enumerate(self.HELP):
+            self._screen.add_str("help", row+1, 2, line)
+        self._screen.stage_window("help")
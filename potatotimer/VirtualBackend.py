@@ -0,0 +1,260 @@
+import select
+
+
+class VirtualWindow:
+    """In-memory stand-in for a curses window"""
+
+    def __init__(self, backend, height, width, start_y, start_x):
+        self._backend = backend
+        self._height = height
+        self._width = width
+        self._y = start_y
+        self._x = start_x
+        self._background = 0
+        self._cells = self._blank_cells(height, width)
+        self._touched = set(range(height))  # Rows changed since refresh
+
+    def getmaxyx(self):
+        return self._height, self._width
+
+    def getbegyx(self):
+        return self._y, self._x
+
+    def resize(self, height, width):
+        cells = self._blank_cells(height, width)
+        for y in range(min(height, self._height)):
+            cells[y][:min(width, self._width)] = self._cells[y][:width]
+        self._height = height
+        self._width = width
+        self._cells = cells
+        self._touched.clear()
+        self.touchwin()
+
+    def mvwin(self, y, x):
+        self._y = y
+        self._x = x
+        self.touchwin()
+
+    def bkgd(self, chr, attr=0):
+        self._background = attr
+        self.touchwin()
+
+    def erase(self):
+        self._cells = self._blank_cells(self._height, self._width)
+        self.touchwin()
+
+    def border(self):
+        if self._height < 2 or self._width < 2:
+            return
+        for x in range(self._width):
+            self._put(0, x, "-")
+            self._put(self._height - 1, x, "-")
+        for y in range(self._height):
+            self._put(y, 0, "|")
+            self._put(y, self._width - 1, "|")
+        for y, x in ((0, 0), (0, self._width - 1), (self._height - 1, 0),
+                     (self._height - 1, self._width - 1)):
+            self._put(y, x, "+")
+
+    def addnstr(self, y, x, text, n, attr=0):
+        for i, c in enumerate(text[:n]):
+            self._put(y, x + i, c, attr)
+
+    def hline(self, y, x, chr, n):
+        for i in range(n):
+            self._put(y, x + i, chr)
+
+    def nodelay(self, flag):
+        pass
+
+    def keypad(self, flag):
+        pass
+
+    def getch(self):
+        """Pop a key pressed on the backend, refreshing like curses does"""
+        if self._touched:
+            self.refresh()
+        return self._backend.pop_key()
+
+    def refresh(self):
+        self.noutrefresh()
+        self._backend.update()
+
+    def noutrefresh(self):
+        self._backend.stage(self)
+        self._touched.clear()
+
+    def touchwin(self):
+        self._touched.update(range(self._height))
+
+    def touchline(self, start, count):
+        self._touched.update(range(start, min(start + count, self._height)))
+
+    def row(self, y):
+        """Text of a window row, for inspecting what was drawn"""
+        return "".join(c for c, a in self._cells[y])
+
+    def _put(self, y, x, c, attr=0):
+        """Set a cell, silently clipping outside the window"""
+        if 0 <= y < self._height and 0 <= x < self._width:
+            self._cells[y][x] = (c, attr)
+            self._touched.add(y)
+
+    def _blank_cells(self, height, width):
+        return [[(" ", 0)] * width for y in range(height)]
+
+
+class VirtualBackend:
+    """Headless backend for Screen rendering into an in-memory framebuffer
+    #
+    # Records the characters and attributes of every cell and estimates the
+    # bytes a terminal would receive for each refresh: the characters of
+    # changed cells, plus cursor movement and attribute switches. Useful
+    # for running UserInterface under tests and benchmarks without a TTY.
+    """
+
+    KEY_RESIZE = 410
+    CURSOR_MOVE_BYTES = 6  # ESC [ y ; x H
+    ATTRIBUTE_BYTES = 5  # ESC [ n ; m m
+
+    def __init__(self, lines=24, cols=80, colors=True):
+        self._lines = lines
+        self._cols = cols
+        self._colors = colors
+        self._keys = []
+        self._cells = self._blank_screen()  # What the terminal shows
+        self._staged = self._blank_screen()  # Virtual screen for next update
+        self._staged_rows = set()  # Rows staged since last update
+        self.bytes_emitted = 0
+        self.cells_written = 0
+        self.refreshes = 0
+        self.writes = 0
+        self.beeps = 0
+        self.flashes = 0
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def has_colors(self):
+        return self._colors
+
+    def start_colors(self, prefer_terminal_colors):
+        pass
+
+    def new_window(self, height, width, start_y, start_x):
+        return VirtualWindow(self, height, width, start_y, start_x)
+
+    def color_pair(self, i):
+        return i << 8
+
+    def screen_size(self):
+        return self._lines, self._cols
+
+    def beep(self):
+        self.beeps += 1
+
+    def flash(self):
+        self.flashes += 1
+
+    def wait_for_input(self, timeout, fds=(), write_fds=()):
+        """Return at once, unless there are real file descriptors to wait"""
+        if self._keys or not (fds or write_fds):
+            return []
+        ready, _, _ = select.select(list(fds), list(write_fds), [], timeout)
+        return ready
+
+    def consume_resize(self):
+        return False
+
+    def press(self, key):
+        """Queue a keystroke, given as a character or key code"""
+        self._keys.append(ord(key) if isinstance(key, str) else key)
+
+    def resize(self, lines, cols):
+        """Change virtual terminal size and queue KEY_RESIZE
+        #
+        # Like curses, the virtual screen keeps what fits and the next
+        # update repaints the whole terminal
+        """
+        staged = self._staged
+        self._lines = lines
+        self._cols = cols
+        self._cells = self._blank_screen()
+        self._staged = self._blank_screen()
+        for y, row in enumerate(staged[:lines]):
+            self._staged[y][:min(cols, len(row))] = row[:cols]
+        self._staged_rows = set(range(lines))
+        self.press(self.KEY_RESIZE)
+
+    def pop_key(self):
+        if self._keys:
+            return self._keys.pop(0)
+        return -1
+
+    def stage(self, window):
+        """Copy touched rows of window onto the virtual screen"""
+        self.refreshes += 1
+        for wy in window._touched:
+            y = window._y + wy
+            if not 0 <= y < self._lines:
+                continue
+            staged_row = self._staged[y]
+            background = window._background
+            for wx, cell in enumerate(window._cells[wy]):
+                x = window._x + wx
+                if not 0 <= x < self._cols:
+                    continue
+                if background:
+                    cell = (cell[0], cell[1] | background)
+                if staged_row[x] != cell:
+                    staged_row[x] = cell
+            self._staged_rows.add(y)
+
+    def update(self):
+        """Send staged changes to the terminal, counting emitted bytes
+        #
+        # Output of one update counts as one write, none when nothing
+        # changed on screen.
+        """
+        emitted = 0
+        cursor = None
+        attr = None
+        for y in sorted(self._staged_rows):
+            screen_row = self._cells[y]
+            for x, cell in enumerate(self._staged[y]):
+                if screen_row[x] == cell:
+                    continue
+                screen_row[x] = cell
+                self.cells_written += 1
+                if cursor != (y, x):
+                    emitted += self.CURSOR_MOVE_BYTES
+                if attr != cell[1]:
+                    emitted += self.ATTRIBUTE_BYTES
+                    attr = cell[1]
+                emitted += len(cell[0].encode())
+                cursor = (y, x + 1)
+        self._staged_rows.clear()
+        if emitted:
+            self.bytes_emitted += emitted
+            self.writes += 1
+
+    def output_counters(self):
+        """Terminal writes and bytes emitted"""
+        return {"writes": self.writes, "bytes": self.bytes_emitted}
+
+    def reset_counters(self):
+        """Zero emitted bytes, written cells, refreshes and writes counters"""
+        self.bytes_emitted = 0
+        self.cells_written = 0
+        self.refreshes = 0
+        self.writes = 0
+
+    def screen_text(self):
+        """Text currently on the virtual terminal, one string per line"""
+        return ["".join(c for c, a in row) for row in self._cells]
+
+    def _blank_screen(self):
+        return [[(" ", 0)] * self._cols for y in range(self._lines)]
@@ -1,4 +1,65 @@
-from .Config import Config
-from .Screen import Screen
-from .TimerEngine import TimerEngine
-from .UserInterface import UserInterface
\ No newline at end of file
+"""Potato Timer
+#
+# Classes are imported lazily on first access, so that starting the
+# program or a helper mode does not pay for modules it never uses
+# (curses, yaml, subprocess...).
+"""
+
+import importlib
+import sys
+
+_modules = {
+    "AlarmScheduler": "AlarmScheduler",
+    "Clock": "Clock",
+    "VirtualClock": "Clock",
+    "Config": "Config",
+    "ConfigError": "Config",
+    "ConfigWatcher": "ConfigWatcher",
+    "ControlServer": "ControlServer",
+    "CursesBackend": "CursesBackend",
+    "Daemon": "Daemon",
+    "Exporter": "Exporter",
+    "Histogram": "Instruments",
+    "History": "History",
+    "Instruments": "Instruments",
+    "Journal": "Journal",
+    "MetricsExporter": "MetricsExporter",
+    "RemoteEngine": "RemoteEngine",
+    "ScheduleEngine": "ScheduleEngine",
+    "Screen": "Screen",
+    "Simulation": "Simulation",
+    "StatusSnapshot": "StatusSnapshot",
+    "TimerEngine": "TimerEngine",
+    "TimerSequence": "TimerSequence",
+    "UserInterface": "UserInterface",
+    "VirtualBackend": "VirtualBackend",
+    "VirtualWindow": "VirtualBackend",
+}
+
+__all__ = list(_modules)
+
+
+def __getattr__(name):
+    if name not in _modules:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    importlib.import_module(f".{_modules[name]}", __name__)
+    _bind_classes()
+    return globals()[name]
+
+
+def _bind_classes():
+    """Bind the classes of every submodule imported so far
+    #
+    # Importing a submodule binds it on the package under the same name as
+    # its class, hiding the class this package exports. Submodules import
+    # each other, so all of them are checked, not just the one asked for.
+    """
+    namespace = globals()
+    for name, module_name in _modules.items():
+        module = sys.modules.get(f"{__name__}.{module_name}")
+        if module is not None:
+            namespace[name] = getattr(module, name)
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,99 @@
+"""Helpers shared by the tests
+#
+# Configs are written to temporary files and read without the config
+# cache, so tests never touch the user's cache or config directories.
+"""
+
+import os
+import tempfile
+
+from potatotimer import (
+    Config, Daemon, Screen, TimerEngine, UserInterface, VirtualBackend,
+    VirtualClock,
+)
+
+TIMERS = """\
+timers:
+  - type: "work"
+    duration: 1
+  - type: "short break"
+    duration: 0.5
+  - type: "long break"
+    duration: 2
+"""
+
+IN_PROCESS = """\
+journal: False
+history: False
+status_file: False
+control_socket: False
+"""  # Daemon runs inside the user interface and keeps no files
+
+
+def write_config(directory, text=TIMERS, name="config.yml"):
+    """Write config text into directory, returns the path"""
+    path = os.path.join(directory, name)
+    with open(path, "w") as stream:
+        stream.write(text)
+    return path
+
+
+def load_config(text=TIMERS):
+    """Config read from text, not cached"""
+    handle, path = tempfile.mkstemp(suffix=".yml", prefix="potatotimer-test-")
+    with os.fdopen(handle, "w") as stream:
+        stream.write(text)
+    try:
+        return Config(path, use_cache=False)
+    finally:
+        os.unlink(path)
+
+
+class Headless:
+    """User interface on a virtual clock and terminal, driven by tests
+    #
+    # Runs the steps of UserInterface.main_loop without blocking, the way
+    # benchmarks drive it. Keystrokes need a daemon to run their commands,
+    # give a config with IN_PROCESS settings for one.
+    """
+
+    def __init__(self, config, lines=24, cols=80, clock=None, daemon=False):
+        self.config = config
+        self.clock = clock if clock is not None else VirtualClock()
+        self.engine = TimerEngine(config, self.clock)
+        self.backend = VirtualBackend(lines, cols)
+        self.screen = Screen(config, self.backend)
+        self.daemon = None
+        if daemon:
+            self.daemon = Daemon(config, self.engine)
+            self.daemon.open()
+        self.ui = UserInterface(config, self.engine, self.screen, self.daemon)
+        self.engine.add_listener(self.ui.handle_event)
+        self.screen.start()
+        self.ui.manage_windows()
+
+    def frame(self, now=0):
+        """Run one main loop round, returns what handle_keys returned"""
+        self.screen.wait_for_input(0)
+        keys = self.ui.handle_keys()
+        if keys is not None:
+            return keys
+        if self.daemon is not None:
+            self.daemon.poll([])
+        settled = self.ui.handle_resize(now)
+        self.engine.update()
+        self.ui.handle_alarm()
+        if settled:
+            self.ui.update_statusline()
+            self.ui.update_sidebar()
+            self.ui.update_content()
+        self.screen.flush_frame()
+        return None
+
+    def close(self):
+        if self.daemon is not None:
+            self.daemon.close()
+
+    def text(self):
+        """Text on the virtual terminal as one string"""
+        return "\n".join(self.backend.screen_text())
@@ -0,0 +1,101 @@
+"""Tests of alarm repeats scheduled as timestamps"""
+
+import threading
+import unittest
+from unittest import mock
+
+from potatotimer import AlarmScheduler, Screen, VirtualBackend
+
+from support import TIMERS, load_config
+
+ALARMS = """\
+alarm_type: ["beep", "flash", "notify"]
+alarm_repeat: 3
+notify_command: "notify-send --urgency=low"
+""" + TIMERS
+
+
+class AlarmSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.config = load_config(ALARMS)
+        self.backend = VirtualBackend()
+        self.screen = Screen(self.config, self.backend)
+        patcher = mock.patch("time.monotonic", return_value=100.0)
+        self.monotonic = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def terminal(self):
+        return AlarmScheduler(
+            self.config, self.screen, AlarmScheduler.TERMINAL_ALARMS)
+
+    def test_repeats_are_scheduled(self):
+        alarms = self.terminal()
+        self.assertIsNone(alarms.next_deadline())
+        alarms.trigger("Work")
+        self.assertTrue(alarms.active)
+        self.assertEqual(alarms.next_deadline(), 0)
+        alarms.run_due()
+        self.assertEqual((self.backend.beeps, self.backend.flashes), (1, 1))
+        self.assertEqual(alarms.next_deadline(), AlarmScheduler.REPEAT_INTERVAL)
+
+        self.monotonic.return_value = 100.2
+        alarms.run_due()
+        self.assertEqual(self.backend.beeps, 1)
+        self.assertAlmostEqual(alarms.next_deadline(), 0.3)
+
+        self.monotonic.return_value = 105.0
+        alarms.run_due()
+        self.assertEqual((self.backend.beeps, self.backend.flashes), (3, 3))
+        self.assertFalse(alarms.active)
+        self.assertIsNone(alarms.next_deadline())
+
+    def test_new_alarm_replaces_repeats(self):
+        alarms = self.terminal()
+        alarms.trigger()
+        alarms.run_due()
+        self.monotonic.return_value = 100.7
+        alarms.trigger()
+        alarms.run_due()
+        self.monotonic.return_value = 110.0
+        alarms.run_due()
+        self.assertEqual(self.backend.beeps, 1 + 3)
+
+    def test_only_own_alarm_types_are_sounded(self):
+        external = AlarmScheduler(
+            self.config, alarm_types=AlarmScheduler.EXTERNAL_ALARMS)
+        with mock.patch.object(external, "run_command") as run_command:
+            external.trigger("Short break")
+            external.run_due()
+        run_command.assert_called_once_with(
+            ["notify-send", "--urgency=low", "Potato Timer", "Short break"])
+        self.assertEqual(self.backend.beeps, 0)
+
+    def test_nothing_scheduled_without_own_types(self):
+        alarms = AlarmScheduler(
+            load_config(), alarm_types=AlarmScheduler.EXTERNAL_ALARMS)
+        alarms.trigger()
+        self.assertFalse(alarms.active)
+
+    def test_commands_are_dropped_when_too_many_pending(self):
+        alarms = AlarmScheduler(self.config)
+        release = threading.Event()
+        started = []
+
+        def run(command, **kwargs):
+            started.append(command)
+            release.wait(5)
+
+        with mock.patch("subprocess.run", side_effect=run):
+            for i in range(AlarmScheduler.MAX_PENDING + 3):
+                alarms.run_command(["true", str(i)])
+            self.assertEqual(len(alarms._workers), AlarmScheduler.MAX_WORKERS)
+            release.set()
+            alarms.shutdown()
+            for worker in threading.enumerate():
+                if worker.name == "potatotimer-alarm":
+                    worker.join(5)
+        self.assertEqual(len(started), AlarmScheduler.MAX_PENDING)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+"""Tests of comparing benchmark results against the baseline"""
+
+import importlib.util
+import os
+import unittest
+
+RUN = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "benchmarks", "run.py")
+
+
+def load_run():
+    spec = importlib.util.spec_from_file_location("benchmark_run", RUN)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class CompareTest(unittest.TestCase):
+    def setUp(self):
+        self.run = load_run()
+        self.baseline = {"frame": {
+            "time_per_op_us": 100.0, "calibration_us": 20.0,
+            "alloc_peak_kib": 50.0, "writes_per_op": 0.0,
+        }}
+
+    def compare(self, **result):
+        figures = dict(self.baseline["frame"], **result)
+        return self.run.compare({"frame": figures}, self.baseline, 0.25)
+
+    def test_within_threshold(self):
+        self.assertEqual(self.compare(time_per_op_us=120.0), [])
+
+    def test_slower_machine_is_not_a_regression(self):
+        """Twice the time on a machine twice as slow"""
+        self.assertEqual(
+            self.compare(time_per_op_us=200.0, calibration_us=40.0), [])
+
+    def test_slower_on_same_machine(self):
+        regressions = self.compare(time_per_op_us=200.0, calibration_us=40.0,
+                                   alloc_peak_kib=70.0)
+        self.assertEqual(regressions, ["frame: alloc_peak_kib 50.0 -> 70.0 (+40%)"])
+        regressions = self.compare(time_per_op_us=150.0)
+        self.assertEqual(regressions, ["frame: time_per_op_us 100.0 -> 150.0 (+50%)"])
+
+    def test_zero_baseline_is_compared(self):
+        self.assertEqual(self.compare(writes_per_op=2.0),
+                         ["frame: writes_per_op 0 -> 2.0"])
+
+    def test_scenarios_missing_from_baseline_are_skipped(self):
+        results = {"new": {"time_per_op_us": 1.0, "calibration_us": 1.0}}
+        self.assertEqual(self.run.compare(results, self.baseline, 0.25), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+"""Tests of timer categories, their colors and stat groups"""
+
+import unittest
+
+from potatotimer import Config, TimerEngine, VirtualClock
+from potatotimer.TimerEngine import NS_PER_MINUTE
+
+from support import Headless, load_config
+
+CATEGORIES = """\
+categories:
+  reading:
+    color: magenta
+    group: study
+  coding:
+    color: nonsense
+    group: study
+  "short break":
+    color: white
+timers:
+  - type: "work"
+    duration: 1
+  - type: "reading"
+    duration: 1
+  - type: "short break"
+    duration: 1
+  - type: "coding"
+    duration: 1
+  - type: "lunch"
+    duration: 1
+  - type: "reading"
+    duration: 1
+"""
+
+
+class CategoriesTest(unittest.TestCase):
+    def setUp(self):
+        self.config = load_config(CATEGORIES)
+
+    def category(self, name):
+        return next(category for category in self.config.categories
+                    if category["name"] == name)
+
+    def test_groups_start_with_builtin_ones(self):
+        self.assertEqual(self.config.groups,
+                         ["work", "short break", "long break", "study", "lunch"])
+
+    def test_types_are_interned_once(self):
+        ids = [timer["category"] for timer in self.config.timers]
+        self.assertEqual(ids[1], ids[5])
+        self.assertEqual(len(self.config.categories), 5)
+        for timer in self.config.timers:
+            self.assertEqual(
+                self.config.categories[timer["category"]]["name"], timer["type"])
+
+    def test_colors_and_groups(self):
+        colors = Config.COLORS
+        groups = self.config.groups
+        expected = {
+            "work": ("red", "work"),
+            "reading": ("magenta", "study"),
+            "short break": ("white", "short break"),
+            "coding": (Config.DEFAULT_COLOR, "study"),
+            "lunch": (Config.DEFAULT_COLOR, "lunch"),
+        }
+        for name, (color, group) in expected.items():
+            with self.subTest(name=name):
+                self.assertEqual(self.category(name)["color"], colors[color])
+                self.assertEqual(self.category(name)["group"], groups.index(group))
+
+    def test_counts_and_totals_per_group(self):
+        clock = VirtualClock()
+        engine = TimerEngine(self.config, clock)
+        engine.start_timer()
+        clock.advance(6 * NS_PER_MINUTE + NS_PER_MINUTE // 2)
+        engine.update()
+        groups = self.config.groups
+        self.assertEqual(
+            [engine.count(groups.index(name)) for name in groups],
+            [1, 1, 0, 3, 1])
+        self.assertEqual(engine.total_time(groups.index("study")),
+                         3 * NS_PER_MINUTE)
+        self.assertEqual(engine.total_time(groups.index("work")),
+                         NS_PER_MINUTE * 3 // 2)
+        self.assertEqual(engine.work_count, 1)
+        self.assertEqual(engine.others_count, 4)
+
+    def test_groups_are_shown(self):
+        headless = Headless(self.config)
+        headless.frame()
+        text = headless.text()
+        for label in ("Work stints:", "Short breaks:", "Long breaks:",
+                      "Study:", "Lunch:"):
+            self.assertIn(label, text)
+
+
+if __name__ == "__main__":
+    unittest.main()
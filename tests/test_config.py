@@ -0,0 +1,96 @@
+"""Tests of reloading the config file while the timer runs"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from potatotimer import Config, ConfigError, ConfigWatcher, TimerEngine
+from potatotimer import VirtualClock
+from potatotimer.TimerEngine import NS_PER_MINUTE
+
+from support import TIMERS, write_config
+
+CATEGORIES = """\
+categories:
+  "short break":
+    group: "work"
+""" + TIMERS
+
+
+class ReloadTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="potatotimer-test-")
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = write_config(self.directory, CATEGORIES)
+        self.config = Config(self.path, use_cache=False)
+
+    def rewrite(self, text):
+        write_config(self.directory, text)
+
+    def test_changed_settings_are_listed(self):
+        self.rewrite("alarm_repeat: 5\n" + CATEGORIES)
+        self.assertEqual(self.config.reload(), ["alarm_repeat"])
+        self.assertEqual(self.config.alarm_repeat, 5)
+        self.assertEqual(self.config.reload(), [])
+
+    def test_malformed_config_keeps_settings(self):
+        before = self.config.settings()
+        timers = list(self.config.timers)
+        for text in ("timers: [\n", "- just\n- a list\n",
+                     "timers:\n  - type: work\n    duration: [1]\n"):
+            with self.subTest(text=text):
+                self.rewrite(text)
+                with self.assertRaises(ConfigError):
+                    self.config.reload()
+                self.assertEqual(self.config.settings(), before)
+                self.assertEqual(list(self.config.timers), timers)
+        self.assertEqual(before["declared_categories"],
+                         {"short break": {"group": "work"}})
+
+    def test_engine_keeps_state_over_reload(self):
+        clock = VirtualClock()
+        engine = TimerEngine(self.config, clock)
+        engine.start_timer()
+        clock.advance(NS_PER_MINUTE * 5 // 4)
+        engine.update()
+        self.rewrite(TIMERS.replace("duration: 0.5", "duration: 3"))
+        self.assertIn("timers", self.config.reload())
+        engine.reload_timers()
+        self.assertEqual(engine.current_timer_id, 1)
+        self.assertEqual(engine.time_elapsed_ns, NS_PER_MINUTE // 4)
+        self.assertEqual(engine.timer_duration_ns, 3 * NS_PER_MINUTE)
+        self.assertEqual(engine.count(TimerEngine.WORK), 1)
+        """Time so far stays in work, from now on short breaks are apart"""
+        clock.advance(NS_PER_MINUTE)
+        engine.update()
+        self.assertEqual(engine.total_time(TimerEngine.WORK),
+                         NS_PER_MINUTE * 5 // 4)
+        self.assertEqual(engine.total_time(TimerEngine.SHORT_BREAK),
+                         NS_PER_MINUTE)
+
+
+class ConfigWatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="potatotimer-test-")
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = write_config(self.directory)
+        self.watcher = ConfigWatcher(self.path)
+        self.addCleanup(self.watcher.close)
+
+    def test_write_and_replace_are_changes(self):
+        self.assertFalse(self.watcher.changed())
+        write_config(self.directory, TIMERS + "\n")
+        self.assertTrue(self.watcher.changed())
+        self.assertFalse(self.watcher.changed())
+        temp = write_config(self.directory, TIMERS + "\n\n", "config.yml.tmp")
+        os.replace(temp, self.path)
+        self.assertTrue(self.watcher.changed())
+
+    def test_other_files_are_not_changes(self):
+        write_config(self.directory, "", "other.yml")
+        self.assertFalse(self.watcher.changed())
+
+
+if __name__ == "__main__":
+    unittest.main()
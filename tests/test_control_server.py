@@ -0,0 +1,161 @@
+"""Tests of the line-delimited JSON control protocol"""
+
+import json
+import os
+import select
+import shutil
+import socket
+import tempfile
+import unittest
+
+from potatotimer import ControlServer
+
+
+class ControlServerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="potatotimer-test-")
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.commands = []
+        self.server = ControlServer(
+            self.handle, os.path.join(self.directory, "control.sock"))
+        self.server.start()
+        self.addCleanup(self.server.close)
+
+    def handle(self, command):
+        self.commands.append(command)
+        return {"ok": True, "command": command}
+
+    def connect(self):
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.settimeout(2)
+        client.connect(self.server.path)
+        self.addCleanup(client.close)
+        self.serve()
+        return client
+
+    def serve(self):
+        """Run one main loop step on what is ready"""
+        ready, _, _ = select.select(
+            self.server.fds(), self.server.write_fds(), [], 0.1)
+        self.server.poll(ready)
+
+    def request(self, client, data):
+        """Send raw request bytes, get the response lines"""
+        client.sendall(data)
+        self.serve()
+        return self.read_lines(client)
+
+    @staticmethod
+    def read_lines(client):
+        data = b""
+        while not data.endswith(b"\n"):
+            chunk = client.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+        return [json.loads(line) for line in data.splitlines()]
+
+    def test_commands_are_run(self):
+        client = self.connect()
+        self.assertEqual(self.request(client, b'{"command": "start"}\n'),
+                         [{"ok": True, "command": "start"}])
+        self.assertEqual(self.commands, ["start"])
+
+    def test_id_is_echoed(self):
+        client = self.connect()
+        responses = self.request(
+            client, b'{"command": "status", "id": 7}\n'
+                    b'{"command": "bogus", "id": "x"}\n\n'
+                    b'{"command": "stop"}\n')
+        self.assertEqual(responses, [
+            {"ok": True, "command": "status", "id": 7},
+            {"ok": False, "error": "unknown command: bogus", "id": "x"},
+            {"ok": True, "command": "stop"},
+        ])
+
+    def test_malformed_requests(self):
+        client = self.connect()
+        cases = [
+            (b"{not json\n", "invalid JSON"),
+            (b'["status"]\n', "request is not an object"),
+            (b'{"id": 1}\n', "unknown command: None"),
+            (b'{"command": "format disk"}\n', "unknown command: format disk"),
+        ]
+        for line, error in cases:
+            with self.subTest(line=line):
+                response, = self.request(client, line)
+                self.assertEqual(response["error"], error)
+                self.assertFalse(response["ok"])
+        self.assertEqual(self.commands, [])
+        """The connection stays usable"""
+        self.assertTrue(self.request(client, b'{"command": "next"}\n')[0]["ok"])
+
+    def test_request_split_over_reads(self):
+        client = self.connect()
+        client.sendall(b'{"command": ')
+        self.serve()
+        self.assertEqual(self.commands, [])
+        self.assertEqual(self.request(client, b'"reset"}\n'),
+                         [{"ok": True, "command": "reset"}])
+
+    def test_oversize_line_disconnects(self):
+        client = self.connect()
+        client.sendall(b"x" * (ControlServer.MAX_LINE + 1))
+        self.serve()
+        self.assertEqual(len(self.server.fds()), 2)
+        self.serve()
+        self.assertEqual(self.read_lines(client),
+                         [{"ok": False, "error": "request too long"}])
+        self.assertEqual(client.recv(1), b"")
+        self.assertEqual(len(self.server.fds()), 1)
+        self.assertEqual(self.commands, [])
+
+    def test_subscribers_get_published_messages(self):
+        subscriber = self.connect()
+        other = self.connect()
+        self.assertEqual(self.request(subscriber, b'{"command": "subscribe"}\n'),
+                         [{"ok": True, "command": "status"}])
+        self.server.publish({"event": "start"})
+        self.assertEqual(self.read_lines(subscriber), [{"event": "start"}])
+        other.setblocking(False)
+        with self.assertRaises(BlockingIOError):
+            other.recv(1)
+
+    def test_queued_output_is_flushed_when_writable(self):
+        """Output beyond the socket buffer waits in the write set"""
+        client = self.connect()
+        self.request(client, b'{"command": "subscribe"}\n')
+        connection, = self.server._connections.values()
+        connection.socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+        client.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        message = {"event": "tick", "padding": "." * 1000}
+        for i in range(20):
+            self.server.publish(message)
+        self.assertEqual(self.server.write_fds(), [connection.fileno()])
+        self.assertEqual(self.server.fds()[1:], [connection.fileno()])
+        data = b""
+        expected = 20 * len(json.dumps(message).encode() + b"\n")
+        while len(data) < expected:
+            data += client.recv(65536)
+            self.serve()
+        self.assertEqual(self.server.write_fds(), [])
+        self.assertEqual(
+            [json.loads(line) for line in data.splitlines()], [message] * 20)
+
+    def test_socket_in_use_is_not_taken_over(self):
+        other = ControlServer(self.handle, self.server.path)
+        with self.assertRaises(OSError):
+            other.start()
+
+    def test_stale_socket_is_replaced(self):
+        self.server.close()
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(self.server.path)
+        stale.close()
+        self.server.start()
+        client = self.connect()
+        self.assertTrue(self.request(client, b'{"command": "status"}\n')[0]["ok"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+"""Tests of the daemon serving the engine inside the user interface"""
+
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from potatotimer import Config, Daemon, TimerEngine, VirtualClock
+from potatotimer.TimerEngine import NS_PER_MINUTE
+
+from support import IN_PROCESS, TIMERS, write_config
+
+
+class DaemonTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="potatotimer-test-")
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = write_config(self.directory, IN_PROCESS + TIMERS)
+        self.config = Config(self.path, use_cache=False)
+        self.clock = VirtualClock()
+        self.engine = TimerEngine(self.config, self.clock)
+        self.events = []
+        self.engine.add_listener(lambda event, engine: self.events.append(event))
+        self.daemon = Daemon(self.config, self.engine)
+        self.daemon.open()
+        self.addCleanup(self.daemon.close)
+
+    def test_commands(self):
+        response = self.daemon.run_command("start")
+        self.assertTrue(response["ok"])
+        self.assertTrue(response["status"]["running"])
+        self.clock.advance(NS_PER_MINUTE // 2)
+        status = self.daemon.run_command("next")["status"]
+        self.assertEqual(status["timer"], "short break")
+        self.assertEqual(status["elapsed"], 0)
+        self.assertEqual(status["duration"], 30)
+        self.assertEqual(status["state"]["duration_ns"], NS_PER_MINUTE // 2)
+        self.assertEqual(status["config"], self.config.real_path)
+        self.daemon.run_command("shutdown")
+        self.assertTrue(self.daemon.stopping)
+
+    def test_completed_timer_raises_alarm(self):
+        with mock.patch.object(self.daemon._alarms, "trigger") as trigger:
+            self.daemon.run_command("start")
+            self.clock.advance(NS_PER_MINUTE)
+            self.daemon.poll([])
+            self.engine.ack_alarm()
+            self.clock.advance(NS_PER_MINUTE * 5 // 2)
+            self.daemon.poll([])
+        self.assertEqual([call.args[0] for call in trigger.call_args_list], [
+            "short break started",
+            "work started (missed 2 timer transitions)",
+        ])
+
+    def test_stats_start_over_at_midnight(self):
+        self.daemon.run_command("start")
+        self.clock.advance(NS_PER_MINUTE * 3 // 2)
+        self.daemon.poll([])
+        self.assertEqual(self.engine.count(TimerEngine.WORK), 1)
+        self.daemon.check_day()
+        self.assertNotIn("day", self.events)
+        self.daemon._midnight_ns = 0
+        self.daemon.check_day()
+        self.assertEqual(self.events[-1], "day")
+        self.assertEqual(self.engine.count(TimerEngine.WORK), 0)
+        self.assertEqual(self.engine.total_time(TimerEngine.SHORT_BREAK), 0)
+        self.assertEqual(self.engine.current_timer_id, 2)
+        self.assertGreater(self.daemon._midnight_ns, 0)
+
+    def test_only_timer_settings_rebuild_timers(self):
+        write_config(self.directory, IN_PROCESS + "alarm_repeat: 3\n" + TIMERS)
+        self.daemon.poll([])
+        self.assertEqual(self.config.alarm_repeat, 3)
+        self.assertNotIn("reload", self.events)
+        self.assertEqual(self.daemon.take_notices(), ["Config reloaded"])
+
+        write_config(self.directory, IN_PROCESS + "alarm_repeat: 3\n" +
+                     TIMERS.replace("duration: 2", "duration: 4"))
+        self.daemon.poll([])
+        self.assertIn("reload", self.events)
+        self.assertEqual(self.config.timers[2]["duration"], 4)
+
+    def test_malformed_config_is_a_notice(self):
+        write_config(self.directory, "timers: [\n")
+        self.daemon.poll([])
+        notice, = self.daemon.take_notices()
+        self.assertTrue(notice.startswith("Config not reloaded: "))
+        self.assertNotIn("reload", self.events)
+
+
+if __name__ == "__main__":
+    unittest.main()
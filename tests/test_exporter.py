@@ -0,0 +1,102 @@
+"""Tests of exporting history rows as CSV, JSON lines and iCalendar"""
+
+import calendar
+import io
+import os
+import time
+import unittest
+from unittest import mock
+
+from potatotimer import Exporter
+from potatotimer.TimerEngine import NS_PER_SECOND
+
+"""2026-03-10 10:00 UTC, 12:00 in Helsinki"""
+START_NS = calendar.timegm((2026, 3, 10, 10, 0, 0)) * NS_PER_SECOND
+NOW_NS = START_NS + 86400 * NS_PER_SECOND
+ROWS = [
+    (START_NS, 1500 * NS_PER_SECOND, "work", 1),
+    (START_NS + 1500 * NS_PER_SECOND, 90_500_000_000, 'tea, "green"; hot\\', 0),
+]
+
+
+class ExporterTest(unittest.TestCase):
+    def setUp(self):
+        tz = os.environ.get("TZ")
+        os.environ["TZ"] = "Europe/Helsinki"
+        time.tzset()
+        self.addCleanup(self.restore_tz, tz)
+
+    @staticmethod
+    def restore_tz(tz):
+        if tz is None:
+            del os.environ["TZ"]
+        else:
+            os.environ["TZ"] = tz
+        time.tzset()
+
+    def export(self, format, rows=ROWS, now_ns=NOW_NS):
+        stream = io.StringIO(newline="")
+        with mock.patch("time.time_ns", return_value=now_ns):
+            Exporter(stream).export(rows, format)
+        return stream.getvalue()
+
+    def test_csv(self):
+        self.assertEqual(self.export("csv"), (
+            "start,end,category,duration,completed\r\n"
+            "2026-03-10T12:00:00+02:00,2026-03-10T12:25:00+02:00,"
+            "work,1500.0,1\r\n"
+            "2026-03-10T12:25:00+02:00,2026-03-10T12:26:30+02:00,"
+            '"tea, ""green""; hot\\",90.5,0\r\n'))
+
+    def test_jsonl(self):
+        self.assertEqual(self.export("jsonl"), (
+            '{"start": "2026-03-10T12:00:00+02:00", '
+            '"end": "2026-03-10T12:25:00+02:00", '
+            '"category": "work", "duration": 1500.0, "completed": 1}\n'
+            '{"start": "2026-03-10T12:25:00+02:00", '
+            '"end": "2026-03-10T12:26:30+02:00", '
+            '"category": "tea, \\"green\\"; hot\\\\", '
+            '"duration": 90.5, "completed": 0}\n'))
+
+    def test_ics(self):
+        self.assertEqual(self.export("ics"), (
+            "BEGIN:VCALENDAR\r\nVERSION:2.0\r\n"
+            "PRODID:-//potatotimer//history export//EN\r\n"
+            "BEGIN:VEVENT\r\n"
+            f"UID:{START_NS}-work@potatotimer\r\n"
+            "DTSTAMP:20260311T100000Z\r\n"
+            "DTSTART:20260310T100000Z\r\n"
+            "DTEND:20260310T102500Z\r\n"
+            "SUMMARY:work\r\n"
+            "END:VEVENT\r\n"
+            "BEGIN:VEVENT\r\n"
+            f'UID:{START_NS + 1500 * NS_PER_SECOND}-tea\\, "green"\\; hot\\\\'
+            "@potatotimer\r\n"
+            "DTSTAMP:20260311T100000Z\r\n"
+            "DTSTART:20260310T102500Z\r\n"
+            "DTEND:20260310T102630Z\r\n"
+            'SUMMARY:tea\\, "green"\\; hot\\\\\r\n'
+            "END:VEVENT\r\n"
+            "END:VCALENDAR\r\n"))
+
+    def test_ics_uids_do_not_depend_on_export_time(self):
+        def uids(text):
+            return [line for line in text.split("\r\n")
+                    if line.startswith("UID:")]
+        first = self.export("ics")
+        second = self.export("ics", now_ns=NOW_NS + 3600 * NS_PER_SECOND)
+        self.assertNotEqual(first, second)
+        self.assertEqual(uids(first), uids(second))
+
+    def test_ics_long_lines_are_folded(self):
+        category = "ä" * 60
+        text = self.export("ics", [(START_NS, NS_PER_SECOND, category, 1)])
+        lines = text.split("\r\n")
+        self.assertTrue(all(len(line.encode()) <= 75 for line in lines))
+        unfolded = text.replace("\r\n ", "")
+        self.assertIn(f"SUMMARY:{category}\r\n", unfolded)
+        self.assertIn(f"UID:{START_NS}-{category}@potatotimer\r\n", unfolded)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+"""Tests of the columnar history store"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import date
+
+from potatotimer import History, TimerEngine, VirtualClock
+from potatotimer.TimerEngine import NS_PER_SECOND
+
+from support import load_config
+
+NOON_NS = int(time.mktime((2026, 3, 10, 12, 0, 0, 0, 0, -1))) * NS_PER_SECOND
+DAY = date(2026, 3, 10).toordinal()
+
+
+class HistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="potatotimer-test-")
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, "history")
+        self.clock = VirtualClock(wall_start_ns=NOON_NS)
+        self.engine = TimerEngine(load_config(), self.clock)
+        self.history = History(self.path, self.clock)
+        self.history.open(self.engine)
+        self.addCleanup(self.history.close)
+
+    def tick(self, seconds):
+        self.clock.advance(seconds * NS_PER_SECOND)
+        self.engine.update()
+
+    def work_day(self, days_later=0):
+        """Work runs out, a short break is stopped 10 s in and skipped"""
+        self.clock.advance(days_later * 86400 * NS_PER_SECOND)
+        self.engine.start_timer()
+        self.tick(60)
+        self.tick(10)
+        self.engine.stop_timer()
+        while self.engine.current_timer_id != 0:
+            self.engine.next_timer()
+            self.engine.reset_timer()
+
+    def stored(self):
+        """History as read back from the files"""
+        self.history.close()
+        return History(self.path).load()
+
+    def test_rows_between_events(self):
+        self.work_day()
+        rows = list(self.stored().iter_rows())
+        self.assertEqual(rows, [
+            (NOON_NS, 60 * NS_PER_SECOND, "work", 1),
+            (NOON_NS + 60 * NS_PER_SECOND, 10 * NS_PER_SECOND, "short break", 0),
+        ])
+
+    def test_aggregate_by_day(self):
+        self.work_day()
+        self.work_day(days_later=1)
+        self.work_day(days_later=2)
+        history = self.stored()
+        self.assertEqual(list(history.days), [DAY, DAY + 1, DAY + 3])
+        work = history.categories.index("work")
+        sums, day_counts = history.aggregate(key=lambda day: day)
+        self.assertEqual(day_counts, {DAY: 1, DAY + 1: 1, DAY + 3: 1})
+        self.assertEqual(sums[(DAY, work)], [1, 60 * NS_PER_SECOND])
+        sums, day_counts = history.aggregate(DAY + 1, DAY + 5)
+        self.assertEqual(day_counts, {None: 2})
+        self.assertEqual(sums[(None, work)], [2, 120 * NS_PER_SECOND])
+
+    def test_row_ranges_by_day(self):
+        self.work_day()
+        self.work_day(days_later=2)
+        history = self.stored()
+        self.assertEqual(history.row_range(DAY, DAY), range(0, 2))
+        self.assertEqual(history.row_range(DAY + 1, DAY + 1), range(0))
+        self.assertEqual(history.row_range(DAY + 1), range(2, history.rows))
+        self.assertEqual(len(list(history.iter_rows(DAY + 2, DAY + 2))),
+                         history.rows - 2)
+
+    def test_rows_of_a_category(self):
+        self.work_day()
+        self.work_day(days_later=1)
+        history = self.stored()
+        work = history.find_category("work")
+        self.assertIsNone(history.find_category("lunch"))
+        rows = list(history.iter_rows(DAY + 1, None, work))
+        self.assertEqual(rows, [
+            (NOON_NS + 86470 * NS_PER_SECOND, 60 * NS_PER_SECOND, "work", 1),
+        ])
+        self.assertEqual(
+            list(history.iter_rows(category_id=work)),
+            [row for row in history.iter_rows() if row[2] == "work"])
+
+    def test_category_search_keeps_to_values(self):
+        """Bytes of neighbouring ids that spell the id do not match"""
+        self.history.append([(NOON_NS, 1, 0x0200, 0), (NOON_NS, 1, 0x0001, 0),
+                             (NOON_NS, 1, 0x0102, 0), (NOON_NS, 1, 0x0001, 0)])
+        history = self.stored()
+        self.assertEqual(list(history.category_rows(range(0, 4), 0x0102)), [2])
+        self.assertEqual(list(history.category_rows(range(0, 4), 0x0001)), [1, 3])
+        self.assertEqual(list(history.category_rows(range(2, 3), 0x0001)), [])
+
+    def test_torn_append_is_cut_to_complete_rows(self):
+        """Columns of different lengths and a stale index after a crash"""
+        self.work_day()
+        self.history.close()
+        with open(os.path.join(self.path, "start"), "ab") as stream:
+            stream.write(b"\0" * 8)
+        with open(os.path.join(self.path, "duration"), "ab") as stream:
+            stream.write(b"\0" * 5)
+        os.truncate(os.path.join(self.path, "days"), 0)
+        history = History(self.path).load()
+        self.assertEqual(history.rows, 2)
+        self.assertEqual(list(history.days), [DAY])
+        history.close()
+
+        history = History(self.path, self.clock)
+        history.open(self.engine)
+        history.close()
+        sizes = {name: os.path.getsize(os.path.join(self.path, name))
+                 for name in History.COLUMNS}
+        self.assertEqual(sizes, {"start": 16, "duration": 16,
+                                 "category": 4, "completed": 4})
+
+
+if __name__ == "__main__":
+    unittest.main()
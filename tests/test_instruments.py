@@ -0,0 +1,105 @@
+"""Tests of the timing histograms and the profile report"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from potatotimer import Instruments
+from potatotimer.Instruments import Histogram
+
+
+class HistogramTest(unittest.TestCase):
+    def bucket_of(self, ns):
+        histogram = Histogram()
+        histogram.record(ns)
+        return list(histogram.buckets).index(1)
+
+    def test_bucket_bounds(self):
+        """Bucket k holds durations of at most 2**k microseconds"""
+        cases = [(0, 0), (1, 0), (1000, 0), (1001, 1), (2000, 1), (2001, 2),
+                 (4000, 2), (1_000_000, 10), (2 ** 26 * 1000, 26),
+                 (2 ** 26 * 1000 + 1, 27), (10 ** 15, 27)]
+        for ns, bucket in cases:
+            with self.subTest(ns=ns):
+                self.assertEqual(self.bucket_of(ns), bucket)
+                bound = Histogram.upper_bound_us(bucket)
+                if bound is not None:
+                    self.assertLessEqual(ns, bound * 1000)
+
+    def test_count_sum_and_max(self):
+        histogram = Histogram()
+        for ns in (500, 3000, 1500):
+            histogram.record(ns)
+        self.assertEqual(histogram.count, 3)
+        self.assertEqual(histogram.sum_ns, 5000)
+        self.assertEqual(histogram.max_ns, 3000)
+        self.assertEqual(sum(histogram.buckets), 3)
+        self.assertEqual(len(histogram.buckets), Histogram.BUCKETS)
+
+    def test_quantiles(self):
+        histogram = Histogram()
+        self.assertEqual(histogram.quantile_us(0.5), 0)
+        for i in range(90):
+            histogram.record(900)  # Bucket 0, up to 1 us
+        for i in range(10):
+            histogram.record(100_000)  # Bucket 7, up to 128 us
+        self.assertEqual(histogram.quantile_us(0.5), 1)
+        self.assertEqual(histogram.quantile_us(0.9), 1)
+        """Bucket bound past the longest duration is capped at it"""
+        self.assertEqual(histogram.quantile_us(0.99), 100)
+        histogram.record(10 ** 12)
+        self.assertEqual(histogram.quantile_us(1), 10 ** 9)
+
+
+class InstrumentsTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="potatotimer-test-")
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, "profile.txt")
+        self.instruments = Instruments(self.path)
+
+    def test_timed(self):
+        calls = []
+        with mock.patch("time.perf_counter_ns", side_effect=[1000, 4000]):
+            self.instruments.timed("engine_update", lambda: calls.append(1))
+        histogram = self.instruments.histograms["engine_update"]
+        self.assertEqual(calls, [1])
+        self.assertEqual((histogram.count, histogram.sum_ns), (1, 3000))
+
+    def test_unknown_metric(self):
+        with self.assertRaises(KeyError):
+            self.instruments.record("render_everything", 1)
+
+    def test_report(self):
+        self.instruments.record("loop_lateness", 3000)
+        self.instruments.record("loop_lateness", 5000)
+        lines = self.instruments.report().splitlines()
+        self.assertEqual(lines[0].split(),
+                         ["metric", "count", "mean", "p50", "p90", "p99", "max"])
+        rows = {line.split()[0]: line.split()[1:] for line in lines[1:7]}
+        self.assertEqual(list(rows), Instruments.METRICS)
+        self.assertEqual(rows["loop_lateness"],
+                         ["2", "4.0", "4", "5", "5", "5.0"])
+        self.assertEqual(rows["alarm_latency"],
+                         ["0", "0.0", "0", "0", "0", "0.0"])
+
+    def test_close_writes_report_and_trace(self):
+        self.instruments.toggle_tracing()
+        self.assertTrue(self.instruments.tracing)
+        sum(range(1000))
+        self.instruments.close()
+        self.assertFalse(self.instruments.tracing)
+        with open(self.path) as stream:
+            self.assertEqual(stream.read(), self.instruments.report())
+        self.assertTrue(os.path.getsize(f'{self.path}.pstats') > 0)
+
+    def test_close_without_trace(self):
+        self.instruments.close()
+        self.assertTrue(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(f'{self.path}.pstats'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,198 @@
+"""Tests of the session journal: replay, damaged tails and compaction"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from potatotimer import Journal, TimerEngine, VirtualClock
+from potatotimer.TimerEngine import NS_PER_MINUTE, NS_PER_SECOND
+
+from support import load_config
+
+"""Local wall clock times on a day without DST changes"""
+NOON_NS = int(time.mktime((2026, 3, 10, 12, 0, 0, 0, 0, -1))) * NS_PER_SECOND
+EVENING_NS = int(time.mktime((2026, 3, 10, 23, 58, 0, 0, 0, -1))) * NS_PER_SECOND
+
+
+class JournalTestCase(unittest.TestCase):
+    """Timer engine recorded to a journal in a temporary directory"""
+
+    WALL_START_NS = NOON_NS
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="potatotimer-test-")
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, "journal")
+        self.config = load_config()
+        self.clock = VirtualClock(wall_start_ns=self.WALL_START_NS)
+        self.engine, self.journal = self.open()
+
+    def open(self, clock=None):
+        """Engine restored from the journal, which records it from now on"""
+        clock = clock if clock is not None else self.clock
+        engine = TimerEngine(self.config, clock)
+        journal = Journal(self.config, self.path, clock)
+        journal.open(engine)
+        self.addCleanup(journal.close)
+        return engine, journal
+
+    def reopen(self, minutes_later=0):
+        self.journal.close()
+        clock = VirtualClock(
+            wall_start_ns=self.clock.time_ns() + minutes_later * NS_PER_MINUTE)
+        self.engine, self.journal = self.open(clock)
+        return self.engine
+
+    def tick(self, seconds):
+        self.clock.advance(round(seconds * NS_PER_SECOND))
+        self.engine.update()
+
+    def session(self):
+        """Work and short break run out, long break is 20 s in when stopped"""
+        self.engine.start_timer()
+        self.tick(60)
+        self.tick(30)
+        self.tick(20)
+        self.engine.stop_timer()
+
+    def assert_session(self, engine):
+        self.assertFalse(engine.running)
+        self.assertEqual(engine.current_timer_id, 2)
+        self.assertEqual(engine.time_elapsed_ns, 20 * NS_PER_SECOND)
+        self.assertEqual([engine.count(g) for g in range(3)], [1, 1, 0])
+        self.assertEqual([engine.total_time(g) for g in range(3)],
+                         [60 * NS_PER_SECOND, 30 * NS_PER_SECOND,
+                          20 * NS_PER_SECOND])
+
+
+class JournalTest(JournalTestCase):
+    def test_session_is_restored(self):
+        self.session()
+        self.assert_session(self.reopen(minutes_later=1))
+
+    def test_torn_tail_is_dropped(self):
+        self.session()
+        self.journal.close()
+        size = os.path.getsize(self.path)
+        with open(self.path, "ab") as stream:
+            stream.write(self.journal.frame(b"\1" * 40)[:-7])
+        self.assert_session(self.reopen())
+        self.journal.close()
+        with open(self.path, "rb") as stream:
+            data = stream.read()
+        records, length = self.journal.parse(data)
+        self.assertEqual(length, len(data))
+        self.assertEqual(len(data), size + len(self.journal.frame(
+            self.journal.snapshot_payload(self.engine))))
+
+    def test_broken_checksum_is_dropped(self):
+        """A record failing its CRC goes, with everything after it"""
+        self.session()
+        self.engine.start_timer()
+        self.tick(5)
+        self.engine.stop_timer()
+        self.journal.close()
+        with open(self.path, "r+b") as stream:
+            stream.seek(-(Journal.TRAILER.size + 3), os.SEEK_END)
+            byte = stream.read(1)
+            stream.seek(-1, os.SEEK_CUR)
+            stream.write(bytes([byte[0] ^ 0xff]))
+        engine = self.reopen()
+        """The stop is lost, the timer stays where it was started"""
+        self.assertEqual(engine.time_elapsed_ns, 20 * NS_PER_SECOND)
+        self.journal.close()
+        with open(self.path, "rb") as stream:
+            data = stream.read()
+        records, length = self.journal.parse(data)
+        self.assertEqual(length, len(data))
+        self.assertEqual([record[0] for record in records[-2:]],
+                         [Journal.EVENT_CODES["start"], Journal.SNAPSHOT])
+
+    def test_position_is_kept_on_a_later_day(self):
+        self.session()
+        engine = self.reopen(minutes_later=3 * 24 * 60)
+        self.assertEqual(engine.current_timer_id, 2)
+        self.assertEqual(engine.time_elapsed_ns, 20 * NS_PER_SECOND)
+        self.assertEqual([engine.count(g) for g in range(3)], [0, 0, 0])
+        self.assertEqual([engine.total_time(g) for g in range(3)], [0, 0, 0])
+
+    def test_tail_is_read_from_the_end(self):
+        """Blocks grown from the end find what parsing the whole file does"""
+        for i in range(200):
+            self.engine.start_timer()
+            self.tick(7)
+            self.engine.stop_timer()
+        self.journal.close()
+        with open(self.path, "rb") as stream:
+            data = stream.read()
+        whole, complete = self.journal.tail_records(data)
+        self.assertTrue(complete)
+        for block in (16, 100, 4096, 1 << 20):
+            with self.subTest(block=block):
+                self.journal.TAIL_BLOCK = block
+                self.assertEqual(self.journal.read_tail(), (whole, len(data)))
+        self.assertEqual(whole, self.journal.parse(data)[0])
+
+    def test_compacted_while_running(self):
+        self.journal.COMPACT_SIZE = 2000
+        for i in range(300):
+            self.engine.start_timer()
+            self.tick(11)
+            self.engine.stop_timer()
+        self.journal.close()
+        self.assertLess(os.path.getsize(self.path), 2000 + 1000)
+        with open(self.path, "rb") as stream:
+            records, length = self.journal.parse(stream.read())
+        self.assertEqual(length, os.path.getsize(self.path))
+        self.assertEqual(records[0][0], Journal.SNAPSHOT)
+        state = (self.engine.current_timer_id, self.engine.time_elapsed_ns,
+                 [self.engine.count(g) for g in range(3)],
+                 [self.engine.total_time(g) for g in range(3)])
+        engine = self.open()[0]
+        self.assertEqual(
+            (engine.current_timer_id, engine.time_elapsed_ns,
+             [engine.count(g) for g in range(3)],
+             [engine.total_time(g) for g in range(3)]), state)
+
+
+class MidnightTest(JournalTestCase):
+    """Sessions running over midnight"""
+
+    WALL_START_NS = EVENING_NS
+
+    def test_replay_across_midnight(self):
+        """Counts start over on the first record after midnight"""
+        self.engine.start_timer()
+        self.tick(60)  # 23:59:00 work runs out
+        self.tick(30)  # 23:59:30 short break runs out
+        self.tick(120)  # 00:01:30 long break runs out
+        self.tick(30)
+        self.engine.stop_timer()
+        engine = self.reopen(minutes_later=3)
+        self.assertEqual(engine.current_timer_id, 0)
+        self.assertEqual(engine.time_elapsed_ns, 30 * NS_PER_SECOND)
+        self.assertEqual([engine.count(g) for g in range(3)], [0, 0, 0])
+        self.assertEqual(engine.total_time(0), 30 * NS_PER_SECOND)
+        self.assertIsNone(engine.started_at)
+
+    def test_day_snapshot_keeps_time_after_midnight(self):
+        """With a snapshot at midnight, as the daemon records it"""
+        self.engine.start_timer()
+        self.tick(60)
+        self.tick(30)
+        self.tick(30)  # Midnight, long break 30 s in
+        self.engine.clear_stats()
+        self.engine.notify("day")
+        self.tick(90)  # 00:01:30 long break runs out
+        self.tick(30)
+        self.engine.stop_timer()
+        engine = self.reopen(minutes_later=3)
+        self.assertEqual([engine.count(g) for g in range(3)], [0, 0, 1])
+        self.assertEqual([engine.total_time(g) for g in range(3)],
+                         [30 * NS_PER_SECOND, 0, 90 * NS_PER_SECOND])
+
+
+if __name__ == "__main__":
+    unittest.main()
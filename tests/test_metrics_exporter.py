@@ -0,0 +1,127 @@
+"""Tests of the Prometheus textfile exporter"""
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from potatotimer import Instruments, MetricsExporter, TimerEngine, VirtualClock
+from potatotimer.TimerEngine import NS_PER_MINUTE
+
+from support import load_config
+
+
+class MetricsExporterTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="potatotimer-test-")
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, "potatotimer.prom")
+        self.config = load_config()
+        self.clock = VirtualClock()
+        self.engine = TimerEngine(self.config, self.clock)
+        self.instruments = Instruments(os.path.join(self.directory, "profile"))
+        self.exporter = MetricsExporter(
+            self.path, self.config, self.engine, self.instruments)
+
+    def samples(self, text):
+        """Sample values by name and labels"""
+        return dict(line.rsplit(" ", 1) for line in text.splitlines()
+                    if line and not line.startswith("#"))
+
+    def test_timer_metrics(self):
+        self.exporter.capture(None, self.engine)
+        self.engine.add_listener(self.exporter.capture)
+        self.engine.start_timer()
+        self.clock.advance(NS_PER_MINUTE * 3 // 2)
+        self.engine.update()
+        text = self.exporter.timer_metrics()
+        self.assertIn("# TYPE potatotimer_timers_completed gauge\n", text)
+        self.assertNotIn("counter", text)
+        samples = self.samples(text)
+        self.assertEqual(
+            samples['potatotimer_timers_completed{group="work"}'], "1")
+        self.assertEqual(
+            samples['potatotimer_timers_completed{group="short break"}'], "1")
+        self.assertEqual(
+            samples['potatotimer_time_spent_seconds{group="work"}'], "60.0")
+        self.assertEqual(samples["potatotimer_running"], "1")
+        self.assertEqual(samples[
+            'potatotimer_current_timer_info{timer="long break",'
+            'group="long break",position="2"}'], "1")
+        self.assertEqual(samples["potatotimer_timer_duration_seconds"], "120.0")
+
+    def test_histogram_metrics(self):
+        self.instruments.record("render_sidebar", 1500)
+        self.instruments.record("render_sidebar", 3_000_000)
+        samples = self.samples(self.exporter.histogram_metrics())
+        labels = 'window="sidebar"'
+        self.assertEqual(
+            samples[f'potatotimer_render_seconds_bucket{{{labels},le="1e-06"}}'], "0")
+        self.assertEqual(
+            samples[f'potatotimer_render_seconds_bucket{{{labels},le="2e-06"}}'], "1")
+        self.assertEqual(
+            samples[f'potatotimer_render_seconds_bucket{{{labels},le="+Inf"}}'], "2")
+        self.assertEqual(
+            samples[f'potatotimer_render_seconds_count{{{labels}}}'], "2")
+        self.assertEqual(
+            samples[f'potatotimer_render_seconds_sum{{{labels}}}'], "0.0030015")
+
+    def test_histogram_count_matches_buckets_while_recording(self):
+        """The main loop records while the writer thread reads"""
+        recording = threading.Event()
+        stop = threading.Event()
+
+        def record():
+            while not stop.is_set():
+                self.instruments.record("engine_update", 5000)
+                recording.set()
+        recorder = threading.Thread(target=record)
+        recorder.start()
+        self.addCleanup(recorder.join)
+        self.addCleanup(stop.set)
+        recording.wait()
+        for i in range(200):
+            samples = self.samples(self.exporter.histogram_metrics())
+            self.assertEqual(
+                samples['potatotimer_engine_update_seconds_bucket{le="+Inf"}'],
+                samples["potatotimer_engine_update_seconds_count"])
+
+    def test_count_is_the_bucket_sum(self):
+        """Even caught between the bucket and count increment of a record"""
+        histogram = self.instruments.histograms["alarm_latency"]
+        histogram.record(1000)
+        histogram._count += 1
+        samples = self.samples(self.exporter.histogram_metrics())
+        self.assertEqual(samples["potatotimer_alarm_latency_seconds_count"], "1")
+
+    def test_unchanged_metrics_are_not_written(self):
+        self.exporter.capture(None, self.engine)
+        with mock.patch("os.replace", wraps=os.replace) as replace:
+            self.exporter.write()
+            self.exporter.write()
+            self.assertEqual(replace.call_count, 1)
+            self.instruments.record("loop_lateness", 10)
+            self.exporter.write()
+            self.assertEqual(replace.call_count, 2)
+        with open(self.path) as stream:
+            text = stream.read()
+        self.assertIn("potatotimer_process_cpu_seconds_total", text)
+        self.assertEqual(os.listdir(self.directory), ["potatotimer.prom"])
+
+    def test_missing_directory_is_not_an_error(self):
+        exporter = MetricsExporter(
+            os.path.join(self.directory, "missing", "potatotimer.prom"),
+            self.config, self.engine)
+        exporter.capture(None, self.engine)
+        exporter.write()
+
+    def test_label_values_are_escaped(self):
+        self.assertEqual(
+            MetricsExporter.sample("m", {"timer": 'a "b"\\\n'}, 1),
+            'm{timer="a \\"b\\"\\\\\\n"} 1')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,194 @@
+"""Tests of terminals attached to a timer daemon over its control socket"""
+
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from potatotimer import Config, ConfigError, Daemon, RemoteEngine, TimerEngine
+from potatotimer import VirtualClock
+from potatotimer.TimerEngine import NS_PER_SECOND
+
+from support import TIMERS, load_config, write_config
+
+DAEMON = """\
+journal: False
+history: False
+status_file: False
+control_socket: {path}
+""" + TIMERS
+
+
+class FakeDaemon:
+    """Control socket answering with the status of a daemon of its own
+    #
+    # While silent, responses are held back until released.
+    """
+
+    def __init__(self, path, config):
+        self.daemon = Daemon(config, TimerEngine(config))
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(path)
+        self.listener.listen(1)
+        self.connection = None
+        self.silent = False
+        self.held = []
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def serve(self):
+        self.connection, address = self.listener.accept()
+        for line in self.connection.makefile("rb"):
+            request = json.loads(line)
+            response = self.daemon.run_command(request["command"])
+            response["id"] = request["id"]
+            self.held.append(json.dumps(response).encode() + b"\n")
+            if not self.silent:
+                self.release()
+
+    def release(self):
+        self.silent = False
+        self.connection.sendall(b"".join(self.held))
+        self.held.clear()
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.shutdown(socket.SHUT_RDWR)
+        self.listener.close()
+        self.thread.join()
+
+
+class RemoteEngineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="potatotimer-test-")
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, "control.sock")
+        self.config_file = write_config(
+            self.directory, DAEMON.format(path=self.path))
+        self.config = Config(self.config_file, use_cache=False)
+
+    def attach(self, config=None):
+        engine = RemoteEngine(config or self.config, self.path)
+        engine.connect()
+        self.addCleanup(engine.close)
+        return engine
+
+
+class RemoteEngineTest(RemoteEngineTestCase):
+    """Against a daemon running in a thread"""
+
+    def setUp(self):
+        super().setUp()
+        self.daemon = Daemon(self.config, TimerEngine(self.config))
+        thread = threading.Thread(target=self.daemon.run, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+
+    def attach(self, config=None):
+        """Attach once the daemon is listening"""
+        while True:
+            try:
+                return super().attach(config)
+            except (FileNotFoundError, ConnectionRefusedError):
+                time.sleep(0.01)
+
+    def shutdown(self):
+        self.attach().run_command("shutdown")
+
+    def test_commands_run_on_the_daemon(self):
+        self.addCleanup(self.shutdown)
+        engine = self.attach()
+        engine.start_timer()
+        self.assertTrue(engine.running)
+        engine.next_timer()
+        self.assertEqual(engine.current_timer_id, 1)
+        self.assertEqual(engine.timer_name, "short break")
+        engine.stop_timer()
+        self.assertFalse(engine.running)
+
+    def test_events_are_pushed_to_other_terminals(self):
+        self.addCleanup(self.shutdown)
+        watcher = self.attach()
+        self.attach().start_timer()
+        events = []
+        watcher.add_listener(lambda event, engine: events.append(event))
+        while not events:
+            watcher.poll(watcher.fds())
+        self.assertEqual(events, ["start"])
+        self.assertTrue(watcher.running)
+
+    def test_daemon_with_another_config_is_refused(self):
+        self.addCleanup(self.shutdown)
+        self.attach()
+        other = write_config(
+            self.directory, DAEMON.format(path=self.path), "other.yml")
+        engine = RemoteEngine(Config(other, use_cache=False), self.path)
+        with self.assertRaises(ConfigError):
+            engine.connect()
+        self.assertEqual(engine.fds(), [])
+
+    def test_shutdown_stops_the_daemon(self):
+        engine = self.attach()
+        self.assertTrue(engine.run_command("shutdown")["ok"])
+        with self.assertRaises(OSError):
+            while True:
+                engine.request("status")
+
+
+class UnresponsiveDaemonTest(RemoteEngineTestCase):
+    """Against a fake daemon that can hold its answers back"""
+
+    def setUp(self):
+        super().setUp()
+        self.fake = FakeDaemon(self.path, self.config)
+        self.addCleanup(self.fake.close)
+
+    @mock.patch.object(RemoteEngine, "TIMEOUT", 0.1)
+    def test_timeout_is_a_notice(self):
+        engine = self.attach()
+        self.fake.silent = True
+        response = engine.run_command("start")
+        self.assertEqual(response, {"ok": False, "error": "timeout"})
+        self.assertEqual(engine.take_notices(),
+                         ["Timer daemon did not answer start"])
+        """The late answer is not taken for the next one"""
+        self.fake.release()
+        self.assertTrue(engine.run_command("stop")["ok"])
+        self.assertFalse(engine.running)
+        self.assertEqual(engine.fds(), [engine._socket.fileno()])
+
+    def test_daemon_going_away_is_a_notice(self):
+        engine = self.attach()
+        self.fake.connection.shutdown(socket.SHUT_RDWR)
+        engine.poll(engine.fds())
+        self.assertEqual(engine.fds(), [])
+        self.assertEqual(engine.take_notices(),
+                         ["Timer daemon went away: connection closed"])
+        self.assertFalse(engine.run_command("start")["ok"])
+        self.assertEqual(engine.take_notices(),
+                         ["Not attached to the timer daemon"])
+
+
+class MirrorTest(unittest.TestCase):
+    def test_duration_is_the_daemons(self):
+        """A schedule cuts a timer short, the config can't tell"""
+        config = load_config()
+        daemon_engine = TimerEngine(config, VirtualClock())
+        daemon_engine.start_timer()
+        state = daemon_engine.snapshot()
+        state["duration_ns"] = 20 * NS_PER_SECOND
+        state["elapsed_ns"] = 5 * NS_PER_SECOND
+        engine = RemoteEngine(config, clock=VirtualClock())
+        engine.restore(state)
+        self.assertEqual(engine.timer_duration_ns, 20 * NS_PER_SECOND)
+        self.assertEqual(engine.time_elapsed_ns, 5 * NS_PER_SECOND)
+        self.assertEqual(engine.time_to_deadline(), 15)
+
+
+if __name__ == "__main__":
+    unittest.main()
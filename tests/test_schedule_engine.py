@@ -0,0 +1,183 @@
+"""Tests of timers following a schedule of local wall clock times"""
+
+import calendar
+import os
+import time
+import unittest
+from datetime import date
+
+from potatotimer import ScheduleEngine, VirtualClock
+from potatotimer.TimerEngine import NS_PER_MINUTE, NS_PER_SECOND
+
+from support import load_config
+
+NIGHTLY = """\
+schedule:
+  - type: "work"
+    duration: {duration}
+    at: "3:30"
+"""
+
+WORKDAY = """\
+schedule:
+  - type: "work"
+    duration: 60
+    at: "9:00"
+    days: weekdays
+  - type: "short break"
+    duration: 10
+  - type: "lecture"
+    duration: 20
+    at: "2026-03-10 9:30"
+  - type: "exam"
+    duration: 45
+    at: "2026-03-11 9:00"
+"""
+
+
+def utc_ns(*fields):
+    """Wall clock ns of a UTC date and time"""
+    return calendar.timegm(fields + (0,) * (6 - len(fields))) * NS_PER_SECOND
+
+
+def local_ns(*fields):
+    """Wall clock ns of an unambiguous local date and time"""
+    return int(time.mktime(fields + (0,) * (6 - len(fields)) +
+                           (0, 0, -1))) * NS_PER_SECOND
+
+
+class HelsinkiTestCase(unittest.TestCase):
+    """Times in Europe/Helsinki, UTC+2 and UTC+3 in summer
+    #
+    # In 2026 clocks go from 3:00 to 4:00 on March 29 and from 4:00 back
+    # to 3:00 on October 25
+    """
+
+    def setUp(self):
+        tz = os.environ.get("TZ")
+        os.environ["TZ"] = "Europe/Helsinki"
+        time.tzset()
+        self.addCleanup(self.restore_tz, tz)
+
+    @staticmethod
+    def restore_tz(tz):
+        if tz is None:
+            del os.environ["TZ"]
+        else:
+            os.environ["TZ"] = tz
+        time.tzset()
+
+    def engine(self, text, wall_ns):
+        return ScheduleEngine(load_config(text), VirtualClock(wall_start_ns=wall_ns))
+
+
+class LocalTimeTest(HelsinkiTestCase):
+    def test_local_times(self):
+        seconds = 3 * 3600 + 1800
+        cases = [
+            ("standard time", date(2026, 3, 28), utc_ns(2026, 3, 28, 1, 30)),
+            ("summer time", date(2026, 6, 1), utc_ns(2026, 6, 1, 0, 30)),
+            ("skipped, moves forward", date(2026, 3, 29),
+             utc_ns(2026, 3, 29, 1, 30)),
+            ("repeated, first one", date(2026, 10, 25),
+             utc_ns(2026, 10, 25, 0, 30)),
+        ]
+        """mktime reads ambiguous times depending on earlier calls"""
+        for month in (1, 7):
+            for name, day, expected in cases:
+                with self.subTest(name, month=month):
+                    time.mktime((2026, month, 1, 12, 0, 0, 0, 0, -1))
+                    self.assertEqual(ScheduleEngine.local_ns(day, seconds),
+                                     expected)
+
+
+class DstTest(HelsinkiTestCase):
+    def test_spring_forward_gap(self):
+        """3:30 does not exist on March 29, the slot starts at 4:30"""
+        engine = self.engine(NIGHTLY.format(duration=60),
+                             utc_ns(2026, 3, 29, 1, 0))
+        start = utc_ns(2026, 3, 29, 1, 30)
+        self.assertEqual(engine.find_slot(utc_ns(2026, 3, 29, 1, 0)),
+                         (0, start, start, False))
+        self.assertFalse(engine.running)
+        self.assertEqual(engine.find_slot(utc_ns(2026, 3, 29, 1, 45)),
+                         (0, start, start + 60 * NS_PER_MINUTE, True))
+        """The day before, the slot ran at 3:30 standard time"""
+        before = utc_ns(2026, 3, 28, 1, 30)
+        self.assertEqual(engine.find_slot(utc_ns(2026, 3, 28, 2, 0)),
+                         (0, before, before + 60 * NS_PER_MINUTE, True))
+
+    def test_fall_back_repeat(self):
+        """3:30 comes twice on October 25, the slot runs the first time"""
+        engine = self.engine(NIGHTLY.format(duration=20),
+                             utc_ns(2026, 10, 25, 0, 40))
+        start = utc_ns(2026, 10, 25, 0, 30)
+        self.assertTrue(engine.running)
+        self.assertEqual(engine.time_elapsed_ns, 10 * NS_PER_MINUTE)
+        self.assertEqual(engine.find_slot(utc_ns(2026, 10, 25, 0, 40)),
+                         (0, start, start + 20 * NS_PER_MINUTE, True))
+        following = utc_ns(2026, 10, 26, 1, 30)
+        self.assertEqual(engine.find_slot(utc_ns(2026, 10, 25, 1, 35)),
+                         (0, following, following, False))
+
+    def test_slot_over_the_repeated_hour(self):
+        """A slot runs for its duration, however the clocks are turned"""
+        engine = self.engine(NIGHTLY.format(duration=90),
+                             utc_ns(2026, 10, 25, 0, 30))
+        start = utc_ns(2026, 10, 25, 0, 30)
+        self.assertEqual(engine.find_slot(utc_ns(2026, 10, 25, 1, 45)),
+                         (0, start, start + 90 * NS_PER_MINUTE, True))
+
+
+class SlotLookupTest(HelsinkiTestCase):
+    def find(self, *fields):
+        engine = self.engine(WORKDAY, local_ns(2026, 3, 9))
+        return engine.find_slot(local_ns(*fields))
+
+    def test_weekly_slots(self):
+        nine = local_ns(2026, 3, 9, 9)
+        self.assertEqual(self.find(2026, 3, 9, 8),
+                         (0, nine, nine, False))
+        self.assertEqual(self.find(2026, 3, 9, 9, 15),
+                         (0, nine, nine + 60 * NS_PER_MINUTE, True))
+        """The break follows work, then the timer waits for Tuesday"""
+        ten = local_ns(2026, 3, 9, 10)
+        self.assertEqual(self.find(2026, 3, 9, 10, 5),
+                         (1, ten, ten + 10 * NS_PER_MINUTE, True))
+        self.assertEqual(self.find(2026, 3, 9, 10, 10),
+                         (0, nine + 24 * 60 * NS_PER_MINUTE,
+                          nine + 24 * 60 * NS_PER_MINUTE, False))
+
+    def test_weekend_waits_for_monday(self):
+        monday = local_ns(2026, 3, 16, 9)
+        for day in (13, 14, 15):
+            with self.subTest(day=day):
+                self.assertEqual(self.find(2026, 3, day, 12),
+                                 (0, monday, monday, False))
+
+    def test_dated_slot_cuts_weekly_one_short(self):
+        nine = local_ns(2026, 3, 10, 9)
+        half_past = local_ns(2026, 3, 10, 9, 30)
+        self.assertEqual(self.find(2026, 3, 10, 9, 15),
+                         (0, nine, half_past, True))
+        self.assertEqual(self.find(2026, 3, 10, 9, 45),
+                         (2, half_past, half_past + 20 * NS_PER_MINUTE, True))
+        """The weekly slot does not come back once the dated one ends"""
+        ten = local_ns(2026, 3, 10, 10)
+        self.assertEqual(self.find(2026, 3, 10, 9, 55), (1, ten, ten, False))
+
+    def test_dated_slot_wins_at_the_same_start(self):
+        nine = local_ns(2026, 3, 11, 9)
+        self.assertEqual(self.find(2026, 3, 10, 10, 20),
+                         (3, nine, nine, False))
+        self.assertEqual(self.find(2026, 3, 11, 9, 30),
+                         (3, nine, nine + 45 * NS_PER_MINUTE, True))
+
+    def test_no_dated_slot_ahead(self):
+        engine = self.engine(WORKDAY, local_ns(2026, 4, 1))
+        self.assertEqual(engine.dated_around(local_ns(2026, 4, 1)),
+                         ((local_ns(2026, 3, 11, 9), 3), None))
+
+
+if __name__ == "__main__":
+    unittest.main()
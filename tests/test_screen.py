@@ -0,0 +1,111 @@
+"""Tests of Screen drawing on a virtual terminal"""
+
+import unittest
+from unittest import mock
+
+from potatotimer import Screen, VirtualBackend
+from potatotimer.TimerEngine import NS_PER_SECOND
+
+from support import IN_PROCESS, TIMERS, Headless, load_config
+
+
+class AddStrTest(unittest.TestCase):
+    """Unchanged strings are skipped, shorter ones cover the previous"""
+
+    def setUp(self):
+        self.backend = VirtualBackend(10, 40)
+        self.screen = Screen(load_config(), self.backend)
+        self.screen.start()
+        self.screen.resize_or_create_window("content", 10, 40, 0, 0)
+        self.window = self.screen._windows["content"]
+        self.screen.stage_window("content")
+        self.screen.flush_frame()
+
+    def draw(self, message, color=None):
+        self.screen.add_str("content", 2, 2, message, color)
+        self.screen.stage_window("content")
+        self.screen.flush_frame()
+
+    def test_identical_string_is_skipped(self):
+        self.draw("12:34:56")
+        counters = self.screen.frame_counters()
+        self.draw("12:34:56")
+        after = self.screen.frame_counters()
+        self.assertEqual(after["window_writes"], counters["window_writes"])
+        self.assertEqual(after["flushes"], counters["flushes"])
+        self.assertEqual(after["frames"], counters["frames"] + 1)
+
+    def test_changed_color_is_drawn(self):
+        self.draw("12:34:56")
+        writes = self.screen.frame_counters()["window_writes"]
+        self.draw("12:34:56", self.screen.color_pair(2))
+        self.assertEqual(self.screen.frame_counters()["window_writes"],
+                         writes + 1)
+
+    def test_shorter_string_is_padded(self):
+        self.draw("Long break")
+        self.draw("Work")
+        self.assertEqual(self.window.row(2)[2:12], "Work      ")
+        self.assertEqual(self.backend.screen_text()[2][2:12], "Work      ")
+
+    def test_clipped_to_window(self):
+        """Nothing is drawn past the padding column or below the window"""
+        self.draw("x" * 60)
+        self.assertEqual(self.window.row(2), "  " + "x" * 37 + " ")
+        self.screen.add_str("content", 10, 2, "below")
+        self.assertNotIn((10, 2), self.screen._drawn["content"])
+
+    def test_erase_forgets_drawn_strings(self):
+        self.draw("Work")
+        self.screen.erase_window("content")
+        self.draw("Work")
+        self.assertEqual(self.window.row(2)[2:6], "Work")
+
+
+class FrameTest(unittest.TestCase):
+    """Each main loop round reaches the terminal in one write at most"""
+
+    def setUp(self):
+        self.headless = Headless(load_config(IN_PROCESS + TIMERS), daemon=True)
+        self.addCleanup(self.headless.close)
+        self.backend = self.headless.backend
+        self.headless.frame()
+        self.backend.reset_counters()
+
+    def frame(self, seconds=0, keys=""):
+        """Run a frame, returns the number of terminal updates it made"""
+        for key in keys:
+            self.backend.press(key)
+        self.headless.clock.advance(seconds * NS_PER_SECOND)
+        with mock.patch.object(self.backend, "update",
+                               wraps=self.backend.update) as update:
+            self.headless.frame()
+        return update.call_count
+
+    def test_windows_changed_together_are_one_write(self):
+        """Start changes the statusline, sidebar and content windows"""
+        self.assertEqual(self.frame(keys="s"), 1)
+        self.assertEqual(self.backend.writes, 1)
+        self.assertGreater(self.headless.screen.frame_counters()["window_writes"], 1)
+        self.assertEqual(self.frame(seconds=1), 1)
+        self.assertEqual(self.backend.writes, 2)
+
+    def test_timer_change_and_help_are_one_write_each(self):
+        self.frame(keys="s")
+        self.assertEqual(self.frame(seconds=61), 1)
+        self.assertEqual(self.frame(keys="h"), 1)
+        self.assertEqual(self.frame(seconds=1), 1)
+        self.assertEqual(self.frame(keys="h"), 1)
+        self.assertEqual(self.backend.writes, 5)
+
+    def test_unchanged_frame_is_not_written(self):
+        counters = self.headless.screen.frame_counters()
+        self.assertEqual(self.frame(), 0)
+        after = self.headless.screen.frame_counters()
+        self.assertEqual(after["flushes"], counters["flushes"])
+        self.assertEqual(after["frames"], counters["frames"] + 1)
+        self.assertEqual(self.backend.writes, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
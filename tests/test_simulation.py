@@ -0,0 +1,45 @@
+"""Tests of the virtual clock and the headless simulation driver"""
+
+import time
+import unittest
+
+from potatotimer import Simulation, VirtualClock
+from potatotimer.TimerEngine import NS_PER_SECOND
+
+from support import load_config
+
+
+class VirtualClockTest(unittest.TestCase):
+    def test_moves_only_when_advanced(self):
+        clock = VirtualClock(5, wall_start_ns=1_700_000_000 * NS_PER_SECOND)
+        self.assertEqual(clock.monotonic_ns(), 5)
+        self.assertEqual(clock.monotonic_ns(), 5)
+        clock.advance(3 * NS_PER_SECOND)
+        self.assertEqual(clock.monotonic_ns(), 5 + 3 * NS_PER_SECOND)
+        self.assertEqual(clock.time_ns(), 1_700_000_003 * NS_PER_SECOND)
+
+    def test_localtime_follows_wall_clock(self):
+        clock = VirtualClock(wall_start_ns=1_700_000_000 * NS_PER_SECOND)
+        clock.advance(90 * NS_PER_SECOND)
+        self.assertEqual(clock.localtime(), time.localtime(1_700_000_090))
+
+
+class SimulationTest(unittest.TestCase):
+    def test_week_without_violations(self):
+        report = Simulation(load_config(), days=7, seed=1).run()
+        self.assertEqual(report["violation_count"], 0, report["violations"])
+        self.assertEqual(report["total_divergence_ns"], 0)
+        self.assertGreater(report["total_time_elapsed_ns"], 0)
+        self.assertGreater(report["keystrokes"], 0)
+        self.assertGreater(report["work_count"], 0)
+
+    def test_same_seed_same_run(self):
+        reports = [Simulation(load_config(), days=1, seed=42).run()
+                   for i in range(2)]
+        for report in reports:
+            del report["wall_time"], report["ticks_per_second"]
+        self.assertEqual(reports[0], reports[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
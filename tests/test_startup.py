@@ -0,0 +1,95 @@
+"""Tests of lazy imports and the compiled config cache"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+from unittest import mock
+
+from potatotimer import Config
+
+from support import TIMERS, write_config
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_python(code, **env):
+    """Run code in a fresh interpreter, returns its stdout lines"""
+    environment = dict(os.environ, PYTHONPATH=ROOT, **env)
+    return subprocess.run(
+        [sys.executable, "-c", textwrap.dedent(code)], env=environment,
+        check=True, stdout=subprocess.PIPE, text=True).stdout.split()
+
+
+class LazyImportTest(unittest.TestCase):
+    def test_package_imports_nothing_up_front(self):
+        loaded = run_python("""
+            import sys
+            import potatotimer
+            print(*sorted(name for name in sys.modules
+                          if name.startswith("potatotimer.")
+                          or name in ("yaml", "curses", "subprocess")))
+        """)
+        self.assertEqual(loaded, [])
+
+    def test_classes_survive_submodule_imports(self):
+        """Daemon imports Config and others, which bind the module names"""
+        names = run_python("""
+            import potatotimer
+            from potatotimer import Daemon
+            from potatotimer import Config, ConfigError, TimerEngine
+            print(Daemon.__name__, Config.__name__, ConfigError.__name__,
+                  TimerEngine.__name__, type(potatotimer.Journal).__name__)
+        """)
+        self.assertEqual(
+            names, ["Daemon", "Config", "ConfigError", "TimerEngine", "type"])
+
+
+class ConfigCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="potatotimer-test-")
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = write_config(self.directory, "alarm_repeat: 2\n" + TIMERS)
+        cache = os.path.join(self.directory, "cache")
+        patcher = mock.patch.object(
+            Config, "cache_file",
+            lambda config: os.path.join(cache, "config.cache"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_cached_settings_match_parsed(self):
+        parsed = Config(self.path)
+        with mock.patch.object(Config, "read_config") as read_config:
+            cached = Config(self.path)
+        read_config.assert_not_called()
+        self.assertEqual(cached.settings(), parsed.settings())
+        self.assertEqual(list(cached.timers), list(parsed.timers))
+
+    def test_changed_file_is_parsed_again(self):
+        Config(self.path)
+        with open(self.path, "a") as stream:
+            stream.write("alarm_type: flash\n")
+        config = Config(self.path)
+        self.assertEqual(config.alarm_types, ["flash"])
+        self.assertEqual(config.alarm_repeat, 2)
+
+    def test_cached_load_skips_yaml(self):
+        Config(self.path)
+        loaded = run_python(f"""
+            import sys
+            from unittest import mock
+            from potatotimer import Config
+            with mock.patch.object(Config, "cache_file",
+                                   lambda config: {Config.cache_file(None)!r}):
+                Config({self.path!r})
+            print(*sorted(name for name in ("yaml", "datetime")
+                          if name in sys.modules))
+        """)
+        self.assertEqual(loaded, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
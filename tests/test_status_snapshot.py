@@ -0,0 +1,150 @@
+"""Tests of the memory-mapped status file"""
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from potatotimer import StatusSnapshot, TimerEngine, VirtualClock
+
+from support import load_config
+
+
+def body(i, pid):
+    """Stopped status whose fields all follow from i"""
+    return StatusSnapshot.BODY.pack(
+        pid, False, i, i * 1_000_000_000, 0, 10_000 * 1_000_000_000,
+        i, i, i, i, f't{i}'.encode() * 8)
+
+
+class SlowSnapshot(StatusSnapshot):
+    """Writer that copies the body in two halves
+    #
+    # Widens the window in which a reader without the seqlock would see
+    # half of one status and half of another.
+    """
+
+    def write(self, body):
+        self._sequence += 1
+        self.HEADER.pack_into(self._map, 0, self.MAGIC, self._sequence)
+        half = self.HEADER.size + len(body) // 2
+        self._map[self.HEADER.size:half] = body[:len(body) // 2]
+        time.sleep(0)
+        self._map[half:] = body[len(body) // 2:]
+        self._sequence += 1
+        self.SEQUENCE.pack_into(self._map, 4, self._sequence)
+
+
+def write_forever(path, stop, snapshot_class=StatusSnapshot):
+    """Rewrite the status file with changing bodies until told to stop"""
+    snapshot = snapshot_class(path)
+    snapshot.open()
+    pid = os.getpid()
+    i = 0
+    while not stop.is_set():
+        snapshot.write(body(i % 10_000, pid))
+        i += 1
+        time.sleep(0.0001)
+    snapshot.close()
+
+
+class StatusSnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="potatotimer-test-")
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, "status")
+
+    def snapshot(self):
+        snapshot = StatusSnapshot(self.path)
+        snapshot.open()
+        self.addCleanup(snapshot.close)
+        return snapshot
+
+    def test_published_status(self):
+        engine = TimerEngine(load_config(), VirtualClock())
+        engine.start_timer()
+        self.snapshot().publish(engine)
+        values = StatusSnapshot.read(self.path)
+        self.assertEqual(values["timer"], "work")
+        self.assertEqual(values["state"], "running")
+        self.assertEqual(values["duration"], "0:01:00")
+        self.assertEqual(values["work"], 0)
+
+    def test_closed_file_is_removed(self):
+        snapshot = self.snapshot()
+        snapshot.publish(TimerEngine(load_config(), VirtualClock()))
+        snapshot.close()
+        self.assertFalse(os.path.exists(self.path))
+        self.assertIsNone(StatusSnapshot.read(self.path))
+
+    def test_file_of_a_running_timer_is_kept(self):
+        """A second timer neither takes over nor removes the file"""
+        context = multiprocessing.get_context("fork")
+        stop = context.Event()
+        writer = context.Process(target=write_forever, args=(self.path, stop))
+        writer.start()
+        self.addCleanup(writer.join)
+        self.addCleanup(stop.set)
+        while StatusSnapshot.read(self.path) is None:
+            time.sleep(0.01)
+        with self.assertRaises(OSError):
+            StatusSnapshot(self.path).open()
+        self.assertTrue(os.path.exists(self.path))
+        stop.set()
+        writer.join()
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_file_of_a_gone_timer_is_taken_over(self):
+        with open(self.path, "wb") as stream:
+            stream.write(StatusSnapshot.HEADER.pack(StatusSnapshot.MAGIC, 2))
+            stream.write(body(1, 0x7ffffff0))
+        self.assertIsNone(StatusSnapshot.read(self.path))
+        self.snapshot().write(body(2, os.getpid()))
+        self.assertEqual(StatusSnapshot.read(self.path)["timer_id"], 2)
+
+    def test_reader_never_sees_a_torn_write(self):
+        """Reads racing a writer in another process are whole or none"""
+        context = multiprocessing.get_context("fork")
+        stop = context.Event()
+        writer = context.Process(
+            target=write_forever, args=(self.path, stop, SlowSnapshot))
+        writer.start()
+        self.addCleanup(writer.join)
+        self.addCleanup(stop.set)
+        reads = set()
+        deadline = time.monotonic() + 1
+        while time.monotonic() < deadline:
+            values = StatusSnapshot.read(self.path)
+            if values is None:
+                continue
+            i = values["timer_id"]
+            self.assertEqual(
+                (values["elapsed_s"], values["work"], values["short"],
+                 values["long"], values["others"], values["timer"]),
+                (i, i, i, i, i, f't{i}' * 8))
+            reads.add(i)
+        self.assertGreater(len(reads), 1)
+
+    def test_sequence_is_odd_while_writing(self):
+        snapshot = self.snapshot()
+        sequences = []
+
+        class Map(bytearray):
+            def __setitem__(map, key, value):
+                sequences.append(StatusSnapshot.SEQUENCE.unpack_from(map, 4)[0])
+                super().__setitem__(key, value)
+
+        mapped = snapshot._map
+        snapshot._map = Map(mapped)
+        snapshot.write(body(1, os.getpid()))
+        snapshot.write(body(2, os.getpid()))
+        self.assertEqual(sequences, [1, 3])
+        self.assertEqual(
+            StatusSnapshot.SEQUENCE.unpack_from(snapshot._map, 4)[0], 4)
+        snapshot._map = mapped
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,213 @@
+"""Tests of the integer nanosecond timer engine
+#
+# In the drift tests the engine is run on a virtual clock through millions of ticks, with
+# odd tick lengths, pauses and suspend-sized jumps. Run clock, position
+# and totals are checked against expectations computed with integers
+# from the timer list, so any drift at all fails.
+"""
+
+import os
+import tempfile
+import unittest
+
+from potatotimer import Config, TimerEngine, VirtualClock
+from potatotimer.TimerEngine import NS_PER_MINUTE, NS_PER_SECOND
+
+import support
+
+CONFIG = """\
+timers:
+  - type: "work"
+    duration: 7.3
+  - type: "short break"
+    duration: 0.1
+  - type: "work"
+    duration: 7.3
+  - type: "short break"
+    duration: 0.1
+  - type: "long break"
+    duration: 2.35
+  - type: "teach"
+    duration: 1.7
+"""
+
+
+def load_config():
+    """Config with odd durations, not cached"""
+    handle, path = tempfile.mkstemp(suffix=".yml", prefix="potatotimer-test-")
+    with os.fdopen(handle, "w") as stream:
+        stream.write(CONFIG)
+    try:
+        return Config(path, use_cache=False)
+    finally:
+        os.unlink(path)
+
+
+def expected_state(config, run_ns):
+    """Timer id, elapsed ns, counts and totals per group after run_ns"""
+    durations = [round(timer["duration"] * NS_PER_MINUTE) for timer in config.timers]
+    groups = [config.categories[timer["category"]]["group"] for timer in config.timers]
+    counts = [0] * len(config.groups)
+    totals = [0] * len(config.groups)
+    cycles, position = divmod(run_ns, sum(durations))
+    for duration, group in zip(durations, groups):
+        counts[group] += cycles
+        totals[group] += cycles * duration
+    for timer_id, (duration, group) in enumerate(zip(durations, groups)):
+        if position < duration:
+            totals[group] += position
+            return timer_id, position, counts, totals
+        position -= duration
+        counts[group] += 1
+        totals[group] += duration
+
+
+class TimerEngineDriftTest(unittest.TestCase):
+    def setUp(self):
+        self.config = load_config()
+        self.clock = VirtualClock()
+        self.engine = TimerEngine(self.config, self.clock)
+
+    def assert_exact(self, run_ns):
+        engine = self.engine
+        timer_id, elapsed, counts, totals = expected_state(self.config, run_ns)
+        self.assertEqual(engine.run_ns, run_ns)
+        self.assertEqual(engine.current_timer_id, timer_id)
+        self.assertEqual(engine.time_elapsed_ns, elapsed)
+        groups = range(len(self.config.groups))
+        self.assertEqual([engine.count(g) for g in groups], counts)
+        self.assertEqual([engine.total_time(g) for g in groups], totals)
+        self.assertEqual(sum(engine.total_time(g) for g in groups), run_ns)
+
+    def test_millions_of_ticks(self):
+        """Two million 60 Hz frame ticks, checked along the way"""
+        tick = NS_PER_SECOND // 60 + 7  # Not a divisor of any duration
+        self.engine.start_timer()
+        for checkpoint in range(20):
+            for i in range(100_000):
+                self.clock.advance(tick)
+                self.engine.update()
+            self.assert_exact((checkpoint + 1) * 100_000 * tick)
+
+    def test_pauses_are_not_counted(self):
+        """Time while stopped adds nothing, however often it happens"""
+        tick = 123_456_789
+        run_ns = 0
+        for round_id in range(10_000):
+            self.engine.start_timer()
+            for i in range(100):
+                self.clock.advance(tick)
+                self.engine.update()
+            run_ns += 100 * tick
+            self.engine.stop_timer()
+            for i in range(10):
+                self.clock.advance(tick)
+                self.engine.update()
+        self.assert_exact(run_ns)
+
+    def test_suspend_jumps(self):
+        """Jumps over many cycles land exactly where ticks would have"""
+        self.engine.start_timer()
+        run_ns = 0
+        for jump in (1, 999_999_999, 3 * 86_400 * NS_PER_SECOND + 17,
+                     NS_PER_MINUTE - 1, 365 * 86_400 * NS_PER_SECOND):
+            self.clock.advance(jump)
+            self.engine.update()
+            run_ns += jump
+            self.assert_exact(run_ns)
+
+
+class TimeToNextTickTest(unittest.TestCase):
+    """Wakeups land on the half seconds the shown elapsed time rounds at"""
+
+    def setUp(self):
+        self.clock = VirtualClock()
+        self.engine = TimerEngine(load_config(), self.clock)
+
+    def test_stopped_timer_has_no_tick(self):
+        self.assertIsNone(self.engine.time_to_next_tick())
+        self.assertIsNone(self.engine.time_to_deadline())
+
+    def test_tick_on_half_seconds(self):
+        self.engine.start_timer()
+        for elapsed_ms, expected_ms in ((0, 500), (200, 300), (499, 1),
+                                        (500, 1000), (1700, 800)):
+            with self.subTest(elapsed_ms=elapsed_ms):
+                self.clock.advance(elapsed_ms * 1_000_000 - self.engine.run_clock())
+                self.assertEqual(self.engine.time_to_next_tick(),
+                                 expected_ms / 1000)
+
+    def test_tick_at_end_of_timer(self):
+        """A timer ending between two half seconds wakes up at its end"""
+        duration = self.engine.timer_duration_ns
+        self.engine.start_timer()
+        self.clock.advance(duration - NS_PER_SECOND // 10)
+        self.assertEqual(self.engine.time_to_next_tick(), 0.1)
+        self.assertEqual(self.engine.time_to_deadline(), 0.1)
+        self.clock.advance(NS_PER_SECOND)
+        self.assertEqual(self.engine.time_to_next_tick(), 0)
+
+
+class CatchUpTest(unittest.TestCase):
+    """One update steps over every timer that ran out since the last one"""
+
+    def setUp(self):
+        self.clock = VirtualClock()
+        self.engine = TimerEngine(support.load_config(), self.clock)
+        self.events = []
+        self.engine.add_listener(lambda event, engine: self.events.append(event))
+        self.engine.start_timer()
+        self.events.clear()
+
+    def test_several_timers_at_once(self):
+        """Work 1 min and short break 0.5 min run out, long break goes on"""
+        self.clock.advance(NS_PER_MINUTE * 7 // 4)
+        self.engine.update()
+        engine = self.engine
+        self.assertEqual(engine.current_timer_id, 2)
+        self.assertEqual(engine.transitions, 2)
+        self.assertEqual(self.events, ["complete"])
+        self.assertTrue(engine.alarm_triggered)
+        self.assertEqual(engine.time_elapsed_ns, NS_PER_MINUTE // 4)
+        self.assertEqual(engine.lateness_ns, NS_PER_MINUTE * 3 // 4)
+        self.assertEqual([engine.count(g) for g in range(3)], [1, 1, 0])
+        self.assertEqual(
+            [engine.total_time(g) for g in range(3)],
+            [NS_PER_MINUTE, NS_PER_MINUTE // 2, NS_PER_MINUTE // 4])
+
+    def test_whole_cycles(self):
+        """Two cycles of 3.5 min and a bit, counted like single steps"""
+        self.clock.advance(7 * NS_PER_MINUTE + NS_PER_SECOND)
+        self.engine.update()
+        engine = self.engine
+        self.assertEqual(engine.current_timer_id, 0)
+        self.assertEqual(engine.transitions, 6)
+        self.assertEqual(self.events, ["complete"])
+        self.assertEqual(engine.time_elapsed_ns, NS_PER_SECOND)
+        self.assertEqual([engine.count(g) for g in range(3)], [2, 2, 2])
+        self.assertEqual(engine.total_time(0), 2 * NS_PER_MINUTE + NS_PER_SECOND)
+
+    def test_ack_alarm_clears_transitions(self):
+        self.clock.advance(2 * NS_PER_MINUTE)
+        self.engine.update()
+        self.engine.ack_alarm()
+        self.assertFalse(self.engine.alarm_triggered)
+        self.assertEqual(self.engine.transitions, 0)
+
+    def test_next_and_reset_settle_time(self):
+        self.clock.advance(10 * NS_PER_SECOND)
+        self.engine.next_timer()
+        self.clock.advance(5 * NS_PER_SECOND)
+        self.engine.reset_timer()
+        self.clock.advance(NS_PER_SECOND)
+        self.engine.update()
+        self.assertEqual(self.events, ["next", "reset"])
+        self.assertEqual(self.engine.current_timer_id, 1)
+        self.assertEqual(self.engine.time_elapsed_ns, NS_PER_SECOND)
+        self.assertEqual(self.engine.total_time(0), 10 * NS_PER_SECOND)
+        self.assertEqual(self.engine.total_time(1), 6 * NS_PER_SECOND)
+        self.assertEqual(self.engine.count(0), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
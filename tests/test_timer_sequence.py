@@ -0,0 +1,186 @@
+"""Tests of compiled repeat blocks against the expanded list of timers"""
+
+import unittest
+
+from potatotimer import TimerSequence
+from potatotimer.TimerEngine import NS_PER_MINUTE
+
+from support import load_config
+
+"""Categories by id, in stat groups 0 to 2"""
+CATEGORIES = [{"group": 0}, {"group": 1}, {"group": 2}, {"group": 1}]
+
+
+def timer(category, minutes):
+    return {"type": f'c{category}', "category": category, "duration": minutes}
+
+
+def block(repeat, *timers):
+    return {"repeat": repeat, "timers": list(timers)}
+
+
+PATTERNS = {
+    "flat": [timer(0, 25), timer(1, 5), timer(2, 30)],
+    "one timer": [timer(0, 1)],
+    "block": [block(3, timer(0, 25), timer(1, 5)), timer(2, 30)],
+    "block of one": [timer(2, 1), block(4, timer(0, 2)), timer(1, 3)],
+    "repeat once": [block(1, timer(0, 2), timer(3, 1))],
+    "nested": [
+        block(3, block(3, timer(0, 25), timer(1, 5)), timer(0, 25),
+              timer(2, 30)),
+        timer(3, 0.5),
+    ],
+    "deep": [
+        timer(1, 1),
+        block(2, timer(0, 2), block(3, block(2, timer(2, 0.25)), timer(3, 1))),
+        block(2, block(2, block(2, timer(0, 1.5)))),
+    ],
+}
+
+
+def expand(pattern):
+    """Timers of a pattern in order, the slow and obvious way"""
+    timers = []
+    for item in pattern:
+        if "repeat" in item:
+            for repeat in range(item["repeat"]):
+                timers += expand(item["timers"])
+        else:
+            timers.append(item)
+    return timers
+
+
+class Expanded:
+    """Brute-force answers from the expanded timers, over cycles"""
+
+    def __init__(self, pattern):
+        self.timers = expand(pattern)
+        self.durations = [round(timer["duration"] * NS_PER_MINUTE)
+                          for timer in self.timers]
+        self.cycle_ns = sum(self.durations)
+
+    def group(self, index):
+        return CATEGORIES[self.timers[index % len(self.timers)]["category"]]["group"]
+
+    def starts(self, cycles):
+        """Start of every timer of the first cycles"""
+        starts = []
+        start = 0
+        for index in range(cycles * len(self.timers)):
+            starts.append(start)
+            start += self.durations[index % len(self.timers)]
+        return starts
+
+    def count_before(self, index):
+        counts = [0, 0, 0]
+        for i in range(index):
+            counts[self.group(i)] += 1
+        return counts
+
+    def time_before(self, position):
+        times = [0, 0, 0]
+        start = 0
+        index = 0
+        while start < position:
+            duration = self.durations[index % len(self.timers)]
+            times[self.group(index)] += min(duration, position - start)
+            start += duration
+            index += 1
+        return times
+
+
+class TimerSequenceTest(unittest.TestCase):
+    CYCLES = 3  # Checked past the end, over repeated cycles
+
+    def cases(self):
+        for name, pattern in PATTERNS.items():
+            with self.subTest(pattern=name):
+                yield TimerSequence(pattern, CATEGORIES, 3), Expanded(pattern)
+
+    def test_length_and_order(self):
+        for sequence, expanded in self.cases():
+            self.assertEqual(len(sequence), len(expanded.timers))
+            self.assertEqual(list(sequence), expanded.timers)
+            self.assertEqual(sequence.duration_ns, expanded.cycle_ns)
+
+    def test_group_sums(self):
+        for sequence, expanded in self.cases():
+            self.assertEqual(sequence.group_lengths,
+                             expanded.count_before(len(expanded.timers)))
+            self.assertEqual(sequence.group_durations_ns,
+                             expanded.time_before(expanded.cycle_ns))
+
+    def test_getitem(self):
+        for sequence, expanded in self.cases():
+            length = len(expanded.timers)
+            for index in range(-length, length):
+                self.assertIs(sequence[index], expanded.timers[index])
+            for index in (length, length + 1, -length - 1):
+                with self.assertRaises(IndexError):
+                    sequence[index]
+
+    def test_start_ns(self):
+        for sequence, expanded in self.cases():
+            for index, start in enumerate(expanded.starts(self.CYCLES)):
+                self.assertEqual(sequence.start_ns(index), start)
+
+    def test_locate_ns(self):
+        """At, just before and just after every timer start"""
+        for sequence, expanded in self.cases():
+            starts = expanded.starts(self.CYCLES)
+            for index, start in enumerate(starts):
+                self.assertEqual(sequence.locate_ns(start), (index, start))
+                self.assertEqual(sequence.locate_ns(start + 1), (index, start))
+                if index:
+                    self.assertEqual(sequence.locate_ns(start - 1),
+                                     (index - 1, starts[index - 1]))
+
+    def test_count_before(self):
+        for sequence, expanded in self.cases():
+            for index in range(self.CYCLES * len(expanded.timers) + 1):
+                self.assertEqual(sequence.count_before(index),
+                                 expanded.count_before(index))
+
+    def test_time_before(self):
+        for sequence, expanded in self.cases():
+            for start in expanded.starts(self.CYCLES):
+                for position in (start, start + 1, start + NS_PER_MINUTE // 7):
+                    self.assertEqual(sequence.time_before(position),
+                                     expanded.time_before(position))
+
+
+class CompileTest(unittest.TestCase):
+    def test_config_blocks_are_compiled(self):
+        config = load_config("""\
+timers:
+  - repeat: 2
+    timers:
+      - repeat: 2
+        timers:
+          - type: "work"
+            duration: 25
+          - type: "short break"
+            duration: 5
+      - type: "long break"
+        duration: 30
+  - repeat: 0
+    timers:
+      - type: "work"
+        duration: 1
+  - repeat: 3
+    timers: []
+  - type: "reading"
+    duration: 10
+""")
+        timers = config.timers
+        self.assertIsInstance(timers, TimerSequence)
+        self.assertEqual([timer["type"] for timer in timers], [
+            "work", "short break", "work", "short break", "long break",
+        ] * 2 + ["reading"])
+        self.assertEqual(config.get_timer(10)["type"], "reading")
+        self.assertEqual(timers.duration_ns, 2 * 90 * NS_PER_MINUTE +
+                         10 * NS_PER_MINUTE)
+
+
+if __name__ == "__main__":
+    unittest.main()
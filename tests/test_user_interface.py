@@ -0,0 +1,231 @@
+"""Tests of the user interface run on a virtual terminal"""
+
+import unittest
+from unittest import mock
+
+from potatotimer import UserInterface
+from potatotimer.TimerEngine import NS_PER_SECOND
+
+from support import IN_PROCESS, TIMERS, Headless, load_config
+
+MANY_TIMERS = "timers:\n" + "".join(
+    f'  - type: "t{i}"\n    duration: {i + 1}\n' for i in range(50))
+
+
+class NextWakeupTest(unittest.TestCase):
+    """The main loop sleeps until the nearest visible change"""
+
+    def setUp(self):
+        self.headless = Headless(load_config())
+        self.ui = self.headless.ui
+
+    @mock.patch("time.time", return_value=1_000_000.25)
+    def test_stopped_wakes_on_wall_clock_second(self, time):
+        self.assertEqual(self.ui.next_wakeup(), 0.75)
+
+    @mock.patch("time.time", return_value=1_000_000.0)
+    def test_running_wakes_on_timer_half_second(self, time):
+        self.headless.engine.start_timer()
+        self.headless.clock.advance(200_000_000)
+        self.assertAlmostEqual(self.ui.next_wakeup(), 0.3)
+
+    @mock.patch("time.time", return_value=1_000_000.9)
+    def test_wall_clock_second_comes_first(self, time):
+        self.headless.engine.start_timer()
+        self.assertAlmostEqual(self.ui.next_wakeup(), 0.1)
+
+    @mock.patch("time.monotonic", return_value=50.0)
+    @mock.patch("time.time", return_value=1_000_000.0)
+    def test_pending_relayout(self, time, monotonic):
+        self.headless.backend.resize(30, 100)
+        self.headless.screen.wait_for_input(0)
+        self.ui.handle_keys()
+        self.ui.handle_resize(50.0)
+        self.assertAlmostEqual(self.ui.next_wakeup(), self.ui.RESIZE_SETTLE)
+
+
+class SidebarTest(unittest.TestCase):
+    """The sidebar scrolls to keep the current timer in view"""
+
+    def setUp(self):
+        self.headless = Headless(load_config(MANY_TIMERS), lines=24, cols=80)
+        self.headless.frame()
+
+    def rows(self):
+        """Timer rows of the sidebar, marker column first"""
+        text = self.headless.backend.screen_text()
+        return [line[50:66].rstrip() for line in text[4:23]]
+
+    def go_to(self, timer_id):
+        engine = self.headless.engine
+        while engine.current_timer_id != timer_id:
+            engine.next_timer()
+        self.headless.frame()
+
+    def test_first_rows(self):
+        rows = self.rows()
+        self.assertEqual(self.headless.ui.sidebar_capacity(), 19)
+        self.assertEqual(rows[0], "> t0 (0:01:00)")
+        self.assertEqual(rows[18], "  t18 (0:19:00)")
+
+    def test_marker_moves_within_view(self):
+        self.go_to(5)
+        rows = self.rows()
+        self.assertEqual(rows[0], "  t0 (0:01:00)")
+        self.assertEqual(rows[5], "> t5 (0:06:00)")
+        self.assertEqual([row[0] for row in rows].count(">"), 1)
+
+    def test_scrolls_previous_timer_to_top(self):
+        self.go_to(30)
+        rows = self.rows()
+        self.assertEqual(rows[0], "  t29 (0:30:00)")
+        self.assertEqual(rows[1], "> t30 (0:31:00)")
+
+    def test_end_of_list_fills_view(self):
+        self.go_to(49)
+        rows = self.rows()
+        self.assertEqual(rows[0], "  t31 (0:32:00)")
+        self.assertEqual(rows[18], "> t49 (0:50:00)")
+        self.go_to(0)
+        self.assertEqual(self.rows()[0], "> t0 (0:01:00)")
+
+    def test_only_marker_rows_are_redrawn(self):
+        screen = self.headless.screen
+        with mock.patch.object(screen, "add_str", wraps=screen.add_str) as add_str:
+            self.go_to(1)
+        sidebar = [call.args[1:] for call in add_str.call_args_list
+                   if call.args[0] == "sidebar"]
+        self.assertEqual(sidebar, [(4, 2, " "), (5, 2, ">")])
+
+
+class HelpTest(unittest.TestCase):
+    """Help is an overlay, the timer and its alarms go on below it"""
+
+    def setUp(self):
+        self.headless = Headless(load_config(IN_PROCESS + TIMERS), daemon=True)
+        self.addCleanup(self.headless.close)
+        self.headless.frame()
+
+    def press(self, keys, seconds=0):
+        for key in keys:
+            self.headless.backend.press(key)
+        self.headless.clock.advance(seconds * NS_PER_SECOND)
+        self.headless.frame()
+
+    def test_help_is_shown_and_hidden(self):
+        before = self.headless.backend.screen_text()
+        self.press("h")
+        self.assertIn("Potato Timer Help", self.headless.text())
+        self.assertIn("h: Show/hide help", self.headless.text())
+        self.press("h")
+        self.assertNotIn("Potato Timer Help", self.headless.text())
+        self.assertEqual(self.headless.backend.screen_text(), before)
+
+    def test_keys_work_with_help_open(self):
+        self.press("hs")
+        self.assertTrue(self.headless.engine.running)
+        self.assertIn("Potato Timer Help", self.headless.text())
+
+    def test_timer_runs_out_under_help(self):
+        ui = self.headless.ui
+        with mock.patch.object(ui._alarms, "trigger") as trigger:
+            self.press("sh")
+            self.press("", seconds=61)
+        self.assertEqual(trigger.call_count, 1)
+        self.assertEqual(self.headless.engine.current_timer_id, 1)
+        self.assertIn("Potato Timer Help", self.headless.text())
+        """The statusline is not covered by help and shows the new timer"""
+        self.assertIn("Running: short break",
+                      self.headless.backend.screen_text()[0])
+
+    def test_closing_repaints_only_what_help_covered(self):
+        ui = self.headless.ui
+        self.press("sh")
+        self.press("", seconds=5)
+        with mock.patch.object(ui, "prepopulate_content") as content, \
+                mock.patch.object(ui, "prepopulate_sidebar") as sidebar:
+            self.press("h")
+        content.assert_not_called()
+        sidebar.assert_not_called()
+        self.assertNotIn("Potato Timer Help", self.headless.text())
+        fresh = Headless(self.headless.config, daemon=True,
+                         clock=self.headless.clock)
+        self.addCleanup(fresh.close)
+        fresh.engine.restore(self.headless.engine.snapshot())
+        fresh.frame()
+        self.assertEqual(self.headless.backend.screen_text(),
+                         fresh.backend.screen_text())
+
+    def test_help_follows_resize(self):
+        self.press("h")
+        self.headless.backend.resize(30, 100)
+        self.headless.frame(now=0)
+        self.headless.frame(now=1)
+        text = self.headless.backend.screen_text()
+        row = next(y for y, line in enumerate(text)
+                   if "Potato Timer Help" in line)
+        self.assertEqual(row, (30 - len(UserInterface.HELP) - 2) // 2 + 1)
+
+
+class ResizeTest(unittest.TestCase):
+    """Resize bursts are laid out once, after they settle"""
+
+    def setUp(self):
+        self.headless = Headless(load_config(IN_PROCESS + TIMERS), daemon=True)
+        self.addCleanup(self.headless.close)
+        self.headless.frame()
+        self.ui = self.headless.ui
+
+    def resize(self, lines, cols, now):
+        self.headless.backend.resize(lines, cols)
+        self.headless.frame(now)
+
+    def settle(self, lines, cols):
+        """Resize and run frames until windows are laid out"""
+        self.resize(lines, cols, now=100)
+        self.headless.frame(now=100 + self.ui.RESIZE_SETTLE)
+
+    def test_burst_is_laid_out_once(self):
+        with mock.patch.object(self.ui, "manage_windows",
+                               wraps=self.ui.manage_windows) as manage:
+            for step in range(10):
+                self.resize(24 + step, 80 + step, now=step * 0.01)
+            self.assertEqual(manage.call_count, 0)
+            self.headless.frame(now=0.09 + self.ui.RESIZE_SETTLE)
+        self.assertEqual(manage.call_count, 1)
+        text = self.headless.backend.screen_text()
+        self.assertEqual((len(text), len(text[0])), (33, 89))
+        self.assertEqual(text[-1][-1], "+")
+
+    def test_unchanged_geometry_is_left_alone(self):
+        with mock.patch.object(self.ui, "prepopulate_content") as content, \
+                mock.patch.object(self.ui, "prepopulate_sidebar") as sidebar:
+            self.settle(24, 80)
+        content.assert_not_called()
+        sidebar.assert_not_called()
+
+    def test_tiny_terminals(self):
+        """Windows that don't fit go, nothing is drawn off screen"""
+        full = self.headless.backend.screen_text()
+        for lines, cols in ((1, 1), (2, 10), (5, 49), (1, 80)):
+            for help in (False, True):
+                with self.subTest(lines=lines, cols=cols, help=help):
+                    if help != self.ui._help:
+                        self.headless.backend.press("h")
+                    self.settle(lines, cols)
+                    self.headless.frame(now=200)
+                    text = self.headless.backend.screen_text()
+                    self.assertEqual(len(text), lines)
+                    self.assertTrue(all(len(row) == cols for row in text))
+        self.headless.backend.press("h")
+        self.settle(24, 80)
+        self.assertEqual(self.headless.backend.screen_text(), full)
+
+    def test_layout_is_cached(self):
+        self.assertIs(self.ui.layout(24, 80), self.ui.layout(24, 80))
+        self.assertEqual(dict(self.ui.layout(2, 10)), {
+            "sidebar": None, "content": None, "statusline": (1, 10, 0, 0)})
+
+
+if __name__ == "__main__":
+    unittest.main()
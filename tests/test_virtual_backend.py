@@ -0,0 +1,108 @@
+"""Tests of the headless backend behind Screen"""
+
+import unittest
+
+from potatotimer import Screen, VirtualBackend
+
+from support import IN_PROCESS, TIMERS, Headless, load_config
+
+
+class VirtualBackendTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = VirtualBackend(5, 20)
+        self.window = self.backend.new_window(3, 10, 1, 2)
+
+    def test_nothing_shown_before_update(self):
+        self.window.addnstr(0, 0, "Work", 10)
+        self.window.noutrefresh()
+        self.assertEqual(self.backend.screen_text()[1], " " * 20)
+        self.backend.update()
+        self.assertEqual(self.backend.screen_text()[1], "  Work" + " " * 14)
+
+    def test_bytes_of_changed_cells(self):
+        """One cursor move and attribute switch for a run of cells"""
+        self.window.addnstr(0, 0, "Work", 10)
+        self.window.noutrefresh()
+        self.backend.update()
+        self.assertEqual(self.backend.cells_written, 4)
+        self.assertEqual(
+            self.backend.bytes_emitted,
+            VirtualBackend.CURSOR_MOVE_BYTES + VirtualBackend.ATTRIBUTE_BYTES + 4)
+        self.assertEqual(self.backend.writes, 1)
+
+        self.window.addnstr(0, 0, "Worm", 10)
+        self.window.noutrefresh()
+        self.backend.update()
+        self.assertEqual(self.backend.cells_written, 5)
+        self.assertEqual(self.backend.output_counters(), {
+            "writes": 2,
+            "bytes": 2 * VirtualBackend.CURSOR_MOVE_BYTES
+            + 2 * VirtualBackend.ATTRIBUTE_BYTES + 5,
+        })
+
+    def test_unchanged_update_is_not_a_write(self):
+        self.window.noutrefresh()
+        self.backend.update()
+        self.assertEqual(self.backend.writes, 0)
+        self.assertEqual(self.backend.bytes_emitted, 0)
+
+    def test_windows_clip_to_screen(self):
+        window = self.backend.new_window(3, 30, 4, 0)
+        window.addnstr(0, 0, "x" * 30, 30)
+        window.addnstr(5, 0, "outside", 30)
+        window.noutrefresh()
+        self.backend.update()
+        self.assertEqual(self.backend.screen_text()[4], "x" * 20)
+
+    def test_keys(self):
+        self.assertEqual(self.window.getch(), -1)
+        self.backend.press("s")
+        self.backend.press(VirtualBackend.KEY_RESIZE)
+        self.assertEqual(self.window.getch(), ord("s"))
+        self.assertEqual(self.window.getch(), VirtualBackend.KEY_RESIZE)
+        self.assertEqual(self.window.getch(), -1)
+
+
+class HeadlessScreenTest(unittest.TestCase):
+    """Screen and UserInterface drawn on the virtual terminal"""
+
+    def test_windows_are_drawn(self):
+        headless = Headless(load_config())
+        headless.frame()
+        text = headless.text()
+        self.assertIn("Work", text)
+        self.assertIn("Short break", text)
+        self.assertIn("Long break", text)
+
+    def test_keys_run_commands(self):
+        headless = Headless(load_config(IN_PROCESS + TIMERS), daemon=True)
+        self.addCleanup(headless.close)
+        headless.backend.press("s")
+        self.assertIsNone(headless.frame())
+        self.assertTrue(headless.engine.running)
+        headless.backend.press("n")
+        headless.frame()
+        self.assertEqual(headless.engine.current_timer_id, 1)
+        headless.backend.press("q")
+        self.assertIs(headless.frame(), False)
+
+    def test_overlay_removal_repaints_below(self):
+        backend = VirtualBackend(10, 40)
+        screen = Screen(load_config(), backend)
+        screen.start()
+        screen.resize_or_create_window("content", 10, 40, 0, 0)
+        screen.add_str("content", 4, 2, "below")
+        screen.stage_window("content")
+        screen.resize_or_create_window("dialog", 3, 20, 3, 0)
+        screen.set_overlay("dialog")
+        screen.add_str("dialog", 1, 1, "dialog")
+        screen.stage_window("dialog")
+        screen.flush_frame()
+        self.assertEqual(backend.screen_text()[4][1:7], "dialog")
+        screen.remove_window("dialog")
+        screen.flush_frame()
+        self.assertEqual(backend.screen_text()[4][2:7], "below")
+
+
+if __name__ == "__main__":
+    unittest.main()